@@ -0,0 +1,130 @@
+# Copyright (c) The Diem Core Contributors
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+Convert orders executed per second when each storage helper commits on its
+own, as execute_convert did, versus in one unit of work.
+
+    python -m benchmarks.convert [--orders 200]
+
+Orders are written to DB_URL, run it once with a sqlite:// and once with a
+postgresql:// URL to compare the two.
+"""
+
+import argparse
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from time import perf_counter
+
+from diem_utils.types.currencies import DiemCurrency, FiatCurrency
+from wallet import storage
+from wallet.services import INVENTORY_ACCOUNT_NAME
+from wallet.services.order import execute_convert
+from wallet.storage import (
+    Account,
+    Base,
+    Order,
+    Transaction,
+    User,
+    db_session,
+    engine,
+)
+from wallet.types import (
+    ConvertResult,
+    CoverStatus,
+    Direction,
+    OrderStatus,
+    OrderType,
+    RegistrationStatus,
+    TransactionStatus,
+    TransactionType,
+)
+
+
+def fund(account: Account, amount: int) -> None:
+    db_session.add(
+        Transaction(
+            type=TransactionType.EXTERNAL,
+            status=TransactionStatus.COMPLETED,
+            amount=amount,
+            currency=DiemCurrency.XUS,
+            source_address="na",
+            destination_id=account.id,
+            created_timestamp=datetime.utcnow(),
+        )
+    )
+
+
+def seed(name: str, orders: int):
+    """Adds a funded user with orders pending execution, returns the orders"""
+    inventory = Account.query.filter_by(name=INVENTORY_ACCOUNT_NAME).first()
+    if inventory is None:
+        inventory = Account(name=INVENTORY_ACCOUNT_NAME)
+        db_session.add(inventory)
+    user = User(
+        username=name,
+        registration_status=RegistrationStatus.Approved,
+        selected_fiat_currency=FiatCurrency.USD,
+        selected_language="en",
+        password_salt="123",
+        password_hash="deadbeef",
+        account=Account(name=name),
+    )
+    db_session.add(user)
+    db_session.flush()
+    fund(user.account, orders)
+    fund(inventory, orders)
+
+    pending = [
+        Order(
+            amount=1,
+            direction=Direction.Buy,
+            base_currency=DiemCurrency.XUS,
+            quote_currency=DiemCurrency.XUS,
+            order_status=OrderStatus.PendingExecution,
+            cover_status=CoverStatus.PendingCover,
+            order_expiration=datetime.utcnow() + timedelta(minutes=10),
+            exchange_amount=1,
+            order_type=OrderType.DirectConvert,
+            user_id=user.id,
+        )
+        for _ in range(orders)
+    ]
+    db_session.add_all(pending)
+    db_session.commit()
+    return pending
+
+
+@contextmanager
+def helper_commits():
+    yield
+
+
+def measure(name: str, count: int) -> None:
+    orders = seed(f"convert-{name}-{datetime.utcnow()}", count)
+    start = perf_counter()
+    for order in orders:
+        assert execute_convert(order) == ConvertResult.Success
+    elapsed = perf_counter() - start
+    print(f"{name:>14}: {count / elapsed:8.1f} orders/s ({elapsed:.2f}s)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--orders", type=int, default=200)
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    print(engine.url.drivername)
+
+    unit_of_work = storage.unit_of_work
+    storage.unit_of_work = helper_commits
+    try:
+        measure("helper commits", args.orders)
+    finally:
+        storage.unit_of_work = unit_of_work
+    measure("unit of work", args.orders)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# Copyright (c) The Diem Core Contributors
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+Quotes per second against a local stub LP: a new connection per call (what
+LpClient did before it shared a pool), the pooled LpClient, and
+AsyncLpClient fanning out.
+
+    python -m benchmarks.lp_client [--calls 1000] [--concurrency 8]
+"""
+
+import argparse
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+
+import requests
+
+from diem_utils.sdks.liquidity import AsyncLpClient, LpClient
+from diem_utils.types.liquidity.currency import CurrencyPairs
+
+from .stub_lp import StubLp
+
+PAIR = CurrencyPairs.XUS_USD.value
+
+
+def measure(name: str, stub: StubLp, run) -> None:
+    connections = stub.connections
+    start = perf_counter()
+    calls = run()
+    elapsed = perf_counter() - start
+    print(
+        f"{name:>12}: {calls / elapsed:8.0f} quotes/s, "
+        f"{stub.connections - connections} connections"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--calls", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    def in_threads(get_quote):
+        with ThreadPoolExecutor(args.concurrency) as executor:
+            list(executor.map(lambda _: get_quote(), range(args.calls)))
+        return args.calls
+
+    async def fan_out(url):
+        async with AsyncLpClient(url, pool_size=args.concurrency) as client:
+            await client.get_quotes([PAIR] * args.calls, 1)
+        return args.calls
+
+    with StubLp() as stub:
+        measure(
+            "unpooled",
+            stub,
+            lambda: in_threads(
+                lambda: LpClient(stub.url, session=_ClosingSession()).get_quote(PAIR, 1)
+            ),
+        )
+        client = LpClient(stub.url)
+        measure("pooled", stub, lambda: in_threads(lambda: client.get_quote(PAIR, 1)))
+        measure("async", stub, lambda: asyncio.run(fan_out(stub.url)))
+
+
+class _ClosingSession:
+    """One connection per request, like calling requests.post"""
+
+    def request(self, *args, **kwargs):
+        with requests.Session() as session:
+            return session.request(*args, **kwargs)
+
+
+if __name__ == "__main__":
+    main()
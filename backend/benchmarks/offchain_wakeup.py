@@ -0,0 +1,111 @@
+# Copyright (c) The Diem Core Contributors
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+Latency of a payment going through the off-chain statuses of a travel rule
+payment (outbound, inbound, ready, completed) when the off-chain loop polls
+every 500ms, as it did, versus when it is woken by commit notifications.
+Each status change is made by the loop itself, like the command exchange
+with the counterparty does in the wallet.
+
+    python -m benchmarks.offchain_wakeup [--payments 20] [--poll-ms 500]
+
+Transactions are written to DB_URL, notifications use NOTIFY_BACKEND.
+"""
+
+import argparse
+import statistics
+import threading
+import time
+from datetime import datetime, timedelta
+from time import perf_counter
+
+from diem_utils.types.currencies import DiemCurrency
+from wallet.storage import (
+    OFFCHAIN_CHANNEL,
+    Base,
+    Transaction,
+    claim_transactions,
+    db_session,
+    engine,
+    wait_for_notification,
+)
+from wallet.types import TransactionStatus, TransactionType
+
+NEXT_STATUS = {
+    TransactionStatus.OFF_CHAIN_OUTBOUND: TransactionStatus.OFF_CHAIN_INBOUND,
+    TransactionStatus.OFF_CHAIN_INBOUND: TransactionStatus.OFF_CHAIN_READY,
+    TransactionStatus.OFF_CHAIN_READY: TransactionStatus.COMPLETED,
+}
+
+
+def process_round() -> int:
+    claimed = 0
+    for status, next_status in NEXT_STATUS.items():
+        lease_until = datetime.utcnow() + timedelta(minutes=1)
+        for txn_id in claim_transactions(status, 100, lease_until):
+            txn = Transaction.query.filter_by(id=txn_id).one()
+            txn.status = next_status
+            txn.offchain_claimed_until = None
+            claimed += 1
+        db_session.commit()
+    db_session.remove()
+    return claimed
+
+
+def loop(stop: threading.Event, idle_wait) -> None:
+    while not stop.is_set():
+        if not process_round():
+            idle_wait()
+
+
+def measure(name: str, payments: int, idle_wait) -> None:
+    stop = threading.Event()
+    thread = threading.Thread(target=loop, args=(stop, idle_wait), daemon=True)
+    thread.start()
+
+    latencies = []
+    for _ in range(payments):
+        txn = Transaction(
+            type=TransactionType.EXTERNAL,
+            amount=1,
+            currency=DiemCurrency.XUS,
+            status=TransactionStatus.OFF_CHAIN_OUTBOUND,
+            created_timestamp=datetime.utcnow(),
+        )
+        db_session.add(txn)
+        start = perf_counter()
+        db_session.commit()
+        while db_session.query(Transaction.status).filter_by(id=txn.id).scalar() != (
+            TransactionStatus.COMPLETED
+        ):
+            db_session.rollback()
+            time.sleep(0.001)
+        latencies.append(perf_counter() - start)
+        db_session.rollback()
+
+    stop.set()
+    thread.join()
+    print(
+        f"{name:>8}: median {statistics.median(latencies) * 1000:7.1f}ms, "
+        f"max {max(latencies) * 1000:7.1f}ms"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--payments", type=int, default=20)
+    parser.add_argument("--poll-ms", type=int, default=500)
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    measure("polling", args.payments, lambda: time.sleep(args.poll_ms / 1000))
+    measure(
+        "notified",
+        args.payments,
+        lambda: wait_for_notification(OFFCHAIN_CHANNEL, args.poll_ms / 1000),
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+# Copyright (c) The Diem Core Contributors
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+Throughput of on-chain payouts sent one send_transaction call each, as a
+merchant integration had to, versus one send_payouts batch: a single balance
+check and commit for the batch, transactions signed and submitted back to
+back without waiting for each to execute.
+
+    python -m benchmarks.payouts [--payouts 200] [--latency-ms 20]
+
+The JSON-RPC node is a local stub answering every request after latency-ms,
+transactions are written to DB_URL.
+"""
+
+import argparse
+import dataclasses
+import json
+import socket
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import perf_counter
+
+import context
+from diem import jsonrpc
+from diem_utils.types.currencies import DiemCurrency
+from wallet import services
+from wallet.services.payout import Payout, send_payouts
+from wallet.services.transaction import send_transaction
+from wallet.storage import Account, Base, Transaction, db_session, engine
+from wallet.types import TransactionStatus, TransactionType
+
+RECEIVER_ADDRESS = "f72589b71ff4f8d139674a3f7369c69b"
+RECEIVER_SUBADDRESS = "8e298f642d08d1af"
+
+
+class StubJsonRpc:
+    """Answers get_account and submit like a full node, counting submits"""
+
+    def __init__(self, chain_id: int, latency_s: float) -> None:
+        self.chain_id = chain_id
+        self.latency_s = latency_s
+        self.submitted = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def __enter__(self) -> "StubJsonRpc":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def respond(self, request: dict) -> dict:
+        time.sleep(self.latency_s)
+        result = None
+        if request["method"] == "get_account":
+            with self._lock:
+                result = {
+                    "address": request["params"][0],
+                    "sequence_number": self.submitted,
+                }
+        elif request["method"] == "submit":
+            with self._lock:
+                self.submitted += 1
+        return {
+            "id": request["id"],
+            "jsonrpc": "2.0",
+            "diem_chain_id": self.chain_id,
+            "diem_ledger_version": 1,
+            "diem_ledger_timestampusec": 1,
+            "result": result,
+        }
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self) -> None:
+                super().setup()
+                self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+            def do_POST(self) -> None:
+                length = int(self.headers.get("Content-Length", 0))
+                content = json.dumps(stub.respond(json.loads(self.rfile.read(length))))
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                self.wfile.write(content.encode())
+
+            def log_message(self, *args) -> None:
+                pass
+
+        return Handler
+
+
+def funded_account(name: str, amount: int) -> int:
+    account = Account(name=name)
+    db_session.add(account)
+    db_session.flush()
+    db_session.add(
+        Transaction(
+            type=TransactionType.EXTERNAL,
+            status=TransactionStatus.COMPLETED,
+            amount=amount,
+            currency=DiemCurrency.XUS,
+            source_address="na",
+            destination_id=account.id,
+            created_timestamp=datetime.utcnow(),
+        )
+    )
+    db_session.commit()
+    return account.id
+
+
+def measure(name: str, count: int, send) -> None:
+    sender_id = funded_account(f"payouts-{name}-{datetime.utcnow()}", count)
+    start = perf_counter()
+    send(sender_id)
+    elapsed = perf_counter() - start
+    print(f"{name:>10}: {count / elapsed:8.1f} payouts/s ({elapsed:.2f}s)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--payouts", type=int, default=200)
+    parser.add_argument("--latency-ms", type=float, default=20)
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    # submit in this process rather than through the dramatiq worker
+    services._RUN_BACKGROUND_TASKS = False
+    ctx = context.for_local_dev()
+
+    with StubJsonRpc(ctx.config.chain_id, args.latency_ms / 1000) as stub:
+        context.set(dataclasses.replace(ctx, jsonrpc_client=jsonrpc.Client(stub.url)))
+
+        def per_item(sender_id: int) -> None:
+            for _ in range(args.payouts):
+                send_transaction(
+                    sender_id=sender_id,
+                    amount=1,
+                    currency=DiemCurrency.XUS,
+                    destination_address=RECEIVER_ADDRESS,
+                    destination_subaddress=RECEIVER_SUBADDRESS,
+                )
+
+        def batch(sender_id: int) -> None:
+            send_payouts(
+                sender_id,
+                DiemCurrency.XUS,
+                [
+                    Payout(RECEIVER_ADDRESS, RECEIVER_SUBADDRESS, 1)
+                    for _ in range(args.payouts)
+                ],
+            )
+
+        measure("per item", args.payouts, per_item)
+        measure("batch", args.payouts, batch)
+        assert stub.submitted == 2 * args.payouts
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+# Copyright (c) The Diem Core Contributors
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+Events per second each pubsub progress store records, fsync included.
+
+    python -m benchmarks.pubsub_progress [--events 1000] [--redis]
+
+The sql store writes to DB_URL, --redis uses the wallet redis (REDIS_HOST).
+"""
+
+import argparse
+import os
+import tempfile
+from time import perf_counter
+
+from pubsub.progress import (
+    FileProgressStorage,
+    RedisProgressStorage,
+    SqlProgressStorage,
+    create_progress_storage,
+)
+from wallet.storage import Base, engine
+
+
+def measure(name: str, progress, events: int) -> None:
+    progress.save_state({"benchmark": 0})
+    start = perf_counter()
+    for sequence in range(events):
+        if not progress.is_recorded("benchmark", sequence):
+            progress.record_event("benchmark", sequence)
+    elapsed = perf_counter() - start
+    print(f"{name:>6}: {events / elapsed:10.0f} events/s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--events", type=int, default=1000)
+    parser.add_argument("--redis", action="store_true")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        measure(
+            "file",
+            FileProgressStorage(os.path.join(tmpdir, "progress")),
+            args.events,
+        )
+
+    Base.metadata.create_all(bind=engine)
+    measure("sql", SqlProgressStorage(), args.events)
+
+    if args.redis:
+        progress = create_progress_storage({"progress_backend": "redis"})
+        assert isinstance(progress, RedisProgressStorage)
+        measure("redis", progress, args.events)
+
+
+if __name__ == "__main__":
+    main()
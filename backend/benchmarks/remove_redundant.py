@@ -0,0 +1,93 @@
+# Copyright (c) The Diem Core Contributors
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+Time sync_db takes to remove the external transactions not found on chain
+when it pages through the transaction table and deletes them one by one, as
+it did, versus with delete_redundant_transactions.
+
+    python -m benchmarks.remove_redundant [--rows 20000] [--redundant-pct 1]
+
+Transactions are written to DB_URL.
+"""
+
+import argparse
+from datetime import datetime
+from time import perf_counter
+
+from sqlalchemy_paginator import Paginator
+
+from diem_utils.types.currencies import DiemCurrency
+from wallet.storage import (
+    Account,
+    Base,
+    Transaction,
+    db_session,
+    delete_redundant_transactions,
+    delete_transaction_by_id,
+    engine,
+)
+from wallet.types import TransactionStatus, TransactionType
+
+
+def seed(rows: int, redundant_pct: float):
+    """Adds rows external transactions, returns the versions found on chain"""
+    Transaction.query.delete()
+    account = Account(name=f"remove-redundant-{datetime.utcnow()}")
+    db_session.add(account)
+    db_session.commit()
+
+    now = datetime.utcnow()
+    db_session.execute(
+        Transaction.__table__.insert(),
+        [
+            {
+                "type": TransactionType.EXTERNAL,
+                "amount": 1,
+                "currency": DiemCurrency.XUS,
+                "status": TransactionStatus.COMPLETED,
+                "destination_id": account.id,
+                "blockchain_version": version,
+                "created_timestamp": now,
+            }
+            for version in range(rows)
+        ],
+    )
+    db_session.commit()
+
+    every = int(100 / redundant_pct)
+    return {version for version in range(rows) if version % every}
+
+
+def paginated(synced_versions) -> None:
+    for page in Paginator(Transaction.query, 10):
+        for transaction in page.object_list:
+            if (
+                transaction.type == TransactionType.EXTERNAL
+                and transaction.blockchain_version not in synced_versions
+            ):
+                delete_transaction_by_id(transaction.id)
+
+
+def measure(name: str, args, remove) -> None:
+    synced_versions = seed(args.rows, args.redundant_pct)
+    start = perf_counter()
+    remove(synced_versions)
+    elapsed = perf_counter() - start
+    remaining = Transaction.query.count()
+    print(f"{name:>10}: {elapsed:8.2f}s, {args.rows - remaining} removed")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--redundant-pct", type=float, default=1)
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    measure("paginated", args, paginated)
+    measure("set based", args, delete_redundant_transactions)
+
+
+if __name__ == "__main__":
+    main()
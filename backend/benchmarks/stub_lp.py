@@ -0,0 +1,111 @@
+# Copyright (c) The Diem Core Contributors
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+Minimal local Liquidity Provider speaking the LpClient protocol over
+keep-alive HTTP/1.1, counting the connections it accepts.
+"""
+
+import json
+import socket
+import threading
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List
+from uuid import uuid4
+
+
+class StubLp:
+    def __init__(self, rate: int = 1000000) -> None:
+        self.rate = rate
+        self.connections = 0
+        self.requests = 0
+        # statuses answered, in order, before serving requests normally
+        self.failures: List[int] = []
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def __enter__(self) -> "StubLp":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def respond(self, method: str, path: str, body: dict):
+        with self._lock:
+            self.requests += 1
+            if self.failures:
+                return self.failures.pop(0), {}
+
+        if method == "POST" and path == "/quote":
+            return 200, {
+                "quote_id": str(uuid4()),
+                "rate": {
+                    "pair": {
+                        "base": body["base_currency"],
+                        "quote": body["quote_currency"],
+                    },
+                    "rate": self.rate,
+                },
+                "expires_at": (datetime.now() + timedelta(minutes=10)).timestamp(),
+                "amount": body["amount"],
+            }
+        if method == "GET" and path == "/details":
+            return 200, {
+                "sub_address": "d046738b40da0201",
+                "vasp": "",
+                "IBAN_number": "",
+            }
+        if method == "GET" and path == "/debt":
+            return 200, {"debts": []}
+        if method == "POST" and path == "/trade":
+            return 200, {"trade_id": str(uuid4())}
+        if method == "PUT" and path.startswith("/debt/"):
+            return 200, {}
+        return 404, {}
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self) -> None:
+                super().setup()
+                self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                with stub._lock:
+                    stub.connections += 1
+
+            def do_GET(self) -> None:
+                self._respond()
+
+            def do_POST(self) -> None:
+                self._respond()
+
+            def do_PUT(self) -> None:
+                self._respond()
+
+            def _respond(self) -> None:
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length)) if length else {}
+                status, response = stub.respond(self.command, self.path, body)
+                content = json.dumps(response).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            def log_message(self, *args) -> None:
+                pass
+
+        return Handler
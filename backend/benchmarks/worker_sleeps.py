@@ -0,0 +1,64 @@
+# Copyright (c) The Diem Core Contributors
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+Jobs per second of a dramatiq worker when jobs wait by sleeping in the
+worker thread (as async_start_kyc, process_order_payment and the retry
+decorator did) versus by being sent as delayed messages.
+
+    python -m benchmarks.worker_sleeps [--jobs 200] [--wait-ms 500] [--threads 4]
+
+The default 4 threads match run_worker.sh (2 processes x 2 threads).
+"""
+
+import argparse
+import time
+from time import perf_counter
+
+import dramatiq
+from dramatiq import Worker
+from dramatiq.brokers.stub import StubBroker
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--jobs", type=int, default=200)
+    parser.add_argument("--wait-ms", type=int, default=500)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--work-ms", type=float, default=1)
+    args = parser.parse_args()
+
+    broker = StubBroker()
+    broker.emit_after("process_boot")
+
+    @dramatiq.actor(broker=broker, max_retries=0)
+    def sleeping_job() -> None:
+        time.sleep(args.wait_ms / 1000)
+        time.sleep(args.work_ms / 1000)
+
+    @dramatiq.actor(broker=broker, max_retries=0)
+    def delayed_job() -> None:
+        time.sleep(args.work_ms / 1000)
+
+    worker = Worker(broker, worker_threads=args.threads, worker_timeout=10)
+    worker.start()
+
+    def run(name, send) -> None:
+        start = perf_counter()
+        for _ in range(args.jobs):
+            send()
+        broker.join(sleeping_job.queue_name)
+        worker.join()
+        elapsed = perf_counter() - start
+        print(f"{name:>8}: {args.jobs / elapsed:8.1f} jobs/s")
+
+    run("sleep", sleeping_job.send)
+    run(
+        "delayed",
+        lambda: delayed_job.send_with_options(delay=args.wait_ms),
+    )
+    worker.stop()
+
+
+if __name__ == "__main__":
+    main()
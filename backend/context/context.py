@@ -20,9 +20,17 @@ from diem import (
 )
 
 from . import config, stubs
+from .sequence import SequenceAllocator
 
 logger = logging.getLogger(__name__)
 
+# submit errors of transactions whose sequence number the account is not at
+_SEQUENCE_ERRORS = (
+    "SEQUENCE_NUMBER_TOO_OLD",
+    "SEQUENCE_NUMBER_TOO_NEW",
+    "InvalidSeqNumber",
+)
+
 
 @dataclass
 class Context:
@@ -30,6 +38,7 @@ class Context:
     jsonrpc_client: jsonrpc.Client
     custody: stubs.custody.Client
     offchain_client: offchain.Client = field(init=False)
+    sequence_allocator: SequenceAllocator = field(init=False)
 
     def __post_init__(self) -> None:
         self.offchain_client = offchain.Client(
@@ -37,6 +46,9 @@ class Context:
             self.jsonrpc_client,
             self.config.diem_address_hrp(),
         )
+        self.sequence_allocator = SequenceAllocator(
+            self.jsonrpc_client, self.config.vasp_account_address()
+        )
 
     # ---- delegate to jsonrpc client start ----
 
@@ -58,29 +70,84 @@ class Context:
         receiver_sub_address: str,
         sender_sub_address: str,
     ) -> jsonrpc.Transaction:
+        return self.wait_for_transaction(
+            self.submit_p2p_by_general(
+                currency,
+                amount,
+                receiver_vasp_address,
+                receiver_sub_address,
+                sender_sub_address,
+            )
+        )
+
+    def p2p_by_travel_rule(
+        self,
+        receiver_vasp_address: str,
+        currency: str,
+        amount: int,
+        metadata: bytes,
+        metadata_signature: bytes,
+    ) -> jsonrpc.Transaction:
+        return self.wait_for_transaction(
+            self.submit_p2p_by_travel_rule(
+                receiver_vasp_address, currency, amount, metadata, metadata_signature
+            )
+        )
+
+    def submit_p2p_by_general(
+        self,
+        currency: str,
+        amount: int,
+        receiver_vasp_address: str,
+        receiver_sub_address: str,
+        sender_sub_address: str,
+    ) -> diem_types.SignedTransaction:
+        """Like p2p_by_general, but returns once the transaction is submitted"""
+        txn = self.create_p2p_by_general(
+            currency,
+            amount,
+            receiver_vasp_address,
+            receiver_sub_address,
+            sender_sub_address,
+        )
+        self.submit(txn)
+        return txn
+
+    def create_p2p_by_general(
+        self,
+        currency: str,
+        amount: int,
+        receiver_vasp_address: str,
+        receiver_sub_address: str,
+        sender_sub_address: str,
+    ) -> diem_types.SignedTransaction:
+        """Signs the p2p_by_general transaction without submitting it"""
         metadata = txnmetadata.general_metadata(
             from_subaddress=bytes.fromhex(sender_sub_address),
             to_subaddress=bytes.fromhex(receiver_sub_address),
         )
-        return self._p2p_transfer(
+        return self._create_p2p_transaction(
             currency, amount, receiver_vasp_address, metadata, b""
         )
 
-    def p2p_by_travel_rule(
+    def submit_p2p_by_travel_rule(
         self,
         receiver_vasp_address: str,
         currency: str,
         amount: int,
         metadata: bytes,
         metadata_signature: bytes,
-    ) -> jsonrpc.Transaction:
-        return self._p2p_transfer(
+    ) -> diem_types.SignedTransaction:
+        """Like p2p_by_travel_rule, but returns once the transaction is submitted"""
+        txn = self._create_p2p_transaction(
             currency, amount, receiver_vasp_address, metadata, metadata_signature
         )
+        self.submit(txn)
+        return txn
 
-    def _p2p_transfer(
+    def _create_p2p_transaction(
         self, currency, amount, receiver_vasp_address, metadata, signature
-    ) -> jsonrpc.Transaction:
+    ) -> diem_types.SignedTransaction:
         script = stdlib.encode_peer_to_peer_with_metadata_script(
             currency=utils.currency_code(currency),
             payee=utils.account_address(receiver_vasp_address),
@@ -89,14 +156,35 @@ class Context:
             metadata_signature=signature,
         )
 
-        txn = self.create_transaction(script)
-        return self._submit_and_wait(txn)
+        return self.create_transaction(script)
+
+    def submit(self, txn: diem_types.SignedTransaction) -> None:
+        try:
+            self.jsonrpc_client.submit(txn)
+        except jsonrpc.JsonRpcError as e:
+            # the sequence number is not used, have the next ones from chain
+            if any(error in str(e) for error in _SEQUENCE_ERRORS):
+                self.sequence_allocator.resync(txn.raw_txn.sequence_number)
+            raise
+
+    def wait_for_transaction(
+        self, txn: diem_types.SignedTransaction, timeout_secs: float = 30
+    ) -> jsonrpc.Transaction:
+        try:
+            return self.jsonrpc_client.wait_for_transaction(txn, timeout_secs)
+        except (
+            jsonrpc.TransactionExpired,
+            jsonrpc.TransactionHashMismatchError,
+            jsonrpc.WaitForTransactionTimeout,
+        ):
+            self.sequence_allocator.resync(txn.raw_txn.sequence_number)
+            raise
 
     def _submit_and_wait(
         self, txn: diem_types.SignedTransaction
     ) -> jsonrpc.Transaction:
-        self.jsonrpc_client.submit(txn)
-        return self.jsonrpc_client.wait_for_transaction(txn, 30)
+        self.submit(txn)
+        return self.wait_for_transaction(txn)
 
     # ---- delegate to jsonrpc client end ----
 
@@ -106,7 +194,7 @@ class Context:
         self, script: diem_types.Script
     ) -> diem_types.SignedTransaction:
         address = self.config.vasp_account_address()
-        seq = self.jsonrpc_client.get_account_sequence(address)
+        seq = self.sequence_allocator.allocate()
         txn = diem_types.RawTransaction(
             sender=address,
             sequence_number=diem_types.st.uint64(seq),
@@ -0,0 +1,100 @@
+# Copyright (c) The Diem Core Contributors
+# SPDX-License-Identifier: Apache-2.0
+
+import threading
+import typing
+
+import redis
+from diem import diem_types, jsonrpc
+
+
+class SequenceAllocator:
+    """
+    Hands out the sequence numbers of an account locally, so that several
+    transactions can be signed and submitted without waiting for the previous
+    one to execute. The next number is read from chain on first use and again
+    after resync, which callers do whenever a transaction may not consume its
+    number: submits rejected for their sequence number, expired or timed out
+    transactions.
+
+    Only one process may allocate for an account this way, processes sharing
+    it use RedisSequenceAllocator.
+    """
+
+    def __init__(
+        self, client: jsonrpc.Client, address: diem_types.AccountAddress
+    ) -> None:
+        self._client = client
+        self._address = address
+        self._next: typing.Optional[int] = None
+        self._lock = threading.Lock()
+
+    def allocate(self) -> int:
+        with self._lock:
+            if self._next is None:
+                self._next = self._client.get_account_sequence(self._address)
+            seq = self._next
+            self._next += 1
+            return seq
+
+    def resync(self, sequence: typing.Optional[int] = None) -> None:
+        """
+        Has the next allocation read the sequence number from chain again.
+        With sequence, only when it is the last number handed out: the ones
+        allocated after it are still in use and fail on their own if stale.
+        """
+        with self._lock:
+            if sequence is None or self._next == sequence + 1:
+                self._next = None
+
+
+class RedisSequenceAllocator(SequenceAllocator):
+    """
+    Keeps the next sequence number of the account in redis, so that every
+    process signing for it allocates from the same counter. A resync in any
+    process has all of them read it from chain again.
+    """
+
+    def __init__(
+        self,
+        client: jsonrpc.Client,
+        address: diem_types.AccountAddress,
+        redis_client: redis.Redis,
+    ) -> None:
+        super().__init__(client, address)
+        self._redis = redis_client
+        self._key = f"lrw_sequence_{address.to_hex()}"
+
+    def allocate(self) -> int:
+        with self._redis.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(self._key)
+                    seq = pipe.get(self._key)
+                    if seq is None:
+                        seq = self._client.get_account_sequence(self._address)
+                    pipe.multi()
+                    pipe.set(self._key, int(seq) + 1)
+                    pipe.execute()
+                    return int(seq)
+                except redis.WatchError:
+                    # allocated or resynced by someone else meanwhile
+                    continue
+
+    def resync(self, sequence: typing.Optional[int] = None) -> None:
+        if sequence is None:
+            self._redis.delete(self._key)
+            return
+        with self._redis.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(self._key)
+                    seq = pipe.get(self._key)
+                    if seq is None or int(seq) != sequence + 1:
+                        return
+                    pipe.multi()
+                    pipe.delete(self._key)
+                    pipe.execute()
+                    return
+                except redis.WatchError:
+                    continue
@@ -3,12 +3,18 @@
 # Copyright (c) The Diem Core Contributors
 # SPDX-License-Identifier: Apache-2.0
 
+import asyncio
+import json
 import os
+import random
+import threading
+import time
 from http import HTTPStatus
 from typing import Optional, List
 from urllib.parse import urljoin
 from uuid import UUID
 
+import aiohttp
 import requests
 
 from diem_utils.types.liquidity.currency import CurrencyPair
@@ -17,13 +23,62 @@ from diem_utils.types.liquidity.quote import QuoteData, QuoteId
 from diem_utils.types.liquidity.settlement import DebtData
 from diem_utils.types.liquidity.trade import TradeId, Direction, TradeData
 
+TIMEOUT_S = float(os.getenv("LIQUIDITY_SERVICE_TIMEOUT_S", 5))
+# how many times idempotent calls are retried on connection errors, timeouts
+# and RETRY_STATUSES
+RETRIES = int(os.getenv("LIQUIDITY_SERVICE_RETRIES", 3))
+RETRY_BACKOFF_S = float(os.getenv("LIQUIDITY_SERVICE_RETRY_BACKOFF_S", 0.1))
+RETRY_STATUSES = {
+    HTTPStatus.BAD_GATEWAY,
+    HTTPStatus.SERVICE_UNAVAILABLE,
+    HTTPStatus.GATEWAY_TIMEOUT,
+}
+POOL_SIZE = int(os.getenv("LIQUIDITY_SERVICE_POOL_SIZE", 16))
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+
+def shared_session() -> requests.Session:
+    """Keep-alive connection pool shared by every LpClient of the process"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(
+                pool_connections=1, pool_maxsize=POOL_SIZE
+            )
+            _session.mount("http://", adapter)
+            _session.mount("https://", adapter)
+        return _session
+
+
+def default_base_url() -> str:
+    return f"http://{os.getenv('LIQUIDITY_SERVICE_HOST', 'liquidity')}:{os.getenv('LIQUIDITY_SERVICE_PORT', 5000)}"
+
+
+def retry_delay(attempt: int) -> float:
+    """Exponential backoff with full jitter"""
+    return random.uniform(0, RETRY_BACKOFF_S * 2 ** attempt)
+
 
 class LpClient:
-    def __init__(self, base_url=None):
-        self._base_url = f"http://{os.getenv('LIQUIDITY_SERVICE_HOST', 'liquidity')}:{os.getenv('LIQUIDITY_SERVICE_PORT', 5000)}"
+    """
+    Liquidity Provider client. Clients are cheap, they all share the process
+    wide connection pool unless given their own session.
+    """
 
-        if base_url:
-            self._base_url = base_url
+    def __init__(
+        self,
+        base_url=None,
+        session: Optional[requests.Session] = None,
+        timeout: float = TIMEOUT_S,
+        retries: int = RETRIES,
+    ):
+        self._base_url = base_url or default_base_url()
+        self._session = session if session is not None else shared_session()
+        self._timeout = timeout
+        self._retries = retries
 
     def get_quote(self, pair: CurrencyPair, amount: int) -> QuoteData:
         data = {
@@ -31,13 +86,13 @@ class LpClient:
             "quote_currency": pair.quote.value,
             "amount": amount,
         }
-        response = requests.post(url=urljoin(self._base_url, "quote"), json=data)
+        response = self._request("POST", "quote", idempotent=True, json=data)
         raise_if_failed(response, f"Failed to get quote for {data}")
 
         return QuoteData.from_json(response.text)
 
     def lp_details(self) -> LPDetails:
-        response = requests.get(url=urljoin(self._base_url, "details"))
+        response = self._request("GET", "details", idempotent=True)
         raise_if_failed(response, "Failed to get Liquidity Provider details")
 
         return LPDetails.from_json(response.text)
@@ -45,7 +100,7 @@ class LpClient:
     def trade_info(self, trade_id: TradeId) -> TradeData:
         trade_id_str = str(trade_id)
 
-        response = requests.get(url=urljoin(self._base_url, f"trade/{trade_id_str}"))
+        response = self._request("GET", f"trade/{trade_id_str}", idempotent=True)
         raise_if_failed(response, f"Failed to get info for trade ID {trade_id_str}")
 
         return TradeData.from_json(response.text)
@@ -57,33 +112,26 @@ class LpClient:
         diem_deposit_address: Optional[str] = None,
         tx_version: Optional[int] = None,
     ) -> TradeId:
-        request_body = {
-            "quote_id": str(quote_id),
-            "direction": direction.value,
-        }
-
-        if diem_deposit_address:
-            request_body["diem_deposit_address"] = diem_deposit_address
-
-        if tx_version:
-            request_body["tx_version"] = tx_version
-
-        response = requests.post(
-            url=urljoin(self._base_url, "trade"), json=request_body
+        request_body = trade_request_body(
+            quote_id, direction, diem_deposit_address, tx_version
         )
+
+        response = self._request("POST", "trade", idempotent=False, json=request_body)
         raise_if_failed(response, f"Failed to execute trade for {request_body}")
 
         return TradeId(UUID(response.json()["trade_id"]))
 
     def get_debt(self) -> List[DebtData]:
-        response = requests.get(url=urljoin(self._base_url, "debt"))
+        response = self._request("GET", "debt", idempotent=True)
         raise_if_failed(response, "Failed to retrieve debt")
 
         return [DebtData.from_dict(debt_dict) for debt_dict in response.json()["debts"]]
 
     def settle(self, debt_id, settlement_confirmation):
-        response = requests.put(
-            url=urljoin(self._base_url, f"debt/{debt_id}"),
+        response = self._request(
+            "PUT",
+            f"debt/{debt_id}",
+            idempotent=False,
             json={"settlement_confirmation": settlement_confirmation},
         )
         raise_if_failed(
@@ -92,10 +140,181 @@ class LpClient:
             f"confirmation {settlement_confirmation}",
         )
 
+    def _request(
+        self, method: str, path: str, idempotent: bool, **kwargs
+    ) -> requests.Response:
+        attempts = 1 + (self._retries if idempotent else 0)
+        for attempt in range(attempts):
+            last_attempt = attempt == attempts - 1
+            try:
+                response = self._session.request(
+                    method,
+                    urljoin(self._base_url, path),
+                    timeout=self._timeout,
+                    **kwargs,
+                )
+            except (requests.ConnectionError, requests.Timeout):
+                if last_attempt:
+                    raise
+            else:
+                if last_attempt or response.status_code not in RETRY_STATUSES:
+                    return response
+            time.sleep(retry_delay(attempt))
+
+
+class AsyncLpClient:
+    """
+    asyncio variant of LpClient, to fan out many calls from one thread.
+    Its connection pool belongs to the event loop it is first used in, close
+    it (or use the client as an async context manager) before the loop ends.
+    """
+
+    def __init__(
+        self,
+        base_url=None,
+        timeout: float = TIMEOUT_S,
+        retries: int = RETRIES,
+        pool_size: int = POOL_SIZE,
+    ):
+        self._base_url = base_url or default_base_url()
+        self._timeout = aiohttp.ClientTimeout(total=timeout)
+        self._retries = retries
+        self._pool_size = pool_size
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    async def __aenter__(self) -> "AsyncLpClient":
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        await self.close()
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def get_quote(self, pair: CurrencyPair, amount: int) -> QuoteData:
+        data = {
+            "base_currency": pair.base.value,
+            "quote_currency": pair.quote.value,
+            "amount": amount,
+        }
+        status, text = await self._request("POST", "quote", idempotent=True, json=data)
+        raise_if_status_failed(status, f"Failed to get quote for {data}")
+
+        return QuoteData.from_json(text)
+
+    async def get_quotes(
+        self, pairs: List[CurrencyPair], amount: int
+    ) -> List[QuoteData]:
+        return await asyncio.gather(*(self.get_quote(pair, amount) for pair in pairs))
+
+    async def lp_details(self) -> LPDetails:
+        status, text = await self._request("GET", "details", idempotent=True)
+        raise_if_status_failed(status, "Failed to get Liquidity Provider details")
+
+        return LPDetails.from_json(text)
+
+    async def trade_info(self, trade_id: TradeId) -> TradeData:
+        trade_id_str = str(trade_id)
+
+        status, text = await self._request(
+            "GET", f"trade/{trade_id_str}", idempotent=True
+        )
+        raise_if_status_failed(
+            status, f"Failed to get info for trade ID {trade_id_str}"
+        )
+
+        return TradeData.from_json(text)
+
+    async def trade_and_execute(
+        self,
+        quote_id: QuoteId,
+        direction: Direction,
+        diem_deposit_address: Optional[str] = None,
+        tx_version: Optional[int] = None,
+    ) -> TradeId:
+        request_body = trade_request_body(
+            quote_id, direction, diem_deposit_address, tx_version
+        )
+
+        status, text = await self._request(
+            "POST", "trade", idempotent=False, json=request_body
+        )
+        raise_if_status_failed(status, f"Failed to execute trade for {request_body}")
+
+        return TradeId(UUID(json.loads(text)["trade_id"]))
+
+    async def get_debt(self) -> List[DebtData]:
+        status, text = await self._request("GET", "debt", idempotent=True)
+        raise_if_status_failed(status, "Failed to retrieve debt")
+
+        return [
+            DebtData.from_dict(debt_dict) for debt_dict in json.loads(text)["debts"]
+        ]
+
+    async def settle(self, debt_id, settlement_confirmation):
+        status, _ = await self._request(
+            "PUT",
+            f"debt/{debt_id}",
+            idempotent=False,
+            json={"settlement_confirmation": settlement_confirmation},
+        )
+        raise_if_status_failed(
+            status,
+            f"Failed to settle debt ID {debt_id}; "
+            f"confirmation {settlement_confirmation}",
+        )
+
+    async def _request(self, method: str, path: str, idempotent: bool, **kwargs):
+        if self._session is None:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self._pool_size),
+                timeout=self._timeout,
+            )
+
+        attempts = 1 + (self._retries if idempotent else 0)
+        for attempt in range(attempts):
+            last_attempt = attempt == attempts - 1
+            try:
+                async with self._session.request(
+                    method, urljoin(self._base_url, path), **kwargs
+                ) as response:
+                    if last_attempt or response.status not in RETRY_STATUSES:
+                        return response.status, await response.text()
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                if last_attempt:
+                    raise
+            await asyncio.sleep(retry_delay(attempt))
+
+
+def trade_request_body(
+    quote_id: QuoteId,
+    direction: Direction,
+    diem_deposit_address: Optional[str],
+    tx_version: Optional[int],
+) -> dict:
+    request_body = {
+        "quote_id": str(quote_id),
+        "direction": direction.value,
+    }
+
+    if diem_deposit_address:
+        request_body["diem_deposit_address"] = diem_deposit_address
+
+    if tx_version:
+        request_body["tx_version"] = tx_version
+
+    return request_body
+
 
 def raise_if_failed(response, error_description):
-    if response.status_code < 200 or response.status_code >= 300:
-        raise LpError(f"{error_description} ({response.status_code})")
+    raise_if_status_failed(response.status_code, error_description)
+
+
+def raise_if_status_failed(status_code: int, error_description: str):
+    if status_code < 200 or status_code >= 300:
+        raise LpError(f"{error_description} ({status_code})")
 
 
 class LpError(Exception):
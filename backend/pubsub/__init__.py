@@ -9,6 +9,15 @@ JSON_RPC_URL = os.getenv("JSON_RPC_URL")
 DEFL_CONFIG = {
     "diem_node_uri": JSON_RPC_URL,
     "sync_interval_ms": 1000,
+    # idle polling backs off up to this interval, full batches are drained at once
+    "max_sync_interval_ms": int(os.getenv("PUBSUB_MAX_SYNC_INTERVAL_MS", 5000)),
+    "fetch_batch_size": int(os.getenv("PUBSUB_FETCH_BATCH_SIZE", 100)),
+    # event keys fetched in parallel
+    "fetch_concurrency": int(os.getenv("PUBSUB_FETCH_CONCURRENCY", 8)),
+    # serve prometheus metrics on this port when set
+    "metrics_port": os.getenv("PUBSUB_METRICS_PORT"),
+    # "file", "sql" (the wallet database) or "redis"
+    "progress_backend": os.getenv("PUBSUB_PROGRESS_BACKEND", "file"),
     "progress_file_path": "/tmp/pubsub_progress",
     "accounts": [VASP_ADDR],
 }
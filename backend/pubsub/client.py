@@ -4,69 +4,99 @@
 # SPDX-License-Identifier: Apache-2.0
 
 import time
-from typing import Any, Dict, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
 
 import logging
-import json
+
+import requests
+from prometheus_client import Counter, Gauge, Histogram, start_http_server
 
 from wallet.background_tasks.background import process_incoming_txn
+from .progress import FileProgressStorage, create_progress_storage
 from .types import LRWPubSubEvent
 from diem import jsonrpc
 
 
-class FileProgressStorage:
-    def __init__(self, path: str) -> None:
-        self.path = path
-
-    def fetch_state(self) -> Dict[str, int]:
-        try:
-            with open(self.path, "r") as file:
-                return json.loads(file.read())
-        except (FileNotFoundError, json.JSONDecodeError):
-            return {}
-
-    def save_state(self, state: Dict[str, int]) -> None:
-        with open(self.path, "w") as file:
-            file.write(json.dumps(state))
+EVENTS_PROCESSED = Counter(
+    "lrw_pubsub_events_processed", "Events handed to the processor", ["event_key"]
+)
+VERSIONS_BEHIND = Gauge(
+    "lrw_pubsub_versions_behind",
+    "Ledger versions between the last processed event and the chain",
+    ["event_key"],
+)
+FETCH_SECONDS = Histogram("lrw_pubsub_fetch_seconds", "Duration of one get_events call")
 
 
 class LRWPubSubClient:
     def __init__(self, config: Dict[str, Any]) -> None:
         self.sync_interval_ms = config["sync_interval_ms"]
+        self.max_sync_interval_ms = config.get(
+            "max_sync_interval_ms", self.sync_interval_ms
+        )
         self.accounts = config["accounts"]
 
         self.diem_node_uri = config["diem_node_uri"]
         self.progress_file_path = config["progress_file_path"]
-        self.fetch_batch_size = 10
+        self.fetch_batch_size = config.get("fetch_batch_size", 10)
+        self.fetch_concurrency = config.get("fetch_concurrency", 1)
+        self.metrics_port = config.get("metrics_port")
         self.processor = config.get("processor", process_incoming_txn)
+        # whether the last sync got a full batch for some key, more events are waiting
+        self.behind = False
 
         logging.info(f"Loaded LRWPubSubClient with config: {config}")
 
-        self.client = jsonrpc.Client(self.diem_node_uri)
-        self.progress = FileProgressStorage(self.progress_file_path)
+        # one connection pool shared by the concurrent fetches
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=1, pool_maxsize=self.fetch_concurrency
+        )
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        self.client = jsonrpc.Client(self.diem_node_uri, session=session)
+        self.executor = ThreadPoolExecutor(
+            max_workers=self.fetch_concurrency, thread_name_prefix="pubsub-fetch"
+        )
+        self.progress = create_progress_storage(config)
 
     def start(self) -> None:
+        if self.metrics_port:
+            start_http_server(int(self.metrics_port))
         sync_state = self.init_progress_state()
+        interval_ms = self.sync_interval_ms
         while True:
             sync_state = self.sync(sync_state, catch_error=True)
-            time.sleep(self.sync_interval_ms / 1000)
+            if self.behind:
+                interval_ms = self.sync_interval_ms
+                continue
+            time.sleep(interval_ms / 1000)
+            interval_ms = min(interval_ms * 2, self.max_sync_interval_ms)
 
     def sync(
         self, state: Dict[str, int], catch_error: Optional[bool] = False
     ) -> Dict[str, int]:
         after_sync_state = state.copy()
-        for key in state:
+        # fetch every key concurrently, then hand events over in key order
+        fetches = {
+            key: self.executor.submit(self._fetch_events, key, sequence_num)
+            for key, sequence_num in state.items()
+        }
+        self.behind = False
+        for key, fetch in fetches.items():
             try:
-                sequence_num = state[key]
-                events = self.client.get_events(
-                    key, sequence_num, self.fetch_batch_size
-                )
+                events = fetch.result()
                 for event in events:
-                    lrw_event = LRWPubSubEvent.from_jsonrpc_event(event)
-                    self.processor.send(lrw_event)
-                    logging.info(f"SUCCESS: sent to wallet onchain {lrw_event}")
-
-                after_sync_state[key] = sequence_num + len(events)
+                    sequence_num = event.sequence_number
+                    if not self.progress.is_recorded(key, sequence_num):
+                        lrw_event = LRWPubSubEvent.from_jsonrpc_event(event)
+                        self.processor.send(lrw_event)
+                        self.progress.record_event(key, sequence_num)
+                        logging.info(f"SUCCESS: sent to wallet onchain {lrw_event}")
+                    after_sync_state[key] = sequence_num + 1
+
+                self._report_progress(key, events)
             except Exception as exc:
                 logging.error(f"failed to perform sync for event key {key}: {exc}")
                 if not catch_error:
@@ -77,6 +107,22 @@ class LRWPubSubClient:
 
         return after_sync_state
 
+    def _fetch_events(self, key: str, sequence_num: int) -> List[jsonrpc.Event]:
+        with FETCH_SECONDS.time():
+            return self.client.get_events(key, sequence_num, self.fetch_batch_size)
+
+    def _report_progress(self, key: str, events: List[jsonrpc.Event]) -> None:
+        EVENTS_PROCESSED.labels(event_key=key).inc(len(events))
+        if len(events) == self.fetch_batch_size:
+            self.behind = True
+        if events:
+            chain_version = self.client.get_last_known_state().version
+            VERSIONS_BEHIND.labels(event_key=key).set(
+                max(0, chain_version - events[-1].transaction_version)
+            )
+        else:
+            VERSIONS_BEHIND.labels(event_key=key).set(0)
+
     def init_progress_state(self) -> Dict[str, int]:
         state = self.progress.fetch_state()
         for address in self.accounts:
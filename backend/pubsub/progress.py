@@ -0,0 +1,161 @@
+# pyre-strict
+
+# Copyright (c) The Diem Core Contributors
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+Where LRWPubSubClient keeps how far it got. Every store records each event
+handed to the processor together with the next sequence number to fetch for
+its key, in one atomic write, so that a restart resumes right after the last
+event recorded. Only an event sent but not yet recorded when the process
+died is sent again, and the wallet skips it as it records the events it
+processed (event key, sequence) with the transactions they write.
+"""
+
+import json
+import os
+import tempfile
+from typing import Any, Dict
+
+import redis
+
+from wallet import storage
+from wallet.config import REDIS_HOST, REDIS_PORT, REDIS_DB, REDIS_PASSWORD
+
+
+class FileProgressStorage:
+    """
+    JSON file of the next sequence number per event key. The file is replaced
+    atomically (written aside, fsynced, renamed), and an event is recorded by
+    moving its key cursor past it.
+    """
+
+    def __init__(self, path: str, fsync: bool = True) -> None:
+        self.path = path
+        self.fsync = fsync
+        self._state = None
+
+    def fetch_state(self) -> Dict[str, int]:
+        try:
+            with open(self.path, "r") as file:
+                self._state = json.loads(file.read())
+        except (FileNotFoundError, json.JSONDecodeError):
+            self._state = {}
+        return self._state.copy()
+
+    def save_state(self, state: Dict[str, int]) -> None:
+        self._state = state.copy()
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".progress")
+        try:
+            with os.fdopen(fd, "w") as file:
+                file.write(json.dumps(state))
+                file.flush()
+                if self.fsync:
+                    os.fsync(file.fileno())
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        if self.fsync:
+            dir_fd = os.open(directory, os.O_RDONLY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
+
+    def is_recorded(self, event_key: str, sequence: int) -> bool:
+        if self._state is None:
+            self.fetch_state()
+        return sequence < self._state.get(event_key, 0)
+
+    def record_event(self, event_key: str, sequence: int) -> None:
+        if self._state is None:
+            self.fetch_state()
+        state = self._state.copy()
+        state[event_key] = max(state.get(event_key, 0), sequence + 1)
+        self.save_state(state)
+
+
+class SqlProgressStorage:
+    """
+    Cursors and per event idempotency records kept in the wallet database,
+    both written by the same database transaction. Records more than
+    records_kept events behind the cursor are deleted as the state is saved.
+    """
+
+    def __init__(self, records_kept: int = 10000) -> None:
+        self.records_kept = records_kept
+
+    def fetch_state(self) -> Dict[str, int]:
+        return storage.get_pubsub_progress()
+
+    def save_state(self, state: Dict[str, int]) -> None:
+        storage.set_pubsub_progress(state)
+        storage.prune_pubsub_events(state, self.records_kept)
+
+    def is_recorded(self, event_key: str, sequence: int) -> bool:
+        return storage.is_pubsub_event_recorded(event_key, sequence)
+
+    def record_event(self, event_key: str, sequence: int) -> None:
+        storage.record_pubsub_event(event_key, sequence)
+
+
+class RedisProgressStorage:
+    """
+    Cursors in a redis hash and idempotency records in a sorted set per event
+    key trimmed to the latest records_kept, written by one MULTI / EXEC.
+    Durability is that of the redis persistence configuration (appendonly
+    with appendfsync always to fsync every write).
+    """
+
+    def __init__(
+        self,
+        client: redis.Redis,
+        namespace: str = "lrw:pubsub",
+        records_kept: int = 10000,
+    ) -> None:
+        self.client = client
+        self.progress_key = f"{namespace}:progress"
+        self.events_key = f"{namespace}:events"
+        self.records_kept = records_kept
+
+    def fetch_state(self) -> Dict[str, int]:
+        return {
+            key.decode(): int(sequence)
+            for key, sequence in self.client.hgetall(self.progress_key).items()
+        }
+
+    def save_state(self, state: Dict[str, int]) -> None:
+        if state:
+            self.client.hset(self.progress_key, mapping=state)
+
+    def is_recorded(self, event_key: str, sequence: int) -> bool:
+        records_key = f"{self.events_key}:{event_key}"
+        if self.client.zscore(records_key, sequence) is not None:
+            return True
+        # records older than the kept ones are behind the cursor
+        return sequence < int(self.client.hget(self.progress_key, event_key) or 0)
+
+    def record_event(self, event_key: str, sequence: int) -> None:
+        records_key = f"{self.events_key}:{event_key}"
+        pipeline = self.client.pipeline(transaction=True)
+        pipeline.zadd(records_key, {sequence: sequence})
+        pipeline.zremrangebyrank(records_key, 0, -self.records_kept - 1)
+        pipeline.hset(self.progress_key, event_key, sequence + 1)
+        pipeline.execute()
+
+
+def create_progress_storage(config: Dict[str, Any]):
+    backend = config.get("progress_backend", "file")
+    if backend == "file":
+        return FileProgressStorage(config["progress_file_path"])
+    if backend == "sql":
+        return SqlProgressStorage()
+    if backend == "redis":
+        client = redis.StrictRedis(
+            host=REDIS_HOST, port=REDIS_PORT, db=REDIS_DB, password=REDIS_PASSWORD
+        )
+        return RedisProgressStorage(client)
+
+    raise ValueError(f"Unknown pubsub progress backend {backend}")
@@ -3,6 +3,8 @@
 # Copyright (c) The Diem Core Contributors
 # SPDX-License-Identifier: Apache-2.0
 
+from typing import Optional
+
 from diem import diem_types, jsonrpc
 
 
@@ -16,6 +18,7 @@ class LRWPubSubEvent:
         metadata: bytes,
         version: int,
         sequence: int,
+        event_key: Optional[str] = None,
     ) -> None:
         self.sender = sender
         self.receiver = receiver
@@ -23,6 +26,7 @@ class LRWPubSubEvent:
         self.currency = currency
         self.version = version
         self.sequence = sequence
+        self.event_key = event_key
 
         # The metadata deserializer is totally a prickly drama queen
         # It breaks on data directly from the blockchain without saying much
@@ -42,6 +46,7 @@ class LRWPubSubEvent:
             metadata=bytes.fromhex(event.data.metadata),
             version=event.transaction_version,
             sequence=event.sequence_number,
+            event_key=event.key,
         )
 
     def __str__(self) -> str:
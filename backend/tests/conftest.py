@@ -10,9 +10,16 @@ from typing import Dict, Optional, List, Generator
 from uuid import uuid4
 
 import context
+import fakeredis
 import pytest
-from diem import diem_types, identifier
-from diem.jsonrpc import Client as DiemClient, Transaction, TransactionData
+from diem import diem_types, identifier, utils
+from diem.jsonrpc import (
+    Client as DiemClient,
+    Transaction,
+    TransactionData,
+    VMStatus,
+    constants,
+)
 from diem.testnet import Faucet
 from diem.txnmetadata import general_metadata
 from diem_utils.sdks.liquidity import LpClient
@@ -28,8 +35,12 @@ from tests.wallet_tests.client_sdk_mocks import (
 )
 from tests.wallet_tests.services.fx.test_fx import rates
 from wallet import services
+from wallet.cache import RedisCache
+from wallet.config import TOKEN_CACHE_TTL_S
+from wallet.services import user as user_service
+from wallet.services.fx.fx import get_rates_snapshot, update_rates
 from wallet.services.transaction import process_incoming_transaction
-from wallet.storage import db_session
+from wallet.storage import db_session, get_submitted_transactions
 
 FAKE_WALLET_PRIVATE_KEY = (
     "682ddb5bcb41abd0a362fe3b332af32a9135abc8effbd75abe8ec6192e2b0c8b"
@@ -49,6 +60,17 @@ def env_context():
     context.set(None)
 
 
+@pytest.fixture(autouse=True)
+def token_cache_server(monkeypatch) -> fakeredis.FakeServer:
+    """The redis of the token cache, one per test"""
+    server = fakeredis.FakeServer()
+    cache = RedisCache(
+        fakeredis.FakeStrictRedis(server=server), "lrw:cache:token", TOKEN_CACHE_TTL_S
+    )
+    monkeypatch.setattr(user_service, "token_cache", cache)
+    return server
+
+
 @pytest.fixture(autouse=True)
 def clean_db() -> Generator[None, None, None]:
     yield clear_db()
@@ -86,6 +108,27 @@ def patch_blockchain(monkeypatch):
     yield network
 
 
+@pytest.fixture
+def submitted_transactions_execute(monkeypatch) -> None:
+    """The chain has executed every submitted transaction, at version 1000 + id"""
+
+    def get_account_transactions(self, address, sequence, limit, *args):
+        return [
+            Transaction(
+                version=1000 + txn.id,
+                transaction=TransactionData(sequence_number=txn.sequence),
+                hash=txn.blockchain_hash,
+                vm_status=VMStatus(type=constants.VM_STATUS_EXECUTED),
+            )
+            for txn in get_submitted_transactions()
+            if sequence <= txn.sequence < sequence + limit
+        ]
+
+    monkeypatch.setattr(
+        DiemClient, "get_account_transactions", get_account_transactions
+    )
+
+
 @pytest.fixture(autouse=True)
 def no_background_tasks(monkeypatch) -> None:
     def mocked() -> bool:
@@ -130,13 +173,17 @@ class LpClientMock:
         quote = LpClientMock.QUOTES[quote_id]
         trade_id = TradeId(uuid4())
         metadata = diem_types.Metadata__Undefined()
+        receiver_address = diem_deposit_address
         if diem_deposit_address is not None:
             addr, subaddr = identifier.decode_account(diem_deposit_address, "tdm")
-            metadata = general_metadata(to_subaddress=subaddr)
+            metadata = diem_types.Metadata.bcs_deserialize(
+                general_metadata(to_subaddress=subaddr)
+            )
+            receiver_address = utils.account_address_hex(addr)
         if direction == Direction.Buy:
             process_incoming_transaction(
                 sender_address="",
-                receiver_address=diem_deposit_address,
+                receiver_address=receiver_address,
                 sequence=1,
                 amount=quote.amount,
                 currency=quote.rate.pair.base.value,
@@ -164,3 +211,9 @@ class LpClientMock:
 def mock_lp_client(monkeypatch):
     for name, func in inspect.getmembers(LpClientMock, predicate=inspect.isfunction):
         setattr(LpClient, name, func)
+
+
+@pytest.fixture(autouse=True)
+def rates_snapshot(mock_lp_client):
+    if not get_rates_snapshot().rates:
+        update_rates()
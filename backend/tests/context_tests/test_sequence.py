@@ -0,0 +1,149 @@
+# Copyright (c) The Diem Core Contributors
+# SPDX-License-Identifier: Apache-2.0
+
+import dataclasses
+from concurrent.futures import ThreadPoolExecutor
+
+import fakeredis
+import pytest
+import context
+
+from diem import LocalAccount, jsonrpc, stdlib
+from context.sequence import RedisSequenceAllocator, SequenceAllocator
+
+
+TOO_NEW = "{'code': -32001, 'message': 'Server error: VM Validation error: SEQUENCE_NUMBER_TOO_NEW'}"
+
+
+class ChainMock:
+    def __init__(self, sequence: int = 5) -> None:
+        self.sequence = sequence
+        self.sequence_reads = 0
+        self.submitted = []
+        self.reject = None
+
+    def get_account_sequence(self, address) -> int:
+        self.sequence_reads += 1
+        return self.sequence
+
+    def submit(self, txn) -> None:
+        if self.reject:
+            raise jsonrpc.JsonRpcError(self.reject)
+        self.submitted.append(txn.raw_txn.sequence_number)
+
+    def wait_for_transaction(self, txn, timeout_secs=None):
+        raise jsonrpc.TransactionExpired("expired")
+
+
+def test_allocate_reads_sequence_from_chain_once():
+    chain = ChainMock(sequence=5)
+    allocator = SequenceAllocator(chain, None)
+
+    with ThreadPoolExecutor(8) as executor:
+        sequences = list(executor.map(lambda _: allocator.allocate(), range(100)))
+
+    assert sorted(sequences) == list(range(5, 105))
+    assert chain.sequence_reads == 1
+
+
+def test_resync_reads_sequence_from_chain_again():
+    chain = ChainMock(sequence=5)
+    allocator = SequenceAllocator(chain, None)
+    assert allocator.allocate() == 5
+    assert allocator.allocate() == 6
+
+    allocator.resync()
+
+    assert allocator.allocate() == 5
+    assert chain.sequence_reads == 2
+
+
+def test_redis_allocators_share_sequence():
+    chain = ChainMock(sequence=5)
+    address = LocalAccount.generate().account_address
+    server = fakeredis.FakeServer()
+    allocators = [
+        RedisSequenceAllocator(chain, address, fakeredis.FakeStrictRedis(server=server))
+        for _ in range(2)
+    ]
+
+    sequences = [allocators[0].allocate()]
+    with ThreadPoolExecutor(8) as executor:
+        sequences += executor.map(lambda i: allocators[i % 2].allocate(), range(99))
+
+    assert sorted(sequences) == list(range(5, 105))
+    assert chain.sequence_reads == 1
+
+    # a resync in one process reaches the other
+    allocators[0].resync()
+    assert allocators[1].allocate() == 5
+    assert chain.sequence_reads == 2
+
+
+def test_transactions_are_submitted_without_waiting():
+    chain = ChainMock(sequence=3)
+    ctx = dataclasses.replace(context.for_local_dev(), jsonrpc_client=chain)
+    script = stdlib.encode_rotate_dual_attestation_info_script(b"url", b"key")
+
+    for _ in range(3):
+        ctx.submit(ctx.create_transaction(script))
+
+    assert chain.submitted == [3, 4, 5]
+    assert chain.sequence_reads == 1
+
+
+def test_rejected_and_expired_transactions_resync_sequence():
+    chain = ChainMock(sequence=3)
+    ctx = dataclasses.replace(context.for_local_dev(), jsonrpc_client=chain)
+    script = stdlib.encode_rotate_dual_attestation_info_script(b"url", b"key")
+
+    chain.reject = TOO_NEW
+    with pytest.raises(jsonrpc.JsonRpcError):
+        ctx.submit(ctx.create_transaction(script))
+    chain.reject = None
+
+    txn = ctx.create_transaction(script)
+    assert txn.raw_txn.sequence_number == 3
+    ctx.submit(txn)
+    with pytest.raises(jsonrpc.TransactionExpired):
+        ctx.wait_for_transaction(txn)
+
+    assert ctx.create_transaction(script).raw_txn.sequence_number == 3
+    assert chain.sequence_reads == 3
+
+
+def test_only_sequence_errors_of_the_last_transaction_resync_sequence():
+    chain = ChainMock(sequence=3)
+    ctx = dataclasses.replace(context.for_local_dev(), jsonrpc_client=chain)
+    script = stdlib.encode_rotate_dual_attestation_info_script(b"url", b"key")
+
+    chain.reject = (
+        "{'code': -32001, 'message': 'INSUFFICIENT_BALANCE_FOR_TRANSACTION_FEE'}"
+    )
+    with pytest.raises(jsonrpc.JsonRpcError):
+        ctx.submit(ctx.create_transaction(script))
+    assert ctx.create_transaction(script).raw_txn.sequence_number == 4
+
+    # 6 is outstanding, 5 failing does not hand it out again
+    chain.reject = TOO_NEW
+    txn = ctx.create_transaction(script)
+    assert ctx.create_transaction(script).raw_txn.sequence_number == 6
+    with pytest.raises(jsonrpc.JsonRpcError):
+        ctx.submit(txn)
+    assert ctx.create_transaction(script).raw_txn.sequence_number == 7
+    assert chain.sequence_reads == 1
+
+
+def test_redis_resync_of_an_older_sequence_keeps_the_counter():
+    chain = ChainMock(sequence=5)
+    address = LocalAccount.generate().account_address
+    allocator = RedisSequenceAllocator(chain, address, fakeredis.FakeStrictRedis())
+    assert allocator.allocate() == 5
+    assert allocator.allocate() == 6
+
+    allocator.resync(5)
+    assert allocator.allocate() == 7
+
+    allocator.resync(7)
+    assert allocator.allocate() == 5
+    assert chain.sequence_reads == 2
@@ -8,7 +8,7 @@ import tempfile
 import typing
 from time import sleep
 
-from diem import testnet, utils
+from diem import jsonrpc, testnet, utils
 from pubsub import types, DEFL_CONFIG
 from pubsub.client import LRWPubSubClient
 
@@ -105,6 +105,59 @@ def test_sync_catch_error():
         assert new_state == {account.received_events_key: 0}
 
 
+def test_sync_drains_keys_concurrently():
+    chain = JsonRpcStub({"key1": 25, "key2": 3})
+    processor = ProcessorStub()
+
+    config = DEFL_CONFIG.copy()
+    config["processor"] = processor
+    config["fetch_batch_size"] = 10
+    config["fetch_concurrency"] = 2
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        config["progress_file_path"] = tmpdir + "/progress"
+        client = LRWPubSubClient(config)
+        client.client = chain
+
+        state = client.sync({"key1": 0, "key2": 0})
+        assert state == {"key1": 10, "key2": 3}
+        assert client.behind
+
+        state = client.sync(client.sync(state))
+        assert state == {"key1": 25, "key2": 3}
+        assert not client.behind
+        assert state == client.progress.fetch_state()
+
+    assert [e.sequence for e in processor.events if e.sender == "key1"] == list(
+        range(25)
+    )
+
+
+class JsonRpcStub:
+    def __init__(self, event_counts: typing.Dict[str, int]) -> None:
+        self.event_counts = event_counts
+
+    def get_events(self, key: str, start: int, limit: int):
+        end = min(start + limit, self.event_counts[key])
+        return [
+            jsonrpc.Event(
+                key=key,
+                sequence_number=sequence,
+                transaction_version=sequence,
+                data=jsonrpc.EventData(
+                    sender=key,
+                    receiver="receiver",
+                    amount=jsonrpc.Amount(amount=1, currency="XUS"),
+                    metadata="",
+                ),
+            )
+            for sequence in range(start, end)
+        ]
+
+    def get_last_known_state(self):
+        return jsonrpc.State(chain_id=2, version=100, timestamp_usecs=0)
+
+
 class ProcessorStub:
     events: typing.List[types.LRWPubSubEvent]
 
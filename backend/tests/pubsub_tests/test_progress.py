@@ -0,0 +1,93 @@
+# pyre-strict
+
+# Copyright (c) The Diem Core Contributors
+# SPDX-License-Identifier: Apache-2.0
+
+import os
+import tempfile
+
+import fakeredis
+import pytest
+
+from pubsub.progress import (
+    FileProgressStorage,
+    RedisProgressStorage,
+    SqlProgressStorage,
+)
+from pubsub.types import LRWPubSubEvent
+from wallet.background_tasks import background
+from wallet.storage import PubSubEvent
+
+
+@pytest.fixture(params=["file", "sql", "redis"])
+def progress_storage_factory(request):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        server = fakeredis.FakeServer()
+        yield {
+            "file": lambda: FileProgressStorage(os.path.join(tmpdir, "progress")),
+            "sql": SqlProgressStorage,
+            "redis": lambda: RedisProgressStorage(
+                fakeredis.FakeStrictRedis(server=server), records_kept=2
+            ),
+        }[request.param]
+
+
+def test_record_event_survives_restart(progress_storage_factory) -> None:
+    progress = progress_storage_factory()
+    progress.save_state({"key1": 0, "key2": 5})
+
+    for sequence in range(3):
+        assert not progress.is_recorded("key1", sequence)
+        progress.record_event("key1", sequence)
+        assert progress.is_recorded("key1", sequence)
+
+    restarted = progress_storage_factory()
+    assert restarted.fetch_state() == {"key1": 3, "key2": 5}
+    assert restarted.is_recorded("key1", 0)
+    assert restarted.is_recorded("key2", 4)
+    assert not restarted.is_recorded("key1", 3)
+
+
+def test_file_progress_is_replaced_atomically() -> None:
+    with tempfile.TemporaryDirectory() as tmpdir:
+        progress = FileProgressStorage(os.path.join(tmpdir, "progress"))
+        progress.save_state({"key": 1})
+        progress.record_event("key", 1)
+
+        assert os.listdir(tmpdir) == ["progress"]
+        assert FileProgressStorage(progress.path).fetch_state() == {"key": 2}
+
+
+def test_sql_progress_prunes_old_records() -> None:
+    progress = SqlProgressStorage(records_kept=2)
+    for sequence in range(5):
+        progress.record_event("key", sequence)
+    progress.save_state({"key": 5})
+
+    assert PubSubEvent.query.count() == 2
+    # behind the cursor, still recorded
+    assert progress.is_recorded("key", 0)
+
+
+def test_event_sent_again_is_processed_once(monkeypatch) -> None:
+    processed = []
+    monkeypatch.setattr(
+        background,
+        "process_incoming_transaction",
+        lambda **kwargs: processed.append(kwargs["sequence"]),
+    )
+    event = LRWPubSubEvent(
+        sender="f72589b71ff4f8d139674a3f7369c69b",
+        receiver="c77e1ae3e4a136f070bfcce807747daf",
+        amount=100,
+        currency="XUS",
+        metadata=b"",
+        version=1,
+        sequence=0,
+        event_key="key",
+    )
+
+    background.process_incoming_txn.fn(event)
+    background.process_incoming_txn.fn(event)
+
+    assert processed == [0]
@@ -3,7 +3,14 @@
 # Copyright (c) The Diem Core Contributors
 # SPDX-License-Identifier: Apache-2.0
 
-from wallet.storage import db_session, engine, Base
+from wallet.services.account import subaddress_allocator
+from wallet.storage import (
+    db_session,
+    engine,
+    Base,
+    internal_subaddress_cache,
+    subaddress_cache,
+)
 from wallet.storage.models import User, Account
 from wallet.types import RegistrationStatus
 from diem_utils.types.currencies import FiatCurrency
@@ -12,6 +19,9 @@ from diem_utils.types.currencies import FiatCurrency
 def clear_db() -> None:
     Base.metadata.drop_all(bind=engine)
     Base.metadata.create_all(bind=engine)
+    subaddress_cache.clear()
+    internal_subaddress_cache.clear()
+    subaddress_allocator.reset()
 
 
 def setup_fake_data() -> None:
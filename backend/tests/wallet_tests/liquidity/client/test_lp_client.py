@@ -0,0 +1,54 @@
+# pyre-ignore-all-errors
+
+# Copyright (c) The Diem Core Contributors
+# SPDX-License-Identifier: Apache-2.0
+
+import asyncio
+
+import pytest
+
+from benchmarks.stub_lp import StubLp
+from diem_utils.sdks.liquidity import AsyncLpClient, LpClient, LpError
+from diem_utils.types.liquidity.currency import CurrencyPairs
+
+
+def test_connections_are_reused():
+    with StubLp() as stub:
+        for _ in range(3):
+            LpClient(stub.url).settle("debt_id", "confirmation")
+
+        assert stub.connections == 1
+
+
+def test_idempotent_calls_are_retried():
+    with StubLp() as stub:
+        stub.failures = [503, 502]
+        response = LpClient(stub.url)._request("GET", "details", idempotent=True)
+
+        assert response.status_code == 200
+        assert stub.requests == 3
+
+
+def test_other_calls_are_not_retried():
+    with StubLp() as stub:
+        stub.failures = [503]
+        with pytest.raises(LpError):
+            LpClient(stub.url).settle("debt_id", "confirmation")
+
+        assert stub.requests == 1
+
+
+def test_async_client():
+    pairs = [CurrencyPairs.XUS_USD.value, CurrencyPairs.EUR_XUS.value]
+
+    async def fan_out(url):
+        async with AsyncLpClient(url) as client:
+            return await client.get_quotes(pairs, 1), await client.get_debt()
+
+    with StubLp() as stub:
+        stub.failures = [503]
+        quotes, debts = asyncio.run(fan_out(stub.url))
+
+        assert [quote.rate.pair for quote in quotes] == pairs
+        assert debts == []
+        assert stub.requests == 4
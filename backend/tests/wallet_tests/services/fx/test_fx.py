@@ -5,8 +5,16 @@
 
 import pytest
 
+from diem_utils.sdks.liquidity import LpClient
 from diem_utils.types.liquidity.currency import CurrencyPairs, Currency
-from wallet.services.fx.fx import get_rate
+from wallet.services.fx import fx
+from wallet.services.fx.fx import (
+    RatesSnapshot,
+    StaleRateError,
+    get_rate,
+    get_rates_snapshot,
+    update_rates,
+)
 
 rates = {
     str(CurrencyPairs.XUS_USD.value): 1000000,
@@ -35,3 +43,49 @@ def test_get_rate_direct_conversion_odd_currencies():
 def test_get_rate_non_exist_conversion():
     with pytest.raises(LookupError):
         get_rate(Currency.CHF, Currency.NZD).serialize()
+
+
+def test_rates_snapshot_convert():
+    snapshot = RatesSnapshot(rates={"XUS_USD": 1000000, "XUS_JPY": 107500000})
+
+    assert snapshot.convert(
+        [("XUS", 2000000), ("XUS", 1), ("XDX", 5000000)], "JPY"
+    ) == [215000000, 107, 0]
+    assert snapshot.quote_rates("USD") == {"XUS": 1000000}
+    with pytest.raises(LookupError):
+        snapshot.rate("XUS", "EUR")
+
+
+def test_get_rates_snapshot():
+    assert get_rates_snapshot().rate("XUS", "USD") == 1000000
+    assert get_rates_snapshot().rate("EUR", "XUS") == 1080000
+
+
+def test_get_rate_stale(monkeypatch):
+    snapshot = get_rates_snapshot()
+    fetched_at = {pair_str: 0 for pair_str in snapshot.rates}
+    monkeypatch.setattr(
+        fx, "_SNAPSHOT", RatesSnapshot(rates=snapshot.rates, fetched_at=fetched_at)
+    )
+
+    with pytest.raises(StaleRateError):
+        get_rate(Currency.XUS, Currency.USD)
+
+
+def test_update_rates_keeps_rates_failing_to_refresh(monkeypatch):
+    get_quote = LpClient.get_quote
+
+    def get_quote_failing_for_jpy(self, pair, amount):
+        if pair.quote == Currency.JPY:
+            raise ConnectionError()
+        return get_quote(self, pair, amount)
+
+    previous = get_rates_snapshot()
+    monkeypatch.setattr(LpClient, "get_quote", get_quote_failing_for_jpy)
+    snapshot = update_rates()
+
+    assert snapshot is get_rates_snapshot() is not previous
+    assert snapshot.rates == previous.rates
+    assert snapshot.fetched_at["XUS_JPY"] == previous.fetched_at["XUS_JPY"]
+    assert snapshot.fetched_at["XUS_USD"] > previous.fetched_at["XUS_USD"]
+    assert get_rate(Currency.JPY, Currency.XUS).serialize() == 9302
@@ -0,0 +1,57 @@
+# pyre-ignore-all-errors
+
+# Copyright (c) The Diem Core Contributors
+# SPDX-License-Identifier: Apache-2.0
+
+import os
+
+import pytest
+
+from diem_utils.types.liquidity.currency import Currency
+from wallet.services.fx import fx
+from wallet.services.fx.rates_table import RatesTable, _HEADER
+
+
+def test_write_read(tmp_path):
+    writer = RatesTable(os.path.join(tmp_path, "rates"))
+    reader = RatesTable(writer.path)
+    assert reader.read() == (0, {}, {})
+
+    writer.write({"XUS_USD": 1000000, "USD_XUS": 1000000}, {"XUS_USD": 1, "USD_XUS": 2})
+
+    assert reader.read() == (
+        2,
+        {"USD_XUS": 1000000, "XUS_USD": 1000000},
+        {"USD_XUS": 2, "XUS_USD": 1},
+    )
+
+
+def test_single_writer(tmp_path):
+    path = os.path.join(tmp_path, "rates")
+    assert RatesTable(path).acquire_writer()
+    assert not RatesTable(path).acquire_writer()
+
+
+def test_torn_read(tmp_path):
+    table = RatesTable(os.path.join(tmp_path, "rates"))
+    _HEADER.pack_into(table._map, 0, 3, 0)
+
+    with pytest.raises(TimeoutError):
+        table.read()
+
+    table.write({"XUS_USD": 1000000}, {"XUS_USD": 1})
+    assert table.read()[0] == 6
+
+
+def test_rates_read_from_table(tmp_path, monkeypatch):
+    table = RatesTable(os.path.join(tmp_path, "rates"))
+    monkeypatch.setattr(fx, "_table", table)
+    monkeypatch.setattr(fx, "_table_sequence", 0)
+    assert fx.is_rates_refresher()
+
+    fx.update_rates()
+    monkeypatch.setattr(fx, "_SNAPSHOT", fx.RatesSnapshot())
+    monkeypatch.setattr(fx, "_table_sequence", 0)
+
+    assert fx.get_rate(Currency.XUS, Currency.USD).serialize() == 1000000
+    assert fx.get_rates_snapshot().rate("EUR", "XUS") == 1080000
@@ -0,0 +1,101 @@
+from diem import jsonrpc
+
+from tests.wallet_tests.services.system.utils import (
+    RECEIVED_EVENTS_KEY,
+    SENT_EVENTS_KEY,
+    add_incoming_transaction_to_blockchain,
+    check_balance,
+    check_number_of_transactions,
+    mock_account,
+    setup_incoming_transaction,
+    setup_inventory_with_initial_transaction,
+)
+from wallet.services.account import generate_sub_address
+from wallet.services.system import sync_db
+from wallet.storage import get_sync_checkpoint
+
+OTHER_ADDRESS_1 = "257e50b131150fdb56aeab4ebe4ec2b9"
+
+
+def test_sync_from_checkpoint(patch_blockchain, monkeypatch):
+    """
+    Setup:
+        DB:
+            1. inventory account with 1 incoming initial transaction of 1000 coins
+            2. 1 user account with incoming transaction
+        Blockchain:
+            1. the same transactions and 1 inventory incoming transaction
+    Action: sync_db() twice, with 3 more transactions in between, expected:
+        1. the first sync reads all events and stores a checkpoint
+        2. the second sync reads the events after the checkpoint and fetches
+           the 2 transactions missing from the DB in one call
+    """
+    setup_inventory_with_initial_transaction(
+        patch_blockchain, 1000, mock_blockchain_initial_balance=1150
+    )
+    add_incoming_transaction_to_blockchain(
+        patch_blockchain, generate_sub_address(), 100, OTHER_ADDRESS_1, 1, 1
+    )
+    setup_incoming_transaction(
+        patch_blockchain=patch_blockchain,
+        receiver_sub_address=generate_sub_address(),
+        amount=50,
+        sender_address=OTHER_ADDRESS_1,
+        sequence=2,
+        version=2,
+        name="test_account",
+    )
+
+    sync_db()
+
+    check_number_of_transactions(3)
+    check_balance(1150)
+    assert get_sync_checkpoint() == {
+        RECEIVED_EVENTS_KEY: (3, 2),
+        SENT_EVENTS_KEY: (0, 2),
+    }
+
+    for version, amount in ((3, 20), (4, 30)):
+        add_incoming_transaction_to_blockchain(
+            patch_blockchain,
+            generate_sub_address(),
+            amount,
+            OTHER_ADDRESS_1,
+            3,
+            version,
+        )
+    setup_incoming_transaction(
+        patch_blockchain=patch_blockchain,
+        receiver_sub_address=generate_sub_address(),
+        amount=10,
+        sender_address=OTHER_ADDRESS_1,
+        sequence=5,
+        version=5,
+        name="test_account_2",
+    )
+    mock_account(patch_blockchain, mocked_balance_value=1210)
+
+    events_reads = []
+    transactions_reads = []
+
+    def get_events(self, event_stream_key, start, limit):
+        events_reads.append((event_stream_key, start))
+        return patch_blockchain.get_events(event_stream_key, start, limit)
+
+    def get_transactions(self, start_version, limit):
+        transactions_reads.append((start_version, limit))
+        return patch_blockchain.get_transactions(start_version, limit)
+
+    monkeypatch.setattr(jsonrpc.Client, "get_events", get_events)
+    monkeypatch.setattr(jsonrpc.Client, "get_transactions", get_transactions)
+
+    sync_db()
+
+    check_number_of_transactions(6)
+    check_balance(1210)
+    assert events_reads == [(RECEIVED_EVENTS_KEY, 3), (SENT_EVENTS_KEY, 0)]
+    assert transactions_reads == [(3, 2)]
+    assert get_sync_checkpoint() == {
+        RECEIVED_EVENTS_KEY: (6, 5),
+        SENT_EVENTS_KEY: (0, 5),
+    }
@@ -3,9 +3,20 @@
 # Copyright (c) The Diem Core Contributors
 # SPDX-License-Identifier: Apache-2.0
 
+from datetime import datetime, timedelta
+
+import pytest
+
+from diem_utils.types.currencies import DiemCurrency
 from tests.wallet_tests.resources.seeds.one_user_seeder import OneUser
 from wallet.services import account as account_service
-from wallet.storage import db_session, User
+from wallet.storage import db_session, Transaction, User
+from wallet.types import (
+    TransactionDirection,
+    TransactionSortOption,
+    TransactionStatus,
+    TransactionType,
+)
 
 
 def test_account_viewable_by_same_user():
@@ -36,3 +47,98 @@ def test_account_viewable_by_admin():
     assert account_service.is_user_allowed_for_account(
         account_name=account_name, user=user
     )
+
+
+def add_history(account_id: int, count: int) -> None:
+    start = datetime(2020, 1, 1)
+    for i in range(count):
+        db_session.add(
+            Transaction(
+                type=TransactionType.EXTERNAL,
+                amount=100 + i,
+                currency=DiemCurrency.XUS,
+                status=TransactionStatus.COMPLETED,
+                source_id=account_id if i % 2 else None,
+                destination_id=None if i % 2 else account_id,
+                source_address="source_address",
+                destination_address="destination_address",
+                created_timestamp=start + timedelta(minutes=i),
+            )
+        )
+    db_session.commit()
+
+
+def test_get_account_transactions_pages():
+    user = OneUser.run(db_session)
+    add_history(user.account_id, 7)
+
+    pages, cursor = [], None
+    while True:
+        page = account_service.get_account_transactions(
+            account_id=user.account_id, limit=3, after=cursor
+        )
+        pages.append([tx.amount for tx in page])
+        if len(page) < 3:
+            break
+        cursor = account_service.encode_transactions_cursor(page[-1])
+
+    assert pages == [[106, 105, 104], [103, 102, 101], [100]]
+
+    previous = account_service.get_account_transactions(
+        account_id=user.account_id,
+        limit=3,
+        before=account_service.encode_transactions_cursor(page[0]),
+    )
+    assert [tx.amount for tx in previous] == [103, 102, 101]
+
+
+def test_get_account_transactions_filtered_page():
+    user = OneUser.run(db_session)
+    add_history(user.account_id, 7)
+
+    sort = TransactionSortOption.DIEM_AMOUNT_ASC
+    page = account_service.get_account_transactions(
+        account_id=user.account_id,
+        direction_filter=TransactionDirection.RECEIVED,
+        sort=sort,
+        limit=2,
+        start_date=datetime(2020, 1, 1, 0, 1),
+    )
+    assert [tx.amount for tx in page] == [102, 104]
+
+    page = account_service.get_account_transactions(
+        account_id=user.account_id,
+        direction_filter=TransactionDirection.RECEIVED,
+        sort=sort,
+        after=account_service.encode_transactions_cursor(page[-1], sort),
+    )
+    assert [tx.amount for tx in page] == [106]
+
+
+def test_get_account_transactions_fiat_pages():
+    user = OneUser.run(db_session)
+    add_history(user.account_id, 5)
+
+    sort = TransactionSortOption.FIAT_AMOUNT_DESC
+    page = account_service.get_account_transactions(
+        account_id=user.account_id, sort=sort, limit=3
+    )
+    assert [tx.amount for tx in page] == [104, 103, 102]
+
+    page = account_service.get_account_transactions(
+        account_id=user.account_id,
+        sort=sort,
+        after=account_service.encode_transactions_cursor(
+            page[-1], sort, user.account_id
+        ),
+    )
+    assert [tx.amount for tx in page] == [101, 100]
+
+
+def test_get_account_transactions_invalid_cursor():
+    user = OneUser.run(db_session)
+
+    with pytest.raises(ValueError):
+        account_service.get_account_transactions(
+            account_id=user.account_id, after="not a cursor"
+        )
@@ -0,0 +1,81 @@
+# pyre-ignore-all-errors
+
+# Copyright (c) The Diem Core Contributors
+# SPDX-License-Identifier: Apache-2.0
+
+from dataclasses import replace
+from datetime import datetime, timedelta
+
+import pytest
+
+from diem_utils.sdks.liquidity import LpClient
+from diem_utils.types.currencies import DiemCurrency, FiatCurrency
+from diem_utils.types.liquidity.trade import TradeStatus
+from tests.wallet_tests.resources.seeds.add_funds_seeder import AddFundsSeeder
+from tests.wallet_tests.resources.seeds.one_user_with_one_order import (
+    OneUserWithOneOrder,
+)
+from wallet.services import inventory
+from wallet.services import order as order_service
+from wallet import storage
+from wallet.storage import db_session, get_order, update_order
+from wallet.types import CoverStatus
+
+
+@pytest.fixture
+def pending_trades(monkeypatch):
+    trade_info = LpClient.trade_info
+    pending = {"trades": True}
+
+    def trade_info_while_pending(self, trade_id):
+        info = trade_info(self, trade_id)
+        return replace(info, status=TradeStatus.Pending) if pending["trades"] else info
+
+    monkeypatch.setattr(LpClient, "trade_info", trade_info_while_pending)
+    return pending
+
+
+def execute_buy_order():
+    inventory_id, account_id, order_id = AddFundsSeeder.run(
+        db_session,
+        buy_amount=1000,
+        buy_currency=DiemCurrency.XUS,
+        pay_currency=FiatCurrency.EUR,
+        pay_price=900,
+    )
+    order_service.execute_order(order_id, "4580 2601 0743 7443")
+    return order_id
+
+
+def test_cover_resumes_when_trade_completes(patch_blockchain, pending_trades):
+    order_id = execute_buy_order()
+    assert get_order(order_id).cover_status == CoverStatus.PendingCoverTrade.value
+
+    inventory.poll_pending_covers()
+    assert get_order(order_id).cover_status == CoverStatus.PendingCoverTrade.value
+
+    pending_trades["trades"] = False
+    inventory.poll_pending_covers()
+    assert get_order(order_id).cover_status == CoverStatus.Covered.value
+
+
+def test_cover_fails_when_trade_times_out(patch_blockchain, pending_trades):
+    order_id = execute_buy_order()
+    update_order(order_id, cover_deadline=datetime.utcnow() - timedelta(seconds=1))
+
+    inventory.poll_pending_covers()
+    order = get_order(order_id)
+    assert order.cover_status == CoverStatus.FailedCoverLPTradeError.value
+
+
+def test_covers_are_notified_once_the_unit_commits(clean_db, monkeypatch):
+    user_id, order_id = OneUserWithOneOrder().run(db_session)
+    update_order(order_id, cover_tx_id=7)
+    advanced = []
+    monkeypatch.setattr(inventory, "advance_cover", advanced.append)
+
+    with storage.unit_of_work():
+        inventory.advance_covers_waiting_for(cover_tx_id=7)
+        assert advanced == []
+
+    assert [str(order_id) for order_id in advanced] == [order_id]
@@ -1,7 +1,9 @@
 # Copyright (c) The Diem Core Contributors
 # SPDX-License-Identifier: Apache-2.0
 
-from diem import identifier, LocalAccount, offchain, jsonrpc
+from datetime import datetime, timedelta
+
+from diem import identifier, LocalAccount, offchain
 from diem_utils.types.currencies import DiemCurrency
 
 from tests.wallet_tests.resources.seeds.one_user_seeder import OneUser
@@ -9,12 +11,14 @@ from wallet.services.account import (
     generate_new_subaddress,
 )
 from wallet.services.transaction import (
+    confirm_submitted_transactions,
     get_transaction,
     get_transaction_by_reference_id,
 )
 from wallet.services.offchain import (
     save_outbound_transaction,
     process_offchain_tasks,
+    OffchainTaskScheduler,
     process_inbound_command,
     _txn_payment_command,
     _send_kyc_data_and_receipient_signature,
@@ -22,6 +26,7 @@ from wallet.services.offchain import (
 )
 
 from wallet.storage import (
+    claim_transactions,
     get_account_transaction_ids,
     get_single_transaction,
     Transaction,
@@ -110,7 +115,7 @@ def test_process_inbound_command(monkeypatch):
         assert txn.status == TransactionStatus.OFF_CHAIN_OUTBOUND
 
 
-def test_submit_txn_when_both_ready(monkeypatch):
+def test_submit_txn_when_both_ready(monkeypatch, submitted_transactions_execute):
     user = OneUser.run(
         db_session, account_amount=100_000_000_000, account_currency=currency
     )
@@ -160,22 +165,73 @@ def test_submit_txn_when_both_ready(monkeypatch):
             "send_command",
             lambda cmd, _: offchain.reply_request(cmd.cid),
         )
-        m.setattr(
-            context.get(),
-            "p2p_by_travel_rule",
-            jsonrpc_txn_sample,
-        )
+        m.setattr(context.get().sequence_allocator, "allocate", lambda: 5)
+        m.setattr(context.get().jsonrpc_client, "submit", lambda txn: None)
         process_offchain_tasks()
 
     db_session.refresh(txn)
-    assert txn.status == TransactionStatus.COMPLETED
+    assert txn.status == TransactionStatus.PENDING
     assert txn.sequence == 5
-    assert txn.blockchain_version == 3232
+    assert txn.blockchain_hash
+
+    assert confirm_submitted_transactions() == 1
+    db_session.refresh(txn)
+    assert txn.status == TransactionStatus.COMPLETED
+    assert txn.blockchain_version == 1000 + txn.id
+
+
+def test_offchain_task_scheduler_limits_concurrency_per_counterparty():
+    scheduler = OffchainTaskScheduler(workers=4, counterparty_concurrency=2)
 
+    assert scheduler._enter("a")
+    assert scheduler._enter("a")
+    assert not scheduler._enter("a")
+    assert scheduler._enter("b")
 
-def jsonrpc_txn_sample(*args):
-    return jsonrpc.Transaction(
-        version=3232,
-        transaction=jsonrpc.TransactionData(sequence_number=5),
-        hash="3232-hash",
+    scheduler._exit("a")
+    assert scheduler._enter("a")
+
+
+def test_offchain_task_scheduler_leaves_transactions_of_busy_counterparty():
+    user = OneUser.run(
+        db_session, account_amount=100_000_000_000, account_currency=currency
+    )
+    receiver = LocalAccount.generate()
+    txn = save_outbound_transaction(
+        user.account_id,
+        receiver.account_address,
+        identifier.gen_subaddress(),
+        10_000_000_000,
+        currency,
     )
+    scheduler = OffchainTaskScheduler(workers=1, counterparty_concurrency=1)
+    counterparty = txn.destination_address
+    assert scheduler._enter(counterparty)
+
+    # not claimed while its counterparty is at its limit
+    assert scheduler.run(wait=True) == 0
+    db_session.refresh(txn)
+    assert txn.offchain_claimed_until is None
+
+    # claimed before the counterparty got there, skipped and given back
+    status = TransactionStatus.OFF_CHAIN_OUTBOUND
+    lease_until = datetime.utcnow() + timedelta(minutes=1)
+    txn_id = txn.id
+    assert claim_transactions(status, 1, lease_until) == [txn_id]
+    scheduler._process(txn_id, status, None)
+
+    txn = Transaction.query.get(txn_id)
+    assert txn.status == TransactionStatus.OFF_CHAIN_OUTBOUND
+    assert txn.offchain_claimed_until is None
+
+
+def test_offchain_task_scheduler_waits_for_room_only_with_backlog():
+    scheduler = OffchainTaskScheduler(workers=1)
+    assert not scheduler.wait_for_room(10)
+
+    scheduler._in_flight = 2
+    assert not scheduler.wait_for_room(10)
+
+    scheduler._backlog = 1
+    scheduler._room.set()
+    assert scheduler.wait_for_room(10)
@@ -7,12 +7,18 @@ from uuid import UUID
 
 from diem_utils.types.currencies import DiemCurrency, FiatCurrency
 from diem_utils.types.liquidity.currency import CurrencyPairs
+from sqlalchemy import event
 from tests.wallet_tests.resources.seeds.add_funds_seeder import (
     AddFundsSeeder,
     InventoryWithoutFundsSeeder,
 )
 from wallet import storage
 from wallet.services import order as order_service
+from wallet.services.account import (
+    get_account_balance_by_id,
+    get_internal_subaddress,
+)
+from wallet.services.transaction import confirm_submitted_transactions
 from wallet.storage import db_session, get_order
 from wallet.types import ConvertResult, OrderId, Direction
 from wallet.types import OrderStatus, CoverStatus
@@ -121,7 +127,66 @@ def test_convert_insufficient_inventory_balance():
     )
 
 
-def test_withdraw_funds(patch_blockchain: None):
+def test_convert_commits_once():
+    inventory_id, account_id, order = ConvertSeeder.run(
+        db_session,
+        account_amount=1000,
+        account_currency=DiemCurrency.XUS,
+        inventory_amount=600,
+        inventory_currency=DiemCurrency.XUS,
+        convert_from_amount=700,
+        convert_to_amount=500,
+    )
+    get_internal_subaddress(account_id)
+    get_internal_subaddress(inventory_id)
+    commits = []
+    session = db_session()
+
+    def after_commit(session):
+        commits.append(session)
+
+    event.listen(session, "after_commit", after_commit)
+    try:
+        assert order_service.execute_convert(order) == ConvertResult.Success
+    finally:
+        event.remove(session, "after_commit", after_commit)
+
+    assert len(commits) == 1
+    assert get_order(order.id).order_status == OrderStatus.Executed
+    assert get_account_balance_by_id(account_id).total[DiemCurrency.XUS] == 800
+
+
+def test_convert_failure_rolls_back_both_legs(monkeypatch):
+    inventory_id, account_id, order = ConvertSeeder.run(
+        db_session,
+        account_amount=1000,
+        account_currency=DiemCurrency.XUS,
+        inventory_amount=600,
+        inventory_currency=DiemCurrency.XUS,
+        convert_from_amount=700,
+        convert_to_amount=500,
+    )
+    transfer = order_service.internal_transaction
+    transfers = []
+
+    def internal_transaction(**kwargs):
+        if transfers:
+            raise RuntimeError("second leg failed")
+        transfers.append(transfer(**kwargs))
+        return transfers[-1]
+
+    monkeypatch.setattr(order_service, "internal_transaction", internal_transaction)
+    order_id = order.id
+
+    assert order_service.execute_convert(order) == ConvertResult.TransferFailure
+
+    assert get_order(order_id).order_status == OrderStatus.FailedExecute
+    assert len(storage.get_account_transactions(account_id)) == 1
+    assert get_account_balance_by_id(account_id).total[DiemCurrency.XUS] == 1000
+    assert get_account_balance_by_id(inventory_id).total[DiemCurrency.XUS] == 600
+
+
+def test_withdraw_funds(patch_blockchain: None, submitted_transactions_execute):
     inventory_id, account_id, order_id = WithdrawFundsSeeder.run(
         db_session,
         account_amount=1000,
@@ -133,6 +198,10 @@ def test_withdraw_funds(patch_blockchain: None):
     payment_method = "4580 2601 0743 7443"
 
     order_service.execute_order(order_id, payment_method)
+    assert get_order(order_id).cover_status == CoverStatus.PendingCoverDeposit.value
+
+    # the cover deposit to the LP is confirmed
+    assert confirm_submitted_transactions() == 1
 
     order = get_order(order_id)
     assert order.order_status == OrderStatus.Executed.value
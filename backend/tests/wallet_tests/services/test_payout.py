@@ -0,0 +1,188 @@
+# Copyright (c) The Diem Core Contributors
+# SPDX-License-Identifier: Apache-2.0
+
+import context
+import pytest
+from diem import jsonrpc
+from diem_utils.types.currencies import DiemCurrency
+
+from tests.wallet_tests.resources.seeds.one_user_seeder import OneUser
+from wallet import storage
+from wallet.services.account import (
+    generate_new_subaddress,
+    get_account_balance_by_id,
+)
+from wallet.services.payout import (
+    InvalidPayoutError,
+    Payout,
+    get_payouts,
+    send_payouts,
+)
+from wallet.services.transaction import confirm_submitted_transactions
+from wallet.storage import db_session
+from wallet.types import BalanceError, TransactionStatus, TransactionType
+
+OTHER_VASP_ADDRESS = "f72589b71ff4f8d139674a3f7369c69b"
+
+
+def external_payout(amount: int) -> Payout:
+    return Payout(
+        destination_address=OTHER_VASP_ADDRESS,
+        destination_subaddress="8e298f642d08d1af",
+        amount=amount,
+    )
+
+
+def test_send_payouts(patch_blockchain, submitted_transactions_execute) -> None:
+    sender = OneUser.run(
+        db_session, account_amount=1000, account_currency=DiemCurrency.XUS
+    )
+    receiver = OneUser.run(db_session, account_name="receiver", username="receiver")
+    internal = Payout(
+        destination_address=context.get().config.vasp_address,
+        destination_subaddress=generate_new_subaddress(receiver.account_id),
+        amount=100,
+    )
+
+    batch_id, transactions = send_payouts(
+        sender.account_id,
+        DiemCurrency.XUS,
+        [internal, external_payout(200), external_payout(300)],
+    )
+
+    payouts = get_payouts(batch_id)
+    assert [txn.id for txn in payouts] == [txn.id for txn in transactions]
+    assert [txn.type for txn in payouts] == [
+        TransactionType.INTERNAL,
+        TransactionType.EXTERNAL,
+        TransactionType.EXTERNAL,
+    ]
+    assert payouts[0].status == TransactionStatus.COMPLETED
+    assert payouts[0].destination_id == receiver.account_id
+    # signed with consecutive sequence numbers and submitted
+    assert [txn.status for txn in payouts[1:]] == [TransactionStatus.PENDING] * 2
+    assert all(txn.blockchain_hash for txn in payouts[1:])
+    assert payouts[2].sequence == payouts[1].sequence + 1
+
+    assert confirm_submitted_transactions() == 2
+    assert [txn.status for txn in get_payouts(batch_id)] == [
+        TransactionStatus.COMPLETED
+    ] * 3
+    balance = get_account_balance_by_id(sender.account_id)
+    assert balance.total[DiemCurrency.XUS] == 400
+
+
+def test_send_payouts_insufficient_balance() -> None:
+    sender = OneUser.run(
+        db_session, account_amount=1000, account_currency=DiemCurrency.XUS
+    )
+
+    # each payout fits in the balance, their sum does not
+    with pytest.raises(BalanceError):
+        send_payouts(
+            sender.account_id,
+            DiemCurrency.XUS,
+            [external_payout(600), external_payout(600)],
+        )
+
+    assert len(storage.get_account_transactions(sender.account_id)) == 1
+
+
+def test_send_payouts_validation() -> None:
+    sender = OneUser.run(
+        db_session, account_amount=1000, account_currency=DiemCurrency.XUS
+    )
+
+    with pytest.raises(InvalidPayoutError):
+        send_payouts(sender.account_id, DiemCurrency.XUS, [])
+    with pytest.raises(InvalidPayoutError):
+        send_payouts(sender.account_id, DiemCurrency.XUS, [external_payout(0)])
+
+    assert len(storage.get_account_transactions(sender.account_id)) == 1
+
+
+def test_failed_payout_submit_is_canceled(patch_blockchain, monkeypatch) -> None:
+    sender = OneUser.run(
+        db_session, account_amount=1000, account_currency=DiemCurrency.XUS
+    )
+
+    def submit(self, txn, *args):
+        raise jsonrpc.JsonRpcError("rejected")
+
+    monkeypatch.setattr(jsonrpc.Client, "submit", submit)
+
+    batch_id, _ = send_payouts(
+        sender.account_id, DiemCurrency.XUS, [external_payout(200)]
+    )
+
+    assert [txn.status for txn in get_payouts(batch_id)] == [TransactionStatus.CANCELED]
+    balance = get_account_balance_by_id(sender.account_id)
+    assert balance.total[DiemCurrency.XUS] == 1000
+
+
+def test_failed_middle_payout_submit_cancels_the_rest(
+    patch_blockchain, monkeypatch
+) -> None:
+    sender = OneUser.run(
+        db_session, account_amount=1000, account_currency=DiemCurrency.XUS
+    )
+    submits = []
+
+    def submit_failing_second(self, txn, *args):
+        submits.append(txn.raw_txn.sequence_number)
+        if len(submits) == 2:
+            raise jsonrpc.JsonRpcError("rejected")
+        return patch_blockchain.send_transaction(txn)
+
+    monkeypatch.setattr(jsonrpc.Client, "submit", submit_failing_second)
+
+    batch_id, _ = send_payouts(
+        sender.account_id,
+        DiemCurrency.XUS,
+        [external_payout(100), external_payout(200), external_payout(300)],
+    )
+
+    # nothing is submitted behind the gap left by the failed one
+    assert len(submits) == 2
+    payouts = get_payouts(batch_id)
+    assert [txn.status for txn in payouts] == [
+        TransactionStatus.PENDING,
+        TransactionStatus.CANCELED,
+        TransactionStatus.CANCELED,
+    ]
+    assert payouts[0].blockchain_hash
+    assert payouts[2].blockchain_hash is None
+    balance = get_account_balance_by_id(sender.account_id)
+    assert balance.total[DiemCurrency.XUS] == 900
+
+
+def test_failed_payout_signing_records_the_submitted_ones(
+    patch_blockchain, monkeypatch
+) -> None:
+    sender = OneUser.run(
+        db_session, account_amount=1000, account_currency=DiemCurrency.XUS
+    )
+    create_p2p_by_general = context.Context.create_p2p_by_general
+    created = []
+
+    def create_failing_second(self, *args, **kwargs):
+        created.append(kwargs["amount"])
+        if len(created) == 2:
+            raise ValueError("custody unavailable")
+        return create_p2p_by_general(self, *args, **kwargs)
+
+    monkeypatch.setattr(context.Context, "create_p2p_by_general", create_failing_second)
+
+    batch_id, _ = send_payouts(
+        sender.account_id,
+        DiemCurrency.XUS,
+        [external_payout(100), external_payout(200), external_payout(300)],
+    )
+
+    payouts = get_payouts(batch_id)
+    assert [txn.status for txn in payouts] == [
+        TransactionStatus.PENDING,
+        TransactionStatus.CANCELED,
+        TransactionStatus.CANCELED,
+    ]
+    assert payouts[0].blockchain_hash
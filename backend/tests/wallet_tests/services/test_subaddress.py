@@ -0,0 +1,62 @@
+# Copyright (c) The Diem Core Contributors
+# SPDX-License-Identifier: Apache-2.0
+
+from diem_utils.types.currencies import DiemCurrency
+
+from tests.wallet_tests.resources.seeds.one_user_seeder import OneUser
+from wallet.services.account import create_account, get_internal_subaddress
+from wallet.services.subaddress import SubAddressAllocator
+from wallet.services.transaction import internal_transaction
+from wallet.storage import (
+    SubAddress,
+    claim_subaddress_counters,
+    db_session,
+    get_account_id_from_subaddr,
+)
+from wallet.types import TransactionType
+
+
+def test_allocated_subaddresses_are_unique() -> None:
+    claims = []
+
+    def claim(count: int) -> int:
+        claims.append(count)
+        return (len(claims) - 1) * count
+
+    allocator = SubAddressAllocator(b"key", 100, claim)
+    subaddresses = {allocator.allocate() for _ in range(10000)}
+
+    assert len(subaddresses) == 10000
+    assert all(len(subaddress) == 16 for subaddress in subaddresses)
+    assert claims == [100] * 100
+
+    # another key gives other subaddresses for the same counters
+    other = SubAddressAllocator(b"other key", 100, lambda count: 0)
+    assert other.allocate() not in subaddresses
+
+
+def test_claim_subaddress_counters() -> None:
+    assert claim_subaddress_counters(100) == 0
+    assert claim_subaddress_counters(100) == 100
+    assert claim_subaddress_counters(1) == 200
+
+
+def test_internal_transfers_reuse_subaddresses() -> None:
+    sender = OneUser.run(
+        db_session, account_amount=1000, account_currency=DiemCurrency.XUS
+    )
+    receiver = create_account("receiver")
+
+    first = internal_transaction(
+        sender.account_id, receiver.id, 10, DiemCurrency.XUS, TransactionType.INTERNAL
+    )
+    subaddresses = SubAddress.query.count()
+    second = internal_transaction(
+        sender.account_id, receiver.id, 10, DiemCurrency.XUS, TransactionType.INTERNAL
+    )
+
+    assert SubAddress.query.count() == subaddresses
+    assert second.source_subaddress == first.source_subaddress
+    assert second.destination_subaddress == first.destination_subaddress
+    assert get_internal_subaddress(receiver.id) == first.destination_subaddress
+    assert get_account_id_from_subaddr(first.source_subaddress) == sender.account_id
@@ -7,8 +7,10 @@ from typing import Tuple
 
 import context
 import diem_utils.types.currencies
+import fakeredis
 import pytest
-from diem import diem_types
+from context.sequence import RedisSequenceAllocator
+from diem import diem_types, jsonrpc
 from diem.txnmetadata import general_metadata, travel_rule
 from diem.utils import sub_address, account_address_hex, account_address
 from diem_utils.types.currencies import DiemCurrency
@@ -27,12 +29,14 @@ from wallet.services.transaction import (
     process_incoming_transaction,
     get_transaction,
     SelfAsDestinationError,
+    confirm_submitted_transactions,
     get_total_balance,
 )
 from wallet.storage import (
     get_account_transaction_ids,
     get_single_transaction,
     get_account_id_from_subaddr,
+    SubAddress,
     Transaction,
     db_session,
 )
@@ -306,3 +310,178 @@ def send_fake_tx(amount=100, send_to_self=False) -> Tuple[int, Transaction]:
     )
 
     return account_id, get_transaction(send_tx.id) if send_tx else None
+
+
+def test_send_transaction_insufficient_balance() -> None:
+    user = OneUser.run(
+        db_session, account_amount=100, account_currency=DiemCurrency.XUS
+    )
+
+    with pytest.raises(types.BalanceError):
+        send_transaction(
+            sender_id=user.account_id,
+            amount=101,
+            currency=DiemCurrency.XUS,
+            destination_address="receiver_address",
+            destination_subaddress="receiver_subaddress",
+        )
+
+    assert storage.get_account_transactions(user.account_id)[0].amount == 100
+    assert SubAddress.query.count() == 0
+
+
+def test_confirm_submitted_transactions_in_one_read(monkeypatch) -> None:
+    submitted = [
+        storage.add_transaction(
+            amount=100,
+            currency=DiemCurrency.XUS,
+            payment_type=types.TransactionType.EXTERNAL,
+            status=TransactionStatus.PENDING,
+            sequence=sequence,
+        )
+        for sequence in range(10, 14)
+    ]
+    for txn in submitted:
+        storage.update_transaction(
+            txn.id,
+            blockchain_hash=f"hash-{txn.sequence}",
+            expiration_timestamp_secs=1000,
+        )
+    reads = []
+
+    def get_account_transactions(self, address, sequence, limit, *args):
+        reads.append((sequence, limit))
+        return [
+            # 10 executed, 11 failed, 12 replaced by another transaction
+            jsonrpc.Transaction(
+                version=100 + seq,
+                transaction=jsonrpc.TransactionData(sequence_number=seq),
+                hash="other" if seq == 12 else f"hash-{seq}",
+                vm_status=jsonrpc.VMStatus(
+                    type="move_abort" if seq == 11 else "executed"
+                ),
+            )
+            for seq in (10, 11, 12)
+        ]
+
+    def get_last_known_state(self):
+        return jsonrpc.State(chain_id=2, version=200, timestamp_usecs=999_000_000)
+
+    monkeypatch.setattr(
+        jsonrpc.Client, "get_account_transactions", get_account_transactions
+    )
+    monkeypatch.setattr(jsonrpc.Client, "get_last_known_state", get_last_known_state)
+
+    assert confirm_submitted_transactions() == 3
+    assert reads == [(10, 4)]
+    statuses = [get_single_transaction(txn.id).status for txn in submitted]
+    assert statuses == [
+        TransactionStatus.COMPLETED,
+        TransactionStatus.CANCELED,
+        TransactionStatus.CANCELED,
+        TransactionStatus.PENDING,
+    ]
+    assert get_single_transaction(submitted[0].id).blockchain_version == 110
+
+    # 13 is never executed and expires
+    monkeypatch.setattr(
+        jsonrpc.Client,
+        "get_last_known_state",
+        lambda self: jsonrpc.State(
+            chain_id=2, version=300, timestamp_usecs=1000_000_000
+        ),
+    )
+    assert confirm_submitted_transactions() == 1
+    assert get_single_transaction(submitted[3].id).status == TransactionStatus.CANCELED
+    assert confirm_submitted_transactions() == 0
+
+
+def test_expired_transaction_resyncs_sequence_of_all_processes(monkeypatch) -> None:
+    txn = storage.add_transaction(
+        amount=100,
+        currency=DiemCurrency.XUS,
+        payment_type=types.TransactionType.EXTERNAL,
+        status=TransactionStatus.PENDING,
+        sequence=10,
+    )
+    storage.update_transaction(
+        txn.id, blockchain_hash="hash-10", expiration_timestamp_secs=1000
+    )
+    monkeypatch.setattr(
+        jsonrpc.Client, "get_account_transactions", lambda self, *args: []
+    )
+    monkeypatch.setattr(
+        jsonrpc.Client,
+        "get_last_known_state",
+        lambda self: jsonrpc.State(
+            chain_id=2, version=300, timestamp_usecs=1000_000_000
+        ),
+    )
+    monkeypatch.setattr(jsonrpc.Client, "get_account_sequence", lambda self, _: 10)
+
+    ctx = context.get()
+    server = fakeredis.FakeServer()
+    # the web process confirming and a worker process submitting
+    web, worker = [
+        RedisSequenceAllocator(
+            ctx.jsonrpc_client,
+            ctx.config.vasp_account_address(),
+            fakeredis.FakeStrictRedis(server=server),
+        )
+        for _ in range(2)
+    ]
+    monkeypatch.setattr(ctx, "sequence_allocator", web)
+    assert worker.allocate() == 10
+    assert worker.allocate() == 11
+
+    assert confirm_submitted_transactions() == 1
+
+    assert get_single_transaction(txn.id).status == TransactionStatus.CANCELED
+    assert worker.allocate() == 10
+
+
+def test_expired_transaction_keeps_sequence_while_later_ones_pend(monkeypatch) -> None:
+    submitted = []
+    for sequence, expiration in [(10, 1000), (11, 2000)]:
+        txn = storage.add_transaction(
+            amount=100,
+            currency=DiemCurrency.XUS,
+            payment_type=types.TransactionType.EXTERNAL,
+            status=TransactionStatus.PENDING,
+            sequence=sequence,
+        )
+        storage.update_transaction(
+            txn.id,
+            blockchain_hash=f"hash-{sequence}",
+            expiration_timestamp_secs=expiration,
+        )
+        submitted.append(txn.id)
+    monkeypatch.setattr(
+        jsonrpc.Client, "get_account_transactions", lambda self, *args: []
+    )
+    monkeypatch.setattr(
+        jsonrpc.Client,
+        "get_last_known_state",
+        lambda self: jsonrpc.State(
+            chain_id=2, version=300, timestamp_usecs=1000_000_000
+        ),
+    )
+    monkeypatch.setattr(jsonrpc.Client, "get_account_sequence", lambda self, _: 10)
+    ctx = context.get()
+    allocator = RedisSequenceAllocator(
+        ctx.jsonrpc_client,
+        ctx.config.vasp_account_address(),
+        fakeredis.FakeStrictRedis(),
+    )
+    monkeypatch.setattr(ctx, "sequence_allocator", allocator)
+    assert allocator.allocate() == 10
+    assert allocator.allocate() == 11
+
+    assert confirm_submitted_transactions() == 1
+
+    assert get_single_transaction(submitted[0]).status == TransactionStatus.CANCELED
+    assert get_single_transaction(submitted[1]).status == TransactionStatus.PENDING
+    assert allocator.allocate() == 12
+    # resolving an already canceled transaction again is a no-op
+    assert storage.resolve_submitted_transactions({submitted[0]: 5}) == []
+    assert get_single_transaction(submitted[0]).status == TransactionStatus.CANCELED
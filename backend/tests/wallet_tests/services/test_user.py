@@ -6,10 +6,14 @@
 from datetime import date
 from typing import List
 
+import fakeredis
 import pytest
+from sqlalchemy import event
 
 from tests.wallet_tests.resources.seeds.one_user_seeder import OneUser
-from wallet import types
+from wallet import storage, types
+from wallet.cache import RedisCache
+from wallet.services import signed_token
 from wallet.services import user as user_service
 from wallet.services.kyc import (
     is_verified,
@@ -22,7 +26,7 @@ from wallet.services.user import (
     update_password,
     update_user,
 )
-from wallet.storage import db_session
+from wallet.storage import db_session, engine, Token
 from wallet.types import RegistrationStatus, UsernameExistsError
 
 
@@ -127,3 +131,87 @@ def test_get_user_kyc() -> None:
             "state": "",
         },
     }
+
+
+def test_token_authentication_is_cached() -> None:
+    user = OneUser.run(db_session)
+    token_id = user_service.add_token(user.id)
+    assert user_service.is_valid_token(token_id)
+
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        assert user_service.is_valid_token(token_id)
+        assert user_service.get_user_by_token(token_id).id == user.id
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+    assert statements == []
+
+
+def test_token_cache_invalidation() -> None:
+    user = OneUser.run(db_session)
+    token_id = user_service.add_token(user.id)
+    expiration_time = user_service._get_token_session(token_id).expiration_time
+
+    user_service.extend_token_expiration(token_id)
+    assert (
+        user_service._get_token_session(token_id).expiration_time
+        == expiration_time + user_service.TOKEN_VALID_TIME
+    )
+
+    user_service.revoke_token(token_id)
+    assert not user_service.is_valid_token(token_id)
+
+    token_id = user_service.add_token(user.id)
+    assert user_service.is_valid_token(token_id)
+    user_service.block_user(user.id)
+    assert not user_service.is_valid_token(token_id)
+
+
+def test_token_revoked_elsewhere_is_invalid_at_once(token_cache_server) -> None:
+    user = OneUser.run(db_session)
+    token_id = user_service.add_token(user.id)
+    assert user_service.is_valid_token(token_id)
+
+    # another process revokes it, through the same redis
+    storage.delete_token(token_id)
+    other_cache = RedisCache(
+        fakeredis.FakeStrictRedis(server=token_cache_server), "lrw:cache:token", 0
+    )
+    other_cache.delete(token_id)
+
+    assert not user_service.is_valid_token(token_id)
+
+
+def test_signed_tokens(monkeypatch) -> None:
+    monkeypatch.setattr(user_service, "TOKEN_MODE", "signed")
+    # shared by every process, as it is in redis
+    revocation_list = RedisCache(fakeredis.FakeStrictRedis(), "revoked_tokens", 0)
+    monkeypatch.setattr(signed_token, "revocation_list", revocation_list)
+    user = OneUser.run(db_session)
+    user.is_admin = True
+    db_session.commit()
+
+    token_id = user_service.add_token(user.id)
+    assert user_service.is_valid_token(token_id)
+    assert user_service.get_user_by_token(token_id).id == user.id
+    assert not user_service.is_valid_token(token_id[:-2] + "AA")
+    assert Token.query.count() == 0
+
+    refreshed_token_id = user_service.extend_token_expiration(token_id)
+    assert not user_service.is_valid_token(token_id)
+    assert user_service.is_valid_token(refreshed_token_id)
+    with pytest.raises(KeyError):
+        user_service.extend_token_expiration(token_id)
+
+    # demoted after the token was issued
+    storage.get_user(user.id).is_admin = False
+    db_session.commit()
+    assert not user_service.get_user_by_token(refreshed_token_id).is_admin
+
+    user_service.block_user(user.id)
+    assert not user_service.is_valid_token(refreshed_token_id)
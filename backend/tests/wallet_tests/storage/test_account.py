@@ -0,0 +1,65 @@
+# Copyright (c) The Diem Core Contributors
+# SPDX-License-Identifier: Apache-2.0
+
+import fakeredis
+
+from wallet.cache import LruCache, RedisCache, TieredCache
+from wallet.storage import (
+    SubAddress,
+    add_subaddress,
+    create_account,
+    db_session,
+    get_account_id_from_subaddr,
+    get_account_ids_from_subaddrs,
+    subaddress_cache,
+)
+
+
+def test_added_subaddress_is_cached() -> None:
+    account = create_account("fake_account")
+    add_subaddress(account.id, "8e298f642d08d1af")
+    hits, misses = subaddress_cache.hits, subaddress_cache.misses
+
+    assert get_account_id_from_subaddr("8e298f642d08d1af") == account.id
+    assert get_account_id_from_subaddr("a4d5bd88ec5be7a8") is None
+
+    assert subaddress_cache.hits == hits + 1
+    assert subaddress_cache.misses == misses + 1
+
+
+def test_get_account_ids_from_subaddrs() -> None:
+    account = create_account("fake_account")
+    other_account = create_account("other_account")
+    # written without add_subaddress, so not cached yet
+    db_session.add(SubAddress(address="8e298f642d08d1af", account_id=account.id))
+    db_session.add(SubAddress(address="a4d5bd88ec5be7a8", account_id=other_account.id))
+    db_session.commit()
+    subaddrs = ["8e298f642d08d1af", "a4d5bd88ec5be7a8", "3b3b97168de2f9de"]
+
+    assert get_account_ids_from_subaddrs(subaddrs) == {
+        "8e298f642d08d1af": account.id,
+        "a4d5bd88ec5be7a8": other_account.id,
+    }
+
+    hits = subaddress_cache.hits
+    assert get_account_ids_from_subaddrs(subaddrs[:2]) == {
+        "8e298f642d08d1af": account.id,
+        "a4d5bd88ec5be7a8": other_account.id,
+    }
+    assert subaddress_cache.hits == hits + 2
+
+
+def test_tiered_cache_fills_local_tier_from_redis() -> None:
+    server = fakeredis.FakeServer()
+
+    def tiered_cache() -> TieredCache:
+        shared = RedisCache(fakeredis.FakeStrictRedis(server=server), "test", 60)
+        return TieredCache(LruCache(10, 60), shared)
+
+    writer, reader = tiered_cache(), tiered_cache()
+    writer.set("8e298f642d08d1af", 1)
+
+    assert reader.get("8e298f642d08d1af") == 1
+    assert reader.local.get("8e298f642d08d1af") == 1
+    assert reader.get("a4d5bd88ec5be7a8") is None
+    assert (reader.hits, reader.misses) == (2, 1)
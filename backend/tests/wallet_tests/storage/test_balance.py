@@ -0,0 +1,129 @@
+# pyre-ignore-all-errors
+
+# Copyright (c) The Diem Core Contributors
+# SPDX-License-Identifier: Apache-2.0
+
+import pytest
+from diem_utils.types.currencies import DiemCurrency
+from tests.wallet_tests.resources.seeds.one_user_seeder import OneUser
+from wallet import storage
+from wallet.services.account import (
+    backfill_account_balances,
+    get_account_balance_by_id,
+    reconcile_account_balances,
+)
+from wallet.storage import AccountBalance, db_session
+from wallet.types import BalanceError, TransactionStatus, TransactionType
+
+
+def add_outgoing_transaction(account_id: int, amount: int, status: TransactionStatus):
+    return storage.add_transaction(
+        amount=amount,
+        currency=DiemCurrency.XUS,
+        payment_type=TransactionType.EXTERNAL,
+        status=status,
+        source_id=account_id,
+        source_address="source_address",
+        destination_address="destination_address",
+    )
+
+
+def test_balance_follows_ledger_writes() -> None:
+    user = OneUser.run(
+        db_session, account_amount=1000, account_currency=DiemCurrency.XUS
+    )
+    account_id = user.account_id
+
+    tx = add_outgoing_transaction(account_id, 300, TransactionStatus.PENDING)
+    balance = get_account_balance_by_id(account_id)
+    assert balance.total[DiemCurrency.XUS] == 700
+    assert balance.frozen[DiemCurrency.XUS] == 300
+
+    storage.update_transaction(tx.id, status=TransactionStatus.COMPLETED)
+    balance = get_account_balance_by_id(account_id)
+    assert balance.total[DiemCurrency.XUS] == 700
+    assert balance.frozen[DiemCurrency.XUS] == 0
+
+    storage.update_transaction(tx.id, status=TransactionStatus.CANCELED)
+    assert get_account_balance_by_id(account_id).total[DiemCurrency.XUS] == 1000
+
+    storage.delete_transaction_by_id(
+        add_outgoing_transaction(account_id, 100, TransactionStatus.COMPLETED).id
+    )
+    assert get_account_balance_by_id(account_id).total[DiemCurrency.XUS] == 1000
+
+
+def test_balance_follows_locked_update() -> None:
+    user = OneUser.run(
+        db_session, account_amount=1000, account_currency=DiemCurrency.XUS
+    )
+    tx = add_outgoing_transaction(user.account_id, 300, TransactionStatus.PENDING)
+    tx.reference_id = "reference_id"
+    storage.commit_transaction(tx)
+
+    def cancel(txn):
+        txn.status = TransactionStatus.CANCELED
+        return txn
+
+    storage.lock_for_update("reference_id", cancel)
+
+    balance = get_account_balance_by_id(user.account_id)
+    assert balance.total[DiemCurrency.XUS] == 1000
+    assert balance.frozen[DiemCurrency.XUS] == 0
+
+
+def test_reconcile_reports_and_repairs_drift() -> None:
+    user = OneUser.run(
+        db_session, account_amount=1000, account_currency=DiemCurrency.XUS
+    )
+    add_outgoing_transaction(user.account_id, 300, TransactionStatus.PENDING)
+    assert reconcile_account_balances() == []
+
+    row = AccountBalance.query.get((user.account_id, DiemCurrency.XUS.value))
+    row.total = 5
+    db_session.commit()
+
+    drifts = reconcile_account_balances(repair=True)
+    assert len(drifts) == 1
+    assert drifts[0].account_id == user.account_id
+    assert drifts[0].expected_total == 700
+    assert drifts[0].actual_total == 5
+
+    assert reconcile_account_balances() == []
+    assert get_account_balance_by_id(user.account_id).total[DiemCurrency.XUS] == 700
+
+
+def test_backfill_adds_missing_balances_only() -> None:
+    user = OneUser.run(
+        db_session, account_amount=1000, account_currency=DiemCurrency.XUS
+    )
+    other = OneUser.run(
+        db_session,
+        account_amount=500,
+        account_currency=DiemCurrency.XUS,
+        account_name="other_account",
+        username="other_user",
+    )
+    AccountBalance.query.filter_by(account_id=user.account_id).delete()
+    AccountBalance.query.get((other.account_id, DiemCurrency.XUS.value)).total = 5
+    db_session.commit()
+
+    assert backfill_account_balances() == 1
+
+    assert get_account_balance_by_id(user.account_id).total[DiemCurrency.XUS] == 1000
+    # left to the reconciliation
+    assert get_account_balance_by_id(other.account_id).total[DiemCurrency.XUS] == 5
+
+
+def test_reserve_balance() -> None:
+    user = OneUser.run(
+        db_session, account_amount=1000, account_currency=DiemCurrency.XUS
+    )
+
+    balance = storage.reserve_balance(user.account_id, 1000, DiemCurrency.XUS)
+    assert balance.total[DiemCurrency.XUS] == 1000
+    db_session.commit()
+
+    with pytest.raises(BalanceError):
+        storage.reserve_balance(user.account_id, 1001, DiemCurrency.XUS)
+    db_session.rollback()
@@ -0,0 +1,150 @@
+# pyre-ignore-all-errors
+
+# Copyright (c) The Diem Core Contributors
+# SPDX-License-Identifier: Apache-2.0
+
+import atexit
+import threading
+from datetime import datetime, timedelta
+
+from prometheus_client import REGISTRY
+
+from wallet.storage import (
+    ExecutionLog,
+    LogWriter,
+    db_session,
+    delete_execution_logs,
+    get_execution_logs,
+    unit_of_work,
+)
+
+
+def dropped_entries(reason: str = "queue_full") -> float:
+    return (
+        REGISTRY.get_sample_value("lrw_log_entries_dropped_total", {"reason": reason})
+        or 0
+    )
+
+
+def test_log_writer_inserts_in_batches() -> None:
+    writer = LogWriter(batch_size=10, flush_interval_ms=10)
+    writer.start()
+    try:
+        for i in range(25):
+            writer.write(
+                "executionlog", {"log": f"log {i}", "timestamp": datetime.utcnow()}
+            )
+        writer.flush()
+    finally:
+        writer.close()
+
+    assert not writer.running
+    assert ExecutionLog.query.count() == 25
+
+
+def test_log_writer_drops_failing_rows_only() -> None:
+    writer = LogWriter(batch_size=10, flush_interval_ms=10)
+    dropped = dropped_entries("insert_failed")
+
+    writer.start()
+    try:
+        writer.write("executionlog", {"log": "before", "timestamp": datetime.utcnow()})
+        # log is not nullable
+        writer.write(
+            "transactionlog", {"tx_id": 1, "log": None, "timestamp": datetime.utcnow()}
+        )
+        writer.write("executionlog", {"log": "after", "timestamp": datetime.utcnow()})
+        writer.flush()
+    finally:
+        writer.close()
+
+    assert [log.log for log in ExecutionLog.query.order_by(ExecutionLog.id)] == [
+        "before",
+        "after",
+    ]
+    assert dropped_entries("insert_failed") == dropped + 1
+
+
+def test_log_writer_drops_when_full() -> None:
+    gate = threading.Event()
+    writer = LogWriter(batch_size=1, flush_interval_ms=10, queue_size=1)
+    writer._insert = lambda batch: gate.wait()
+    dropped = dropped_entries()
+
+    writer.start()
+    try:
+        for i in range(3):
+            writer.write(
+                "executionlog", {"log": f"log {i}", "timestamp": datetime.utcnow()}
+            )
+        assert dropped_entries() >= dropped + 1
+    finally:
+        gate.set()
+        writer.close()
+
+
+def test_log_writer_queues_unit_of_work_entries_on_commit() -> None:
+    writer = LogWriter(batch_size=10, flush_interval_ms=10)
+    writer.start()
+    try:
+        with unit_of_work():
+            writer.write(
+                "executionlog", {"log": "committed", "timestamp": datetime.utcnow()}
+            )
+            writer.flush()
+            assert ExecutionLog.query.count() == 0
+        try:
+            with unit_of_work():
+                writer.write(
+                    "executionlog",
+                    {"log": "rolled back", "timestamp": datetime.utcnow()},
+                )
+                raise ValueError()
+        except ValueError:
+            pass
+        writer.flush()
+    finally:
+        writer.close()
+
+    assert [log.log for log in ExecutionLog.query] == ["committed"]
+
+
+def test_log_writer_closes_at_exit_once(monkeypatch) -> None:
+    registered = []
+    monkeypatch.setattr(atexit, "register", registered.append)
+    writer = LogWriter(flush_interval_ms=10)
+
+    for _ in range(2):
+        writer.start()
+        writer.close()
+
+    assert registered == [writer.close]
+
+
+def test_get_execution_logs_window() -> None:
+    start = datetime(2020, 1, 1)
+    for minute in range(10):
+        db_session.add(
+            ExecutionLog(
+                log=f"log {minute}", timestamp=start + timedelta(minutes=minute)
+            )
+        )
+    db_session.commit()
+
+    logs = list(
+        get_execution_logs(
+            start=start + timedelta(minutes=2),
+            end=start + timedelta(minutes=8),
+            limit=3,
+            batch_size=2,
+        )
+    )
+    assert [log.log for log in logs] == ["log 2", "log 3", "log 4"]
+
+    logs = get_execution_logs(
+        end=start + timedelta(minutes=8), after=(logs[-1].timestamp, logs[-1].id)
+    )
+    assert [log.log for log in logs] == ["log 5", "log 6", "log 7"]
+
+    assert delete_execution_logs(start + timedelta(minutes=4), batch_size=3) == 4
+    assert ExecutionLog.query.count() == 6
@@ -0,0 +1,88 @@
+# Copyright (c) The Diem Core Contributors
+# SPDX-License-Identifier: Apache-2.0
+
+from datetime import datetime
+
+import fakeredis
+import pytest
+
+from diem_utils.types.currencies import DiemCurrency
+from wallet.storage import (
+    OFFCHAIN_CHANNEL,
+    SYNC_CHANNEL,
+    Transaction,
+    db_session,
+    notify,
+)
+from wallet.storage.notify import LocalNotifier, RedisNotifier
+from wallet.types import TransactionStatus, TransactionType
+
+
+@pytest.fixture
+def notifier(monkeypatch):
+    notifier = LocalNotifier()
+    monkeypatch.setattr(notify, "notifier", notifier)
+    return notifier
+
+
+def add_transaction(status: TransactionStatus) -> Transaction:
+    txn = Transaction(
+        type=TransactionType.EXTERNAL,
+        amount=100,
+        currency=DiemCurrency.XUS,
+        status=status,
+        created_timestamp=datetime.utcnow(),
+    )
+    db_session.add(txn)
+    db_session.commit()
+    return txn
+
+
+def test_entering_offchain_status_notifies_on_commit(notifier):
+    txn = add_transaction(TransactionStatus.PENDING)
+    assert not notifier.wait(OFFCHAIN_CHANNEL, 0)
+
+    txn.status = TransactionStatus.OFF_CHAIN_OUTBOUND
+    db_session.flush()
+    assert not notifier.wait(OFFCHAIN_CHANNEL, 0)
+
+    db_session.commit()
+    assert notifier.wait(OFFCHAIN_CHANNEL, 0)
+    assert not notifier.wait(OFFCHAIN_CHANNEL, 0)
+    assert not notifier.wait(SYNC_CHANNEL, 0)
+
+
+def test_rolled_back_write_does_not_notify(notifier):
+    txn = add_transaction(TransactionStatus.PENDING)
+
+    txn.status = TransactionStatus.OFF_CHAIN_INBOUND
+    db_session.flush()
+    db_session.rollback()
+
+    assert not notifier.wait(OFFCHAIN_CHANNEL, 0)
+
+
+def test_blockchain_version_notifies_sync(notifier):
+    txn = add_transaction(TransactionStatus.PENDING)
+
+    txn.blockchain_version = 1
+    txn.status = TransactionStatus.COMPLETED
+    db_session.commit()
+
+    assert notifier.wait(SYNC_CHANNEL, 0)
+    assert not notifier.wait(OFFCHAIN_CHANNEL, 0)
+
+
+def test_redis_notifier_reaches_other_notifiers():
+    server = fakeredis.FakeServer()
+    publisher = RedisNotifier(fakeredis.FakeStrictRedis(server=server))
+    listener = RedisNotifier(fakeredis.FakeStrictRedis(server=server))
+
+    # the listener subscribes in the background on its first wait
+    for _ in range(50):
+        publisher.publish({OFFCHAIN_CHANNEL})
+        if listener.wait(OFFCHAIN_CHANNEL, 0.1):
+            break
+    else:
+        pytest.fail("notification not received")
+    assert not listener.wait(SYNC_CHANNEL, 0)
@@ -8,7 +8,12 @@ from uuid import UUID
 from tests.wallet_tests.resources.seeds.one_user_with_one_order import (
     OneUserWithOneOrder,
 )
-from wallet.storage import db_session, get_order, update_order
+from wallet.storage import (
+    db_session,
+    get_cover_orders_waiting_for,
+    get_order,
+    update_order,
+)
 from wallet.types import (
     OrderStatus,
     OrderId,
@@ -31,3 +36,15 @@ def test_update_order(clean_db: None) -> None:
     order = get_order(order_id)
 
     assert order.order_status == OrderStatus.FailedCredit.value
+
+
+def test_get_cover_orders_waiting_for(clean_db: None) -> None:
+    user_id, order_id = OneUserWithOneOrder().run(db_session)
+    update_order(OrderId(UUID(order_id)), cover_tx_id=7)
+
+    assert [order.id for order in get_cover_orders_waiting_for(cover_tx_id=7)] == [
+        order_id
+    ]
+    assert get_cover_orders_waiting_for(cover_tx_id=8) == []
+    # without a transaction to wait for, no order is waiting
+    assert get_cover_orders_waiting_for() == []
@@ -1,13 +1,24 @@
+from datetime import datetime, timedelta
+
 from tests.wallet_tests.services.system.utils import (
     add_user_in_db,
     add_incoming_user_transaction_to_db,
     add_outgoing_user_transaction_to_db,
 )
-from wallet.storage import Transaction
+from wallet.storage import Transaction, db_session
 from wallet.storage import (
+    TransactionLog,
+    add_transaction,
+    claim_transactions,
+    compute_ledger_balances,
+    count_transactions_by_status,
+    delete_redundant_transactions,
+    get_all_account_balances,
     get_account_transactions,
+    release_transaction_claim,
     DiemCurrency,
 )
+from wallet.types import TransactionStatus, TransactionType
 
 OTHER_ADDRESS_1 = "257e50b131150fdb56aeab4ebe4ec2b9"
 OTHER_ADDRESS_2 = "176b73399b04d9231769614cf22fb5df"
@@ -135,3 +146,113 @@ def test_get_account_transactions_tp_to_version():
     )
 
     assert len(transactions) == 3
+
+
+def test_claim_transactions_skips_leased_transactions():
+    user = add_user_in_db("user_test")
+    for sequence in range(3):
+        add_incoming_user_transaction_to_db(
+            amount=100,
+            receiver_sub_address=f"{sequence:016x}",
+            sender_address=OTHER_ADDRESS_1,
+            sequence=sequence,
+            user=user,
+            version=sequence,
+            account_name="user_test",
+        )
+    Transaction.query.update({Transaction.status: TransactionStatus.OFF_CHAIN_READY})
+    db_session.commit()
+    ids = [txn.id for txn in Transaction.query.order_by(Transaction.id)]
+    lease_until = datetime.utcnow() + timedelta(minutes=1)
+
+    assert (
+        claim_transactions(TransactionStatus.OFF_CHAIN_READY, 2, lease_until) == ids[:2]
+    )
+    assert (
+        claim_transactions(TransactionStatus.OFF_CHAIN_READY, 2, lease_until) == ids[2:]
+    )
+    assert claim_transactions(TransactionStatus.OFF_CHAIN_READY, 2, lease_until) == []
+
+    release_transaction_claim(ids[1])
+    assert claim_transactions(TransactionStatus.OFF_CHAIN_READY, 2, lease_until) == [
+        ids[1]
+    ]
+
+    Transaction.query.filter_by(id=ids[0]).update(
+        {Transaction.offchain_claimed_until: datetime.utcnow() - timedelta(seconds=1)}
+    )
+    db_session.commit()
+    assert claim_transactions(TransactionStatus.OFF_CHAIN_READY, 2, lease_until) == [
+        ids[0]
+    ]
+
+    assert count_transactions_by_status(
+        [TransactionStatus.OFF_CHAIN_READY, TransactionStatus.OFF_CHAIN_INBOUND]
+    ) == {"off_chain_ready": 3, "off_chain_inbound": 0}
+
+
+def test_claim_transactions_skips_busy_counterparties():
+    user = add_user_in_db("user_test")
+    for sequence, sender in enumerate([OTHER_ADDRESS_1, OTHER_ADDRESS_2]):
+        add_incoming_user_transaction_to_db(
+            amount=100,
+            receiver_sub_address=f"{sequence:016x}",
+            sender_address=sender,
+            sequence=sequence,
+            user=user,
+            version=sequence,
+            account_name="user_test",
+        )
+    Transaction.query.update({Transaction.status: TransactionStatus.OFF_CHAIN_READY})
+    db_session.commit()
+    ids = [txn.id for txn in Transaction.query.order_by(Transaction.id)]
+    lease_until = datetime.utcnow() + timedelta(minutes=1)
+
+    assert claim_transactions(
+        TransactionStatus.OFF_CHAIN_READY, 2, lease_until, [OTHER_ADDRESS_1]
+    ) == [ids[1]]
+
+
+def test_delete_redundant_transactions():
+    user = add_user_in_db("user_test")
+    for amount, version in ((100, 1), (50, 3), (25, 4)):
+        add_incoming_user_transaction_to_db(
+            amount=amount,
+            receiver_sub_address=f"{version:016x}",
+            sender_address=OTHER_ADDRESS_1,
+            sequence=version,
+            user=user,
+            version=version,
+            account_name="user_test",
+        )
+    add_outgoing_user_transaction_to_db(
+        amount=75,
+        account_name="user_test",
+        receiver_address=OTHER_ADDRESS_2,
+        sender_sub_address=SUB_ADDRESS_2,
+        sequence=2,
+        user=user,
+        version=2,
+    )
+    pending = add_transaction(
+        amount=10,
+        currency=DiemCurrency.XUS,
+        payment_type=TransactionType.EXTERNAL,
+        status=TransactionStatus.PENDING,
+        source_id=user.account.id,
+    )
+    redundant_id = Transaction.query.filter_by(blockchain_version=3).one().id
+    db_session.add(
+        TransactionLog(tx_id=redundant_id, log="redundant", timestamp=datetime.utcnow())
+    )
+    db_session.commit()
+
+    # version 1 is before the window, the pending one is not on chain yet
+    assert delete_redundant_transactions([2, 4], from_version=1) == 1
+
+    versions = {txn.blockchain_version for txn in Transaction.query}
+    assert versions == {1, 2, 4, None}
+    assert Transaction.query.get(pending.id) is not None
+    assert TransactionLog.query.filter_by(tx_id=redundant_id).count() == 0
+    assert get_all_account_balances() == compute_ledger_balances()
+    assert get_all_account_balances()[(user.account.id, "XUS")] == [40, 10]
@@ -0,0 +1,42 @@
+# Copyright (c) The Diem Core Contributors
+# SPDX-License-Identifier: Apache-2.0
+
+import pytest
+
+from wallet.storage import (
+    Account,
+    create_account,
+    in_unit_of_work,
+    on_commit,
+    unit_of_work,
+)
+
+
+def test_unit_of_work_commits_once() -> None:
+    committed = []
+
+    with unit_of_work():
+        create_account("fake_account")
+        with unit_of_work():
+            create_account("other_account")
+            on_commit(lambda: committed.append(True))
+        assert in_unit_of_work()
+        assert committed == []
+
+    assert not in_unit_of_work()
+    assert committed == [True]
+    assert Account.query.count() == 2
+
+
+def test_unit_of_work_rolls_back() -> None:
+    committed = []
+
+    with pytest.raises(RuntimeError):
+        with unit_of_work():
+            create_account("fake_account")
+            on_commit(lambda: committed.append(True))
+            raise RuntimeError("failed")
+
+    assert not in_unit_of_work()
+    assert committed == []
+    assert Account.query.count() == 0
@@ -4,7 +4,7 @@
 # SPDX-License-Identifier: Apache-2.0
 
 from copy import deepcopy
-from datetime import datetime
+from datetime import datetime, timedelta
 from http import HTTPStatus
 from typing import Optional
 
@@ -14,10 +14,12 @@ from werkzeug import Client
 
 from diem_utils.types.currencies import DiemCurrency
 from wallet.services import account as account_service
+from wallet.services import payout as payout_service
 from wallet.services import transaction as transaction_service
 from wallet.storage import Transaction
 from wallet.types import (
     Balance,
+    BalanceError,
     TransactionDirection,
     TransactionStatus,
     TransactionType,
@@ -75,16 +77,49 @@ def account_transactions_mock(monkeypatch):
         direction_filter: Optional[TransactionDirection] = None,
         limit: Optional[int] = None,
         sort: Optional[TransactionSortOption] = None,
+        after: Optional[str] = None,
+        before: Optional[str] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
     ):
         saved["account_id"] = account_id
         saved["account_name"] = account_name
         saved["currency"] = currency
+        saved["after"] = after
+        saved["start_date"] = start_date
         return [INTERNAL_TX]
 
     monkeypatch.setattr(account_service, "get_account_transactions", get_mock)
     yield saved
 
 
+@pytest.fixture
+def paged_transactions_mock(monkeypatch):
+    """Five transactions, newest first, paged the way the storage pages them"""
+    transactions = []
+    for tx_id in range(5, 0, -1):
+        tx = deepcopy(INTERNAL_TX)
+        tx.id = tx_id
+        tx.created_timestamp = INTERNAL_TX.created_timestamp + timedelta(days=tx_id)
+        transactions.append(tx)
+
+    def index(cursor: str) -> int:
+        _, tx_id = account_service._decode_transactions_cursor(
+            cursor, TransactionSortOption.DATE_DESC
+        )
+        return [tx.id for tx in transactions].index(tx_id)
+
+    def get_mock(limit=None, after=None, before=None, **kwargs):
+        if before:
+            end = index(before)
+            return transactions[max(0, end - limit) : end]
+        start = index(after) + 1 if after else 0
+        return transactions[start : start + limit]
+
+    monkeypatch.setattr(account_service, "get_account_transactions", get_mock)
+    yield transactions
+
+
 @pytest.fixture
 def get_transaction_by_id_mock(monkeypatch):
     saved = {}
@@ -266,6 +301,92 @@ class TestAccountTransactions:
         assert len(transactions) == 1
         assert account_transactions_mock["currency"] == requested_currency
 
+    def test_get_account_transactions_page(
+        self,
+        authorized_client: Client,
+        allow_user_to_account,
+        account_transactions_mock,
+    ) -> None:
+        cursor = account_service.encode_transactions_cursor(INTERNAL_TX)
+        rv: Response = authorized_client.get(
+            "/account/transactions",
+            query_string={
+                "limit": 1,
+                "after": cursor,
+                "start_date": "2020-06-01T00:00:00",
+            },
+        )
+        assert rv.status_code == 200
+        # the only row fetched is the last one
+        assert "next_cursor" not in rv.get_json()
+        assert rv.get_json()["prev_cursor"] == cursor
+        assert account_transactions_mock["after"] == cursor
+        assert account_transactions_mock["start_date"] == datetime(2020, 6, 1)
+
+    def test_get_account_transactions_pages_forward_and_back(
+        self,
+        authorized_client: Client,
+        allow_user_to_account,
+        paged_transactions_mock,
+    ) -> None:
+        def get_page(**params):
+            rv: Response = authorized_client.get(
+                "/account/transactions", query_string=dict(params, limit=2)
+            )
+            assert rv.status_code == 200
+            page = rv.get_json()
+            ids = [tx["id"] for tx in page["transaction_list"]]
+            return ids, page.get("prev_cursor"), page.get("next_cursor")
+
+        ids, prev_cursor, next_cursor = get_page()
+        assert (ids, prev_cursor) == ([5, 4], None)
+
+        ids, prev_cursor, next_cursor = get_page(after=next_cursor)
+        assert ids == [3, 2]
+        assert prev_cursor and next_cursor
+
+        ids, last_prev_cursor, last_next_cursor = get_page(after=next_cursor)
+        assert (ids, last_next_cursor) == ([1], None)
+
+        # back to the first page, which is followed by the one it came from
+        ids, first_prev_cursor, first_next_cursor = get_page(before=prev_cursor)
+        assert (ids, first_prev_cursor) == ([5, 4], None)
+        assert get_page(after=first_next_cursor)[0] == [3, 2]
+
+        # a short backward page reaches the start and is still followed
+        after_newest = account_service.encode_transactions_cursor(
+            paged_transactions_mock[0]
+        )
+        ids, prev_cursor, _ = get_page(after=after_newest)
+        assert ids == [4, 3]
+        ids, prev_cursor, next_cursor = get_page(before=prev_cursor)
+        assert (ids, prev_cursor) == ([5], None)
+        assert get_page(after=next_cursor)[0] == [4, 3]
+
+    def test_get_account_transactions_invalid_page(
+        self,
+        authorized_client: Client,
+        allow_user_to_account,
+        account_transactions_mock,
+    ) -> None:
+        rv: Response = authorized_client.get("/account/transactions?after=a&before=b")
+        assert rv.status_code == 400
+
+    def test_get_account_transactions_without_rates(
+        self, authorized_client: Client, allow_user_to_account, monkeypatch
+    ) -> None:
+        def get_account_transactions(**kwargs):
+            raise LookupError("No conversion rates to sort by fiat_amount_desc")
+
+        monkeypatch.setattr(
+            account_service, "get_account_transactions", get_account_transactions
+        )
+
+        rv: Response = authorized_client.get(
+            "/account/transactions?sort=fiat_amount_desc"
+        )
+        assert rv.status_code == 503
+
 
 class TestSendTransaction:
     currency = DiemCurrency.XUS.value
@@ -363,6 +484,82 @@ class TestSendTransaction:
         assert rv.status_code == HTTPStatus.FORBIDDEN
 
 
+class TestPayouts:
+    payouts_data = {
+        "currency": DiemCurrency.XUS.value,
+        "payouts": [
+            {"amount": 100, "receiver_address": FULL_ADDRESS},
+            {"amount": 200, "receiver_address": FULL_ADDRESS},
+        ],
+    }
+
+    @pytest.fixture
+    def send_payouts_mock(self, monkeypatch):
+        saved = {}
+
+        def send_mock(sender_id, currency, payouts):
+            saved.update(sender_id=sender_id, currency=currency, payouts=payouts)
+            transactions = []
+            for i, payout in enumerate(payouts):
+                tx = deepcopy(INTERNAL_TX)
+                tx.id = 10 + i
+                tx.type = TransactionType.EXTERNAL.value
+                tx.status = TransactionStatus.PENDING.value
+                tx.amount = payout.amount
+                tx.destination_id = None
+                tx.destination_address = payout.destination_address
+                tx.destination_subaddress = payout.destination_subaddress
+                transactions.append(tx)
+            saved["transactions"] = transactions
+            return "batch", transactions
+
+        monkeypatch.setattr(payout_service, "send_payouts", send_mock)
+        monkeypatch.setattr(
+            payout_service,
+            "get_payouts",
+            lambda batch_id: saved["transactions"] if batch_id == "batch" else [],
+        )
+        yield saved
+
+    def test_send_payouts(self, authorized_client: Client, send_payouts_mock) -> None:
+        rv: Response = authorized_client.post(
+            "/account/payouts", json=TestPayouts.payouts_data
+        )
+        assert rv.status_code == HTTPStatus.OK
+        batch = rv.get_json()
+        assert batch["batch_id"] == "batch"
+        assert [(p["id"], p["amount"], p["status"]) for p in batch["payouts"]] == [
+            (10, 100, TransactionStatus.PENDING.value),
+            (11, 200, TransactionStatus.PENDING.value),
+        ]
+        assert send_payouts_mock["sender_id"] == 1
+        assert send_payouts_mock["payouts"][0] == payout_service.Payout(
+            destination_address="12db232847705e05525db0336fd9f334",
+            destination_subaddress="94edd956415d7e1f",
+            amount=100,
+        )
+
+        rv = authorized_client.get("/account/payouts/batch")
+        assert rv.status_code == HTTPStatus.OK
+        assert rv.get_json() == batch
+
+        rv = authorized_client.get("/account/payouts/other")
+        assert rv.status_code == HTTPStatus.NOT_FOUND
+
+    def test_send_payouts_insufficient_balance(
+        self, authorized_client: Client, monkeypatch
+    ) -> None:
+        def send_mock(sender_id, currency, payouts):
+            raise BalanceError("Balance 100 is less than amount needed 300")
+
+        monkeypatch.setattr(payout_service, "send_payouts", send_mock)
+
+        rv: Response = authorized_client.post(
+            "/account/payouts", json=TestPayouts.payouts_data
+        )
+        assert rv.status_code == HTTPStatus.BAD_REQUEST
+
+
 class TestGetReceivingAddresses:
     def test_get_receiving_addresses(
         self, authorized_client: Client, allow_user_to_account, get_deposit_address_mock
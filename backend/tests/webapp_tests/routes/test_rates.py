@@ -6,6 +6,9 @@
 from flask import Response
 from flask.testing import Client
 
+from wallet.services.fx import fx
+from wallet.services.fx.fx import RatesSnapshot, get_rates_snapshot
+
 
 class TestGetRates:
     def test_200(self, authorized_client: Client) -> None:
@@ -13,3 +16,32 @@ class TestGetRates:
         data = res.get_json()
         assert res.status_code == 200
         assert data["rates"]
+
+    def test_stale_and_missing_pairs_left_out(
+        self, authorized_client: Client, monkeypatch
+    ) -> None:
+        snapshot = get_rates_snapshot()
+        rates = {k: v for k, v in snapshot.rates.items() if k != "XUS_EUR"}
+        fetched_at = {k: v for k, v in snapshot.fetched_at.items() if k in rates}
+        fetched_at["XUS_JPY"] = 0
+        monkeypatch.setattr(
+            fx, "_SNAPSHOT", RatesSnapshot(rates=rates, fetched_at=fetched_at)
+        )
+
+        res: Response = authorized_client.get("/account/rates")
+        assert res.status_code == 200
+        quotes = {
+            rate["currency_pair"].rsplit("_", 1)[1] for rate in res.get_json()["rates"]
+        }
+        assert "USD" in quotes
+        assert "EUR" not in quotes
+        assert "JPY" not in quotes
+
+    def test_503_without_fresh_rates(
+        self, authorized_client: Client, monkeypatch
+    ) -> None:
+        monkeypatch.setattr(fx, "_SNAPSHOT", RatesSnapshot())
+
+        res: Response = authorized_client.get("/account/rates")
+        assert res.status_code == 503
+        assert res.get_json()["error"]
@@ -0,0 +1,36 @@
+# pyre-ignore-all-errors
+
+# Copyright (c) The Diem Core Contributors
+# SPDX-License-Identifier: Apache-2.0
+
+import json
+from datetime import datetime, timedelta
+
+from werkzeug import Client
+
+from wallet.storage import ExecutionLog, db_session
+
+
+def test_list_execution_logs(client: Client) -> None:
+    start = datetime(2020, 1, 1)
+    for minute in range(3):
+        db_session.add(
+            ExecutionLog(
+                log=f"log {minute}", timestamp=start + timedelta(minutes=minute)
+            )
+        )
+    db_session.commit()
+
+    rv = client.get("/execution_logs", query_string={"limit": 2})
+    assert rv.status_code == 200
+    assert rv.mimetype == "application/x-ndjson"
+    logs = [json.loads(line) for line in rv.data.decode().splitlines()]
+    assert [log["log"] for log in logs] == ["log 0", "log 1"]
+
+    after = f"{logs[-1]['timestamp']},{logs[-1]['id']}"
+    rv = client.get("/execution_logs", query_string={"after": after})
+    assert [json.loads(line)["log"] for line in rv.data.decode().splitlines()] == [
+        "log 2"
+    ]
+
+    assert client.get("/execution_logs?start=yesterday").status_code == 400
@@ -2,19 +2,21 @@
 # SPDX-License-Identifier: Apache-2.0
 
 import os
-import sys
-from time import sleep
+from uuid import UUID
 
 import dramatiq
 
 from pubsub.types import LRWPubSubEvent
+from wallet.services.inventory import advance_cover
 from wallet.services.order import (
     execute_order,
     cover_order,
 )
-from .utils import retry
+from wallet.types import OrderId
 from ..logging import debug_log, log_execution
 from ..services.kyc import verify_kyc
+from .. import storage
+from ..services.payout import submit_payouts
 from ..services.transaction import (
     submit_onchain,
     process_incoming_transaction,
@@ -24,12 +26,24 @@ from diem_utils.types.currencies import DiemCurrency
 TIME_BEFORE_KYC_APPROVAL = 5
 
 
+class LogWriterMiddleware(dramatiq.Middleware):
+    """Batches the log writes of worker processes as the web process does"""
+
+    def after_worker_boot(self, broker, worker) -> None:
+        storage.log_writer.start()
+
+    def before_worker_shutdown(self, broker, worker) -> None:
+        storage.log_writer.close()
+
+
+dramatiq.get_broker().add_middleware(LogWriterMiddleware())
+
+
 @dramatiq.actor(store_results=True)
 @debug_log(None)
 def async_start_kyc(user_id: int) -> None:
-    sys.stdout.write("hhhhhhhhh")
+    """Send with delay=TIME_BEFORE_KYC_APPROVAL * 1000 to approve KYC later"""
     log_execution("Enter async_start_kyc")
-    sleep(TIME_BEFORE_KYC_APPROVAL)
     verify_kyc(user_id)
 
 
@@ -47,6 +61,13 @@ def async_cover_order(order_id) -> None:
     cover_order(order_id)
 
 
+@dramatiq.actor(store_results=True)
+@debug_log(None)
+def async_advance_cover(order_id) -> None:
+    log_execution("Enter async_advance_cover")
+    advance_cover(OrderId(UUID(order_id)))
+
+
 @dramatiq.actor(store_results=True)
 @debug_log(None)
 def async_external_transaction(transaction_id: int) -> None:
@@ -55,7 +76,14 @@ def async_external_transaction(transaction_id: int) -> None:
 
 
 @dramatiq.actor(store_results=True)
-@retry(Exception, delay=1)
+@debug_log(None)
+def async_submit_payouts(batch_id: str) -> None:
+    log_execution("Enter async_submit_payouts")
+    submit_payouts(batch_id)
+
+
+# failures are retried up to 3 times, 1s, 2s then 4s later (with jitter)
+@dramatiq.actor(store_results=True, max_retries=3, min_backoff=1000, max_backoff=4000)
 def process_incoming_txn(txn: LRWPubSubEvent) -> None:
     metadata = txn.metadata
     blockchain_version = txn.version
@@ -64,12 +92,23 @@ def process_incoming_txn(txn: LRWPubSubEvent) -> None:
     sequence = txn.sequence
     amount = txn.amount
     currency = DiemCurrency[txn.currency]
-    process_incoming_transaction(
-        blockchain_version=blockchain_version,
-        sender_address=sender_address,
-        receiver_address=receiver_address,
-        sequence=sequence,
-        amount=amount,
-        currency=currency,
-        metadata=metadata,
-    )
+    # messages sent before events carried their key have none
+    event_key = getattr(txn, "event_key", None)
+
+    # the pubsub client sends an event again if it died before recording it
+    with storage.unit_of_work():
+        if event_key is not None:
+            if storage.is_pubsub_event_processed(event_key, sequence):
+                log_execution(f"event {event_key} {sequence} already processed")
+                return
+            storage.record_processed_pubsub_event(event_key, sequence)
+
+        process_incoming_transaction(
+            blockchain_version=blockchain_version,
+            sender_address=sender_address,
+            receiver_address=receiver_address,
+            sequence=sequence,
+            amount=amount,
+            currency=currency,
+            metadata=metadata,
+        )
@@ -0,0 +1,167 @@
+# Copyright (c) The Diem Core Contributors
+# SPDX-License-Identifier: Apache-2.0
+
+import pickle
+import threading
+from collections import OrderedDict
+from time import monotonic
+from typing import Any, Hashable, Optional
+
+import redis
+
+from .config import REDIS_HOST, REDIS_PORT, REDIS_DB, REDIS_PASSWORD
+
+
+class LruCache:
+    """
+    Thread safe in-process cache holding up to max_size entries for at most
+    ttl seconds each, least recently used entries are evicted first.
+    Without max_size nothing is evicted early, expired entries are purged
+    whenever the cache doubles in size.
+    """
+
+    def __init__(self, max_size: Optional[int], ttl: float) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._purge_size = 1024
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < monotonic():
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        with self._lock:
+            now = monotonic()
+            self._entries[key] = (now + (self.ttl if ttl is None else ttl), value)
+            self._entries.move_to_end(key)
+            if self.max_size is None:
+                if len(self._entries) >= self._purge_size:
+                    self._purge_expired(now)
+                return
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: Hashable) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def _purge_expired(self, now: float) -> None:
+        for key in [k for k, (expiry, _) in self._entries.items() if expiry < now]:
+            del self._entries[key]
+        self._purge_size = max(1024, 2 * len(self._entries))
+
+
+class RedisCache:
+    """
+    Same interface as LruCache backed by redis, so that entries and their
+    invalidation are shared by every process. Redis does the expiry and its
+    maxmemory policy does the eviction.
+    """
+
+    def __init__(self, client: redis.Redis, namespace: str, ttl: float) -> None:
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._client = client
+        self._namespace = namespace
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        value = self._client.get(self._key(key))
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return pickle.loads(value)
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        ttl = self.ttl if ttl is None else ttl
+        self._client.set(
+            self._key(key), pickle.dumps(value), px=max(1, int(ttl * 1000))
+        )
+
+    def delete(self, key: Hashable) -> None:
+        self._client.delete(self._key(key))
+
+    def clear(self) -> None:
+        keys = list(self._client.scan_iter(f"{self._namespace}:*"))
+        if keys:
+            self._client.delete(*keys)
+
+    def _key(self, key: Hashable) -> str:
+        return f"{self._namespace}:{key}"
+
+
+class TieredCache:
+    """
+    Same interface again, an LruCache in front of a RedisCache: reads go to
+    redis only on local misses and fill the local cache, writes go to both.
+    Only suited to entries that never change, other processes keep their
+    local copy of an entry until it expires or is evicted.
+    """
+
+    def __init__(self, local: LruCache, shared: RedisCache) -> None:
+        self.ttl = local.ttl
+        self.local = local
+        self.shared = shared
+
+    @property
+    def hits(self) -> int:
+        return self.local.hits + self.shared.hits
+
+    @property
+    def misses(self) -> int:
+        return self.shared.misses
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        value = self.local.get(key)
+        if value is None:
+            value = self.shared.get(key)
+            if value is not None:
+                self.local.set(key, value)
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        self.local.set(key, value, ttl)
+        self.shared.set(key, value, ttl)
+
+    def delete(self, key: Hashable) -> None:
+        self.local.delete(key)
+        self.shared.delete(key)
+
+    def clear(self) -> None:
+        self.local.clear()
+        self.shared.clear()
+
+
+def create_cache(namespace: str, backend: str, max_size: Optional[int], ttl: float):
+    """
+    Returns a cache for backend "memory", "redis" (the wallet redis db) or
+    "tiered" (memory in front of redis)
+    """
+    if backend in ("redis", "tiered"):
+        client = redis.StrictRedis(
+            host=REDIS_HOST, port=REDIS_PORT, db=REDIS_DB, password=REDIS_PASSWORD
+        )
+        shared = RedisCache(client, f"lrw:cache:{namespace}", ttl)
+        if backend == "tiered":
+            return TieredCache(LruCache(max_size, ttl), shared)
+        return shared
+    if backend == "memory":
+        return LruCache(max_size, ttl)
+
+    raise ValueError(f"Unknown cache backend {backend}")
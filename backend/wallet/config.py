@@ -4,6 +4,7 @@
 # SPDX-License-Identifier: Apache-2.0
 
 import context
+from context.sequence import RedisSequenceAllocator
 import os
 import sys
 from typing import Optional
@@ -12,6 +13,7 @@ import dramatiq
 import redis
 from dramatiq.brokers.redis import RedisBroker, Broker
 from dramatiq.encoder import PickleEncoder
+from dramatiq.middleware import Retries
 from dramatiq.results import Results
 from dramatiq.results.backends.redis import RedisBackend
 
@@ -39,6 +41,71 @@ ADMIN_LOGIN_ENABLED: bool = (
 SECRET_KEY: str = os.getenv("SECRET_KEY", "you-will-never-guess")
 SESSION_TYPE: str = "redis"
 
+BALANCE_RECONCILE_INTERVAL_S: int = int(os.getenv("BALANCE_RECONCILE_INTERVAL_S", 3600))
+
+# token sessions are cached where every process sees their invalidation, a
+# per process cache would keep a revoked token valid in the other processes
+TOKEN_CACHE_BACKEND: str = os.getenv("TOKEN_CACHE_BACKEND", "redis")
+TOKEN_CACHE_TTL_S: float = float(os.getenv("TOKEN_CACHE_TTL_S", 30))
+# "db" keeps a Token row per session, "signed" issues HMAC signed tokens
+TOKEN_MODE: str = os.getenv("TOKEN_MODE", "db")
+# signed tokens are checked by every web process, so revocations must be shared
+TOKEN_REVOCATION_BACKEND: str = os.getenv("TOKEN_REVOCATION_BACKEND", "redis")
+
+# subaddresses never change account, "tiered" adds a redis tier behind memory
+SUBADDRESS_CACHE_BACKEND: str = os.getenv("SUBADDRESS_CACHE_BACKEND", "memory")
+SUBADDRESS_CACHE_SIZE: int = int(os.getenv("SUBADDRESS_CACHE_SIZE", 100000))
+SUBADDRESS_CACHE_TTL_S: float = float(os.getenv("SUBADDRESS_CACHE_TTL_S", 86400))
+# subaddresses are derived from counters with this key, changing it may make new
+# subaddresses collide with existing ones
+SUBADDRESS_KEY: str = os.getenv("SUBADDRESS_KEY", SECRET_KEY)
+# counters a process claims from the DB at a time
+SUBADDRESS_BLOCK_SIZE: int = int(os.getenv("SUBADDRESS_BLOCK_SIZE", 100))
+
+LOG_WRITER_BATCH_SIZE: int = int(os.getenv("LOG_WRITER_BATCH_SIZE", 500))
+LOG_WRITER_FLUSH_INTERVAL_MS: int = int(os.getenv("LOG_WRITER_FLUSH_INTERVAL_MS", 200))
+LOG_WRITER_QUEUE_SIZE: int = int(os.getenv("LOG_WRITER_QUEUE_SIZE", 10000))
+# what to do when the queue is full, "drop" or "block" for up to one interval
+LOG_WRITER_DROP_POLICY: str = os.getenv("LOG_WRITER_DROP_POLICY", "drop")
+EXECUTION_LOG_RETENTION_DAYS: int = int(os.getenv("EXECUTION_LOG_RETENTION_DAYS", 30))
+EXECUTION_LOG_RETENTION_INTERVAL_S: int = int(
+    os.getenv("EXECUTION_LOG_RETENTION_INTERVAL_S", 3600)
+)
+
+FX_REFRESH_INTERVAL_S: float = float(os.getenv("FX_REFRESH_INTERVAL_S", 60))
+FX_REFRESH_CONCURRENCY: int = int(os.getenv("FX_REFRESH_CONCURRENCY", 8))
+# rates not refreshed for that long are no longer quoted
+FX_RATE_MAX_AGE_S: float = float(os.getenv("FX_RATE_MAX_AGE_S", 300))
+# file shared by the web workers of a host, empty to keep rates per process
+FX_RATES_TABLE_PATH: str = os.getenv("FX_RATES_TABLE_PATH", "")
+
+# how long an order cover waits for the LP or the blockchain before failing
+COVER_TIMEOUT_S: float = float(os.getenv("COVER_TIMEOUT_S", 20))
+COVER_POLL_INTERVAL_S: float = float(os.getenv("COVER_POLL_INTERVAL_S", 2))
+# how often submitted on-chain transactions are confirmed, and how many
+# account transactions are read per call doing so
+CONFIRMATION_INTERVAL_S: float = float(os.getenv("CONFIRMATION_INTERVAL_S", 1))
+CONFIRMATION_PAGE_SIZE: int = int(os.getenv("CONFIRMATION_PAGE_SIZE", 100))
+PAYOUT_MAX_ITEMS: int = int(os.getenv("PAYOUT_MAX_ITEMS", 1000))
+
+OFFCHAIN_WORKERS: int = int(os.getenv("OFFCHAIN_WORKERS", 8))
+OFFCHAIN_BATCH_SIZE: int = int(os.getenv("OFFCHAIN_BATCH_SIZE", 100))
+# off-chain transactions processed at once with the same counterparty VASP
+OFFCHAIN_COUNTERPARTY_CONCURRENCY: int = int(
+    os.getenv("OFFCHAIN_COUNTERPARTY_CONCURRENCY", 2)
+)
+OFFCHAIN_CLAIM_LEASE_S: float = float(os.getenv("OFFCHAIN_CLAIM_LEASE_S", 60))
+# "postgres", "redis" or "local" (in-process only), defaults to postgres when
+# DB_URL is a postgres database and local otherwise
+NOTIFY_BACKEND: str = os.getenv("NOTIFY_BACKEND", "")
+# how long the off-chain and sync loops sleep without notification, local
+# notifications do not reach other processes so they use the poll interval
+OFFCHAIN_POLL_INTERVAL_S: float = float(os.getenv("OFFCHAIN_POLL_INTERVAL_S", 0.5))
+OFFCHAIN_IDLE_WAIT_S: float = float(os.getenv("OFFCHAIN_IDLE_WAIT_S", 30))
+SYNC_DB_INTERVAL_S: float = float(os.getenv("SYNC_DB_INTERVAL_S", 60))
+# minimum time between two notified syncs
+SYNC_DB_MIN_INTERVAL_S: float = float(os.getenv("SYNC_DB_MIN_INTERVAL_S", 5))
+
 
 # init redis and dramatiq broker
 def setup_redis_broker() -> None:
@@ -48,17 +115,35 @@ def setup_redis_broker() -> None:
     _redis_db: redis.StrictRedis = redis.StrictRedis(connection_pool=_connection_pool)
     _result_backend = RedisBackend(encoder=PickleEncoder(), client=_redis_db)
     _result_middleware = Results(backend=_result_backend)
+    # retries are opt-in per actor, with backoff through delayed messages
+    _retries_middleware = Retries(max_retries=0)
     broker: Broker = RedisBroker(
         connection_pool=_connection_pool,
-        middleware=[_result_middleware],
+        middleware=[_retries_middleware, _result_middleware],
         namespace="lrw",
     )
     dramatiq.set_broker(broker)
     dramatiq.set_encoder(dramatiq.PickleEncoder())
 
 
+def create_context() -> context.Context:
+    """
+    Context from env whose sequence numbers are allocated in redis, as the
+    web and worker processes all sign transactions for the VASP account
+    """
+    ctx = context.from_env()
+    ctx.sequence_allocator = RedisSequenceAllocator(
+        ctx.jsonrpc_client,
+        ctx.config.vasp_account_address(),
+        redis.StrictRedis(
+            host=REDIS_HOST, port=REDIS_PORT, db=REDIS_DB, password=REDIS_PASSWORD
+        ),
+    )
+    return ctx
+
+
 if dramatiq.broker.global_broker is None:
     if "VASP_ADDR" in os.environ:
-        context.set(context.from_env())
+        context.set(create_context())
 
     setup_redis_broker()
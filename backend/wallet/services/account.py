@@ -1,33 +1,40 @@
 # Copyright (c) The Diem Core Contributors
 # SPDX-License-Identifier: Apache-2.0
 
-import context, secrets
+import base64, context, json, logging
+from datetime import datetime
 from operator import attrgetter
 from typing import Dict, List, Optional
 
 from diem import identifier
-from diem_utils.precise_amount import Amount
 from diem_utils.types.currencies import DiemCurrency, FiatCurrency
-from diem_utils.types.liquidity.currency import Currency
 from wallet import storage
+from wallet.config import SUBADDRESS_BLOCK_SIZE, SUBADDRESS_KEY
 from wallet.services import transaction as transaction_service
-from wallet.services.fx.fx import get_rate
+from wallet.services.fx.fx import get_rates_snapshot
+from wallet.services.subaddress import SubAddressAllocator
 from wallet.storage import (
     get_account_id_from_subaddr,
     Transaction,
     get_account,
     add_subaddress,
-    is_subaddress_exists,
     Account,
     User,
 )
 from wallet.types import (
     Balance,
+    BalanceDrift,
     TransactionStatus,
     TransactionDirection,
     TransactionSortOption,
 )
 
+logger = logging.getLogger(__name__)
+
+subaddress_allocator = SubAddressAllocator(
+    SUBADDRESS_KEY.encode(), SUBADDRESS_BLOCK_SIZE, storage.claim_subaddress_counters
+)
+
 
 def create_account(account_name: str, user_id: Optional[int] = None) -> Account:
     if not account_name:
@@ -58,15 +65,119 @@ def get_account_transactions(
     limit: Optional[int] = None,
     sort: Optional[TransactionSortOption] = None,
     up_to_version=None,
+    after: Optional[str] = None,
+    before: Optional[str] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
 ) -> List[Transaction]:
+    """
+    Returns the account transactions, at most limit of them. after / before take
+    a cursor returned by encode_transactions_cursor for the last / first
+    transaction of the previously fetched page.
+    """
     if not account_id:
         account = get_account(account_name=account_name)
         account_id = account.id
 
+    if up_to_version:
+        if after or before:
+            raise ValueError("Cursor pagination is not supported up to a version")
+        return _get_account_transactions_in_memory(
+            account_id=account_id,
+            currency=currency,
+            direction_filter=direction_filter,
+            limit=limit,
+            sort=sort,
+            up_to_version=up_to_version,
+            start_date=start_date,
+            end_date=end_date,
+        )
+
+    sort = sort or TransactionSortOption.DATE_DESC
+    fiat_rates = _fiat_sort_rates(account_id, sort)
+    return storage.get_account_transactions_page(
+        account_id=account_id,
+        currency=currency,
+        direction=direction_filter,
+        sort=sort,
+        start_date=start_date,
+        end_date=end_date,
+        after=_decode_transactions_cursor(after, sort) if after else None,
+        before=_decode_transactions_cursor(before, sort) if before else None,
+        limit=limit,
+        fiat_rates=fiat_rates,
+    )
+
+
+def encode_transactions_cursor(
+    tx: Transaction,
+    sort: Optional[TransactionSortOption] = None,
+    account_id: Optional[int] = None,
+) -> str:
+    """
+    Cursor of tx within pages sorted by sort, account_id is the account
+    whose pages are browsed and is required by fiat sorts.
+    """
+    sort = sort or TransactionSortOption.DATE_DESC
+    fiat_rates = _fiat_sort_rates(account_id, sort)
+    if fiat_rates is not None:
+        # same integer the database orders by, see storage.page_sort_key
+        value = tx.amount * fiat_rates.get(tx.currency, 0)
+    else:
+        value = getattr(tx, storage.page_sort_key(sort, Transaction).key)
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    key = json.dumps([value, tx.id]).encode()
+    return base64.urlsafe_b64encode(key).decode()
+
+
+def _decode_transactions_cursor(cursor: str, sort: TransactionSortOption):
+    try:
+        value, tx_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if sort in (TransactionSortOption.DATE_ASC, TransactionSortOption.DATE_DESC):
+            value = datetime.fromisoformat(value)
+        return value, int(tx_id)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid transactions cursor {cursor}") from e
+
+
+def _fiat_sort_rates(
+    account_id: Optional[int], sort: TransactionSortOption
+) -> Optional[Dict[str, int]]:
+    if sort not in _FIAT_SORT_OPTIONS:
+        return None
+    user = storage.get_user_by_account_id(account_id)
+    fiat_currency = FiatCurrency(user.selected_fiat_currency)
+    return get_rates_snapshot().quote_rates(fiat_currency.value)
+
+
+_FIAT_SORT_OPTIONS = (
+    TransactionSortOption.FIAT_AMOUNT_DESC,
+    TransactionSortOption.FIAT_AMOUNT_ASC,
+)
+
+
+def _get_account_transactions_in_memory(
+    account_id: int,
+    currency: Optional[DiemCurrency],
+    direction_filter: Optional[TransactionDirection],
+    limit: Optional[int],
+    sort: Optional[TransactionSortOption],
+    up_to_version,
+    start_date: Optional[datetime],
+    end_date: Optional[datetime],
+) -> List[Transaction]:
     txs = storage.get_account_transactions(
         account_id=account_id, currency=currency, up_to_version=up_to_version
     )
 
+    txs[:] = [
+        tx
+        for tx in txs
+        if (not start_date or tx.created_timestamp >= start_date)
+        and (not end_date or tx.created_timestamp < end_date)
+    ]
+
     if direction_filter:
         txs[:] = [
             tx
@@ -78,10 +189,7 @@ def get_account_transactions(
     fiat_currency = None
 
     if sort:
-        if (
-            sort == TransactionSortOption.FIAT_AMOUNT_DESC
-            or sort == TransactionSortOption.FIAT_AMOUNT_ASC
-        ):
+        if sort in _FIAT_SORT_OPTIONS:
             user = storage.get_user_by_account_id(account_id)
             fiat_currency = FiatCurrency[user.selected_fiat_currency]
 
@@ -117,33 +225,11 @@ def _sort_transactions(
 def _sort_transactions_by_fiat_amount(
     txs: List[Transaction], fiat_currency: FiatCurrency, reverse=False
 ):
-    latest_rates = _get_rates()
-
-    def tx_fiat_amount(tx: Transaction):
-        rate = latest_rates[f"{tx.currency}_{fiat_currency}"]
-        tx_amount = Amount().deserialize(tx.amount)
-        fiat_amount = rate * tx_amount
-        return fiat_amount.serialize()
-
-    txs.sort(key=tx_fiat_amount, reverse=reverse)
-
-
-def _get_rates() -> Dict[str, Amount]:
-    rates = {}
-
-    for base_currency in DiemCurrency.__members__:
-        for fiat_currency in FiatCurrency.__members__:
-            try:
-                rate = get_rate(
-                    base_currency=Currency(base_currency),
-                    quote_currency=Currency(fiat_currency),
-                )
-
-                rates[f"{base_currency}_{fiat_currency}"] = rate
-            except LookupError:
-                pass
-
-    return rates
+    fiat_amounts = get_rates_snapshot().convert(
+        ((tx.currency, tx.amount) for tx in txs), fiat_currency.value
+    )
+    order = sorted(range(len(txs)), key=fiat_amounts.__getitem__, reverse=reverse)
+    txs[:] = [txs[i] for i in order]
 
 
 def get_account_balance_by_name(
@@ -165,6 +251,9 @@ def get_account_balance_by_id(
 
 
 def get_account_balance(account, up_to_version=None):
+    if not up_to_version:
+        return storage.get_account_balance(account.id)
+
     account_transactions = get_account_transactions(
         account_id=account.id, up_to_version=up_to_version
     )
@@ -174,6 +263,15 @@ def get_account_balance(account, up_to_version=None):
     )
 
 
+def reserve_balance(account_id: int, amount: int, currency: DiemCurrency) -> Balance:
+    """
+    Lock the account balance for a debit of amount; the lock is held until the
+    next commit, which should be the one writing the debit transaction.
+    Raises BalanceError when the balance is insufficient.
+    """
+    return storage.reserve_balance(account_id, amount, currency)
+
+
 def calc_account_balance(account_id: int, transactions: List[Transaction]) -> Balance:
     account_balance = Balance()
     for tx in transactions:
@@ -188,6 +286,56 @@ def calc_account_balance(account_id: int, transactions: List[Transaction]) -> Ba
     return account_balance
 
 
+def reconcile_account_balances(repair: bool = False) -> List[BalanceDrift]:
+    """
+    Recompute every account balance from the ledger and report rows where the
+    materialized account balance drifted. With repair=True the drifted rows are
+    recomputed under their row lock, a drift that only came from writes racing
+    with the first read goes away there.
+    """
+    ledger = storage.compute_ledger_balances()
+    materialized = storage.get_all_account_balances()
+
+    drifts = []
+    for account_id, currency in set(ledger) | set(materialized):
+        expected_total, expected_frozen = ledger.get((account_id, currency), [0, 0])
+        actual_total, actual_frozen = materialized.get((account_id, currency), [0, 0])
+        if (expected_total, expected_frozen) == (actual_total, actual_frozen):
+            continue
+
+        drift = BalanceDrift(
+            account_id=account_id,
+            currency=currency,
+            expected_total=expected_total,
+            actual_total=actual_total,
+            expected_frozen=expected_frozen,
+            actual_frozen=actual_frozen,
+        )
+        logger.warning(f"account balance drift: {drift}")
+        drifts.append(drift)
+
+        if repair:
+            storage.repair_account_balance(account_id, currency)
+
+    return drifts
+
+
+def backfill_account_balances() -> int:
+    """
+    Adds the materialized balances missing for a ledger written before they
+    existed, leaving existing rows, which concurrent writers keep up to date,
+    alone. Returns the number of rows added.
+    """
+    materialized = storage.get_all_account_balances()
+    missing = [
+        key for key in storage.compute_ledger_balances() if key not in materialized
+    ]
+    for account_id, currency in missing:
+        storage.repair_account_balance(account_id, currency)
+
+    return len(missing)
+
+
 def generate_new_subaddress(account_id: int) -> str:
     sub_address = generate_sub_address()
     add_subaddress(account_id=account_id, subaddr=sub_address)
@@ -195,14 +343,21 @@ def generate_new_subaddress(account_id: int) -> str:
     return sub_address
 
 
-def generate_sub_address():
-    sub_address = None
+def generate_sub_address() -> str:
+    # unique by construction, no need to look it up
+    return subaddress_allocator.allocate()
 
-    while not sub_address:
-        sub_address = secrets.token_hex(identifier.DIEM_SUBADDRESS_SIZE)
-        # generated subaddress is unique
-        if is_subaddress_exists(sub_address):
-            sub_address = None
+
+def get_internal_subaddress(account_id: int) -> str:
+    """
+    Subaddress of the account in internal transfers, the same for all of them
+    as they never reach the chain
+    """
+    sub_address = storage.get_internal_subaddress(account_id)
+    if sub_address is None:
+        sub_address = storage.set_internal_subaddress(
+            account_id, generate_sub_address()
+        )
 
     return sub_address
 
@@ -1,57 +1,205 @@
 # Copyright (c) The Diem Core Contributors
 # SPDX-License-Identifier: Apache-2.0
 
+"""
+Rates are refreshed in the background (see update_rates) into an immutable
+RatesSnapshot that replaces the previous one with a single assignment, so
+readers never see a half updated set of rates and never wait for the LP.
+"""
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 from itertools import chain
+from time import perf_counter, time
+from typing import Dict, Iterable, List, Tuple
+
+from prometheus_client import Counter, Gauge, Histogram
+
 from diem_utils.precise_amount import Amount
 from diem_utils.sdks.liquidity import LpClient
 from diem_utils.types.currencies import DiemCurrency, FiatCurrency
 from diem_utils.types.liquidity.currency import Currency, CurrencyPair, CurrencyPairs
+from wallet.config import (
+    FX_RATE_MAX_AGE_S,
+    FX_RATES_TABLE_PATH,
+    FX_REFRESH_CONCURRENCY,
+)
+from .rates_table import RatesTable
+
+logger = logging.getLogger(__name__)
+
+RATES_REFRESH_SECONDS = Histogram(
+    "lrw_fx_rates_refresh_seconds", "Duration of one refresh of every rate"
+)
+RATE_FETCH_FAILURES = Counter(
+    "lrw_fx_rate_fetch_failures", "LP quotes that failed during a refresh", ["pair"]
+)
+RATE_AGE_SECONDS = Gauge(
+    "lrw_fx_rate_age_seconds", "Time since the rate was fetched from the LP", ["pair"]
+)
+
+
+@dataclass(frozen=True)
+class RatesSnapshot:
+    """
+    Immutable set of integer fixed-point rates (Amount.unit scale) keyed by
+    currency pair string e.g. "XUS_USD", with the time each was fetched.
+    """
+
+    rates: Dict[str, int] = field(default_factory=dict)
+    fetched_at: Dict[str, float] = field(default_factory=dict)
+
+    def rate(self, base_currency: str, quote_currency: str) -> int:
+        pair_str = f"{base_currency}_{quote_currency}"
+        if pair_str not in self.rates:
+            raise LookupError(f"No conversion to currency pair {pair_str}")
+        return self.rates[pair_str]
+
+    def age(self, pair_str: str) -> float:
+        return time() - self.fetched_at.get(pair_str, 0)
+
+    def quote_rates(self, quote_currency: str) -> Dict[str, int]:
+        """Rates of every Diem currency into quote_currency, by Diem currency code"""
+        return {
+            currency: self.rates[f"{currency}_{quote_currency}"]
+            for currency in DiemCurrency.__members__
+            if f"{currency}_{quote_currency}" in self.rates
+        }
+
+    def convert(
+        self, entries: Iterable[Tuple[str, int]], quote_currency: str
+    ) -> List[int]:
+        """
+        Converts (currency, amount) pairs into quote_currency amounts in one pass
+        of integer arithmetic. Amounts in currencies without a rate convert to 0.
+        """
+        rates = self.quote_rates(quote_currency)
+        unit = Amount.unit
+        return [amount * rates.get(currency, 0) // unit for currency, amount in entries]
+
 
-RATES = {}
+class StaleRateError(LookupError):
+    pass
+
+
+_SNAPSHOT = RatesSnapshot()
+# with several web workers, one of them refreshes the rates all of them read
+_table = RatesTable(FX_RATES_TABLE_PATH) if FX_RATES_TABLE_PATH else None
+_table_sequence = 0
+
+_executor = ThreadPoolExecutor(
+    max_workers=FX_REFRESH_CONCURRENCY, thread_name_prefix="fx-refresh"
+)
 
 
 def get_rate(base_currency: Currency, quote_currency: Currency) -> Amount:
-    pair_str = str(CurrencyPair(base_currency, quote_currency))
-    if pair_str not in RATES:
-        update_rates()
-    return RATES[pair_str]
+    """
+    Reads the current snapshot only. Raises LookupError for pairs without a
+    rate and StaleRateError for rates older than FX_RATE_MAX_AGE_S.
+    """
+    snapshot = get_rates_snapshot()
+    pair_str = f"{base_currency.value}_{quote_currency.value}"
+    rate = snapshot.rate(base_currency.value, quote_currency.value)
+    if snapshot.age(pair_str) > FX_RATE_MAX_AGE_S:
+        raise StaleRateError(f"Rate of currency pair {pair_str} is stale")
+    return Amount().deserialize(rate)
+
+
+def get_rates_snapshot() -> RatesSnapshot:
+    global _SNAPSHOT, _table_sequence
+    if _table is not None and _table.sequence != _table_sequence:
+        _table_sequence, rates, fetched_at = _table.read()
+        _SNAPSHOT = RatesSnapshot(rates=rates, fetched_at=fetched_at)
+    return _SNAPSHOT
 
 
-def update_rates():
-    all_currencies = [
-        Currency(c)
-        for c in chain(list(FiatCurrency.__members__), list(DiemCurrency.__members__))
+def is_rates_refresher() -> bool:
+    """
+    Whether this process should refresh the rates: always without a shared
+    rates table, otherwise only the one process holding the table writer lock.
+    """
+    return _table is None or _table.acquire_writer()
+
+
+def update_rates() -> RatesSnapshot:
+    """
+    Fetches every LP quoted pair concurrently and swaps in a new snapshot.
+    A pair failing to refresh keeps its previous rate and fetch time.
+    """
+    global _SNAPSHOT, _table_sequence
+    start = perf_counter()
+    previous = get_rates_snapshot()
+    rates = dict(previous.rates)
+    fetched_at = dict(previous.fetched_at)
+
+    client = LpClient()
+    conversions = _quoted_conversions()
+    fetches = [
+        _executor.submit(_fetch_rate, client, candidates) for candidates in conversions
     ]
-    base_currencies = [Currency(c) for c in DiemCurrency]
+    for candidates, fetch in zip(conversions, fetches):
+        try:
+            pair, rate = fetch.result()
+        except Exception:
+            pair_str = candidates[0].name
+            logger.exception(f"failed to refresh rate {pair_str}")
+            RATE_FETCH_FAILURES.labels(pair=pair_str).inc()
+            continue
 
-    for base_currency in base_currencies:
-        for quote_currency in all_currencies:
-            if base_currency == quote_currency:
-                continue
+        base, quote = pair.base.value, pair.quote.value
+        inverse = Amount().deserialize(Amount.unit) / rate
+        rates[f"{base}_{quote}"] = rate.serialize()
+        rates[f"{quote}_{base}"] = inverse.serialize()
+        fetched_at[f"{base}_{quote}"] = fetched_at[f"{quote}_{base}"] = time()
 
-            try:
-                _set_rate(base_currency, quote_currency)
-            except LookupError:
-                _set_rate(quote_currency, base_currency)
+    if _table is not None:
+        _table_sequence = _table.write(rates, fetched_at)
+    _SNAPSHOT = RatesSnapshot(rates=rates, fetched_at=fetched_at)
+    for pair_str in rates:
+        RATE_AGE_SECONDS.labels(pair=pair_str).set_function(
+            lambda pair_str=pair_str: get_rates_snapshot().age(pair_str)
+        )
+    RATES_REFRESH_SECONDS.observe(perf_counter() - start)
+    return _SNAPSHOT
 
 
-def _set_rate(base_currency: Currency, quote_currency: Currency):
-    global RATES
-    rate = _get_rate_internal(
-        base_currency=base_currency, quote_currency=quote_currency
-    )
-    RATES[str(CurrencyPair(base_currency, quote_currency))] = rate
-    unit = Amount().deserialize(Amount.unit)
-    rate = unit / rate
-    RATES[str(CurrencyPair(quote_currency, base_currency))] = rate
+def _quoted_conversions() -> List[List[CurrencyPairs]]:
+    """
+    For each Diem currency and every other currency, the LP pairs able to
+    convert between them, preferring the one based in the Diem currency.
+    """
+    all_currencies = list(chain(FiatCurrency.__members__, DiemCurrency.__members__))
+    conversions, seen = [], set()
+    for base in DiemCurrency.__members__:
+        for quote in all_currencies:
+            if base == quote or frozenset((base, quote)) in seen:
+                continue
+            seen.add(frozenset((base, quote)))
+            candidates = [
+                CurrencyPairs[pair_str]
+                for pair_str in (f"{base}_{quote}", f"{quote}_{base}")
+                if pair_str in CurrencyPairs.__members__
+            ]
+            if candidates:
+                conversions.append(candidates)
+    return conversions
 
 
-def _get_rate_internal(base_currency: Currency, quote_currency: Currency) -> Amount:
-    currency_pair = CurrencyPair(base_currency, quote_currency)
-    pair_str = f"{base_currency.value}_{quote_currency.value}"
+def _fetch_rate(
+    client: LpClient, candidates: List[CurrencyPairs]
+) -> Tuple[CurrencyPair, Amount]:
+    """Quotes the first candidate pair, falling back to the next ones on failure"""
+    for candidate in candidates[:-1]:
+        try:
+            return _fetch_pair_rate(client, candidate.value)
+        except Exception:
+            pass
+    return _fetch_pair_rate(client, candidates[-1].value)
 
-    if pair_str in CurrencyPairs.__members__:
-        quote = LpClient().get_quote(pair=currency_pair, amount=1)
-        return Amount().deserialize(quote.rate.rate)
 
-    raise LookupError(f"No conversion to currency pair {currency_pair}")
+def _fetch_pair_rate(
+    client: LpClient, pair: CurrencyPair
+) -> Tuple[CurrencyPair, Amount]:
+    quote = client.get_quote(pair=pair, amount=1)
+    return pair, Amount().deserialize(quote.rate.rate)
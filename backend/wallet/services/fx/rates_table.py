@@ -0,0 +1,108 @@
+# Copyright (c) The Diem Core Contributors
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+Rates shared by every web worker process through a memory mapped file, so
+that a single process refreshes them from the LP.
+
+The file holds a header (sequence number, pair count) followed by one slot
+per pair of PAIRS (int64 fixed-point rate, float64 fetch time, 0 when the
+pair has no rate yet). The writer makes the sequence number odd while it
+updates the slots and even again when done; readers retry until they read
+the same even sequence number before and after copying the slots.
+"""
+
+import fcntl
+import mmap
+import os
+import struct
+from itertools import chain
+from typing import Dict, List, Optional, Tuple
+
+from diem_utils.types.currencies import DiemCurrency, FiatCurrency
+
+_HEADER = struct.Struct("<QI4x")
+_SLOT = struct.Struct("<qd")
+_READ_ATTEMPTS = 1000
+
+
+def _pairs() -> List[str]:
+    all_currencies = list(chain(FiatCurrency.__members__, DiemCurrency.__members__))
+    return sorted(
+        {
+            pair_str
+            for base in DiemCurrency.__members__
+            for quote in all_currencies
+            if base != quote
+            for pair_str in (f"{base}_{quote}", f"{quote}_{base}")
+        }
+    )
+
+
+PAIRS: List[str] = _pairs()
+
+
+class RatesTable:
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.size = _HEADER.size + _SLOT.size * len(PAIRS)
+        self._index = {pair_str: i for i, pair_str in enumerate(PAIRS)}
+        self._lock_fd: Optional[int] = None
+
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size < self.size:
+                os.ftruncate(fd, self.size)
+            self._map = mmap.mmap(fd, self.size)
+        finally:
+            os.close(fd)
+
+    @property
+    def sequence(self) -> int:
+        return _HEADER.unpack_from(self._map, 0)[0]
+
+    def acquire_writer(self) -> bool:
+        """
+        Makes this process the single writer of the table, for as long as it
+        lives. Returns False while another process holds it.
+        """
+        if self._lock_fd is not None:
+            return True
+        fd = os.open(f"{self.path}.lock", os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        self._lock_fd = fd
+        return True
+
+    def write(self, rates: Dict[str, int], fetched_at: Dict[str, float]) -> int:
+        sequence = self.sequence
+        # a writer that died mid update left the sequence odd
+        sequence += 1 + sequence % 2
+        _HEADER.pack_into(self._map, 0, sequence, len(PAIRS))
+        for pair_str, rate in rates.items():
+            offset = _HEADER.size + _SLOT.size * self._index[pair_str]
+            _SLOT.pack_into(self._map, offset, rate, fetched_at[pair_str])
+        _HEADER.pack_into(self._map, 0, sequence + 1, len(PAIRS))
+        return sequence + 1
+
+    def read(self) -> Tuple[int, Dict[str, int], Dict[str, float]]:
+        """Returns the sequence number, rates and fetch times of a complete update"""
+        for _ in range(_READ_ATTEMPTS):
+            sequence = self.sequence
+            if sequence % 2:
+                continue
+            slots = self._map[_HEADER.size : self.size]
+            if self.sequence != sequence:
+                continue
+
+            rates, fetched_at = {}, {}
+            for pair_str, (rate, timestamp) in zip(PAIRS, _SLOT.iter_unpack(slots)):
+                if rate:
+                    rates[pair_str] = rate
+                    fetched_at[pair_str] = timestamp
+            return sequence, rates, fetched_at
+
+        raise TimeoutError(f"rates table {self.path} is being written for too long")
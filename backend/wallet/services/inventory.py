@@ -3,6 +3,7 @@
 
 import logging
 import time
+from datetime import datetime, timedelta
 from typing import Optional
 from uuid import UUID
 
@@ -12,13 +13,24 @@ from diem.identifier import decode_account
 from diem_utils.sdks.liquidity import LpClient
 from diem_utils.types.currencies import DiemCurrency
 from diem_utils.types.liquidity.currency import Currency, CurrencyPairs, CurrencyPair
-from diem_utils.types.liquidity.quote import QuoteData
+from diem_utils.types.liquidity.quote import QuoteData, QuoteId
 from diem_utils.types.liquidity.trade import TradeStatus, TradeData, TradeId
+from wallet import services
+from wallet.config import COVER_TIMEOUT_S
 from wallet.logging import log_execution
 from wallet.services import INVENTORY_ACCOUNT_NAME
 from wallet.services.account import get_deposit_address, create_account
 from wallet.services.transaction import send_transaction, get_transaction
-from wallet.storage import Order, update_order, get_account
+from wallet.storage import (
+    Order,
+    get_account,
+    get_cover_orders_waiting_for,
+    get_order,
+    get_pending_cover_orders,
+    on_commit,
+    transition_order_cover,
+    update_order,
+)
 from wallet.types import (
     Direction,
     CoverStatus,
@@ -32,21 +44,6 @@ INVENTORY_COVER_CURRENCY = Currency.USD
 INVENTORY_AMOUNT = 950_000_000
 
 
-def wait_for_trade_to_complete(trade_id):
-    retries = 10
-    polling_interval_s = 2
-    for _ in range(retries):
-        logger.info(f"wait for trade to complete {trade_id}")
-        trade_info = LpClient().trade_info(trade_id)
-        if trade_info.status == TradeStatus.Complete:
-            return True
-        else:
-            logger.info(f"status: {trade_info.status}")
-            time.sleep(polling_interval_s)
-
-    return False
-
-
 def setup_inventory_account():
     inventory_account = get_account(account_name=INVENTORY_ACCOUNT_NAME)
     if inventory_account:
@@ -78,18 +75,25 @@ def buy_funds(currency_pair):
 
     internal_address = get_inventory_deposit_address()
 
-    trade_id = LpClient().trade_and_execute(
+    # the funds are credited when pubsub ingests the LP deposit
+    LpClient().trade_and_execute(
         quote_id=quote.quote_id,
         direction=Direction.Buy,
         diem_deposit_address=internal_address,
     )
 
-    if wait_for_trade_to_complete(trade_id):
-        return
-
 
 def cover_order(order: Order):
+    """
+    Starts covering the order with the LP and returns, advance_cover moves it
+    on when what it waits for is done:
+    Buy: PendingCoverTrade (LP trade) -> PendingCoverValidation (LP deposit
+    on chain) -> Covered.
+    Sell: PendingCoverDeposit (our transfer to the LP on chain) -> trade with
+    the LP -> Covered.
+    """
     base_currency = Currency[order.base_currency]
+    order_id = OrderId(UUID(order.id))
 
     quote = LpClient().get_quote(
         CurrencyPair(base=base_currency, quote=INVENTORY_COVER_CURRENCY),
@@ -97,90 +101,113 @@ def cover_order(order: Order):
     )
 
     update_order(
-        order_id=OrderId(UUID(order.id)),
+        order_id=order_id,
         quote_id=str(quote.quote_id),
         quote_expiration=quote.expires_at,
         rate=quote.rate.rate,
         cover_status=CoverStatus.PendingCoverWithQuote,
     )
 
-    covered = False
+    deadline = datetime.utcnow() + timedelta(seconds=COVER_TIMEOUT_S)
     if Direction[order.direction] == Direction.Sell:
-        covered = _cover_sell(order, quote)
+        _start_cover_sell(order, deadline)
 
     elif Direction[order.direction] == Direction.Buy:
-        covered = _cover_buy(order, quote)
+        _start_cover_buy(order, quote, deadline)
+
+    # what the cover waits for may be done already
+    advance_cover(order_id)
 
-    if covered:
-        update_order(order_id=OrderId(UUID(order.id)), cover_status=CoverStatus.Covered)
 
+def advance_cover(order_id: OrderId) -> None:
+    """Moves a pending cover on as far as the LP and the blockchain allow"""
+    order = get_order(order_id)
+    cover_status = CoverStatus(order.cover_status)
+    expired = bool(order.cover_deadline and order.cover_deadline < datetime.utcnow())
 
-def _cover_buy(order: Order, quote: QuoteData) -> bool:
+    if cover_status == CoverStatus.PendingCoverDeposit:
+        _advance_cover_sell(order, expired)
+
+    elif cover_status == CoverStatus.PendingCoverTrade:
+        trade_info = _get_completed_trade(order)
+        if trade_info:
+            if not transition_order_cover(
+                order_id,
+                CoverStatus.PendingCoverTrade,
+                CoverStatus.PendingCoverValidation,
+                cover_tx_version=trade_info.tx_version,
+            ):
+                return
+            _validate_cover_buy(get_order(order_id), trade_info, expired)
+        elif expired:
+            log_execution(f"Trade with LP failed, trade {order.trade_id} timeout")
+            transition_order_cover(
+                order_id,
+                CoverStatus.PendingCoverTrade,
+                CoverStatus.FailedCoverLPTradeError,
+            )
+
+    elif cover_status == CoverStatus.PendingCoverValidation:
+        _validate_cover_buy(order, None, expired)
+
+
+def advance_covers_waiting_for(
+    cover_tx_id: Optional[int] = None, cover_tx_version: Optional[int] = None
+) -> None:
+    """
+    Notifies the covers waiting for a transaction that it changed, once the
+    change is committed, so that they never read it before it is
+    """
+    for order in get_cover_orders_waiting_for(cover_tx_id, cover_tx_version):
+        on_commit(lambda order_id=order.id: _notify_cover(order_id))
+
+
+def _notify_cover(order_id: str) -> None:
+    if services.run_bg_tasks():
+        from ..background_tasks.background import async_advance_cover
+
+        async_advance_cover.send(order_id)
+    else:
+        advance_cover(OrderId(UUID(order_id)))
+
+
+def poll_pending_covers() -> None:
+    """
+    Advances every pending cover, catching up with LP trades (which have no
+    notification) and missed notifications, and failing expired covers
+    """
+    for order in get_pending_cover_orders(_WAITING_COVER_STATUSES):
+        try:
+            advance_cover(OrderId(UUID(order.id)))
+        except Exception:
+            logger.exception(f"failed to advance cover of order {order.id}")
+
+
+_WAITING_COVER_STATUSES = [
+    CoverStatus.PendingCoverTrade,
+    CoverStatus.PendingCoverDeposit,
+    CoverStatus.PendingCoverValidation,
+]
+
+
+def _start_cover_buy(order: Order, quote: QuoteData, deadline: datetime) -> None:
     deposit_address = get_inventory_deposit_address()
     trade_id = LpClient().trade_and_execute(
         quote_id=quote.quote_id,
         direction=Direction[order.direction],
         diem_deposit_address=deposit_address,
     )
-    trade_info = _wait_for_trade(order=order, trade_id=trade_id)
-
-    if not trade_info:
-        update_order(
-            order_id=OrderId(UUID(order.id)),
-            cover_status=CoverStatus.FailedCoverLPTradeError,
-        )
-        return False
 
     update_order(
         order_id=OrderId(UUID(order.id)),
-        cover_status=CoverStatus.PendingCoverValidation,
+        trade_id=str(trade_id),
+        cover_deposit_address=deposit_address,
+        cover_deadline=deadline,
+        cover_status=CoverStatus.PendingCoverTrade,
     )
 
-    vasp_address, internal_subaddress = decode_account(
-        deposit_address, context.get().config.diem_address_hrp()
-    )
-    if not _validate_blockchain_transaction(
-        blockchain_version=trade_info.tx_version,
-        vasp_address=utils.account_address_hex(vasp_address),
-        internal_subaddress=internal_subaddress.hex(),
-        amount=round(trade_info.amount),
-    ):
-        update_order(
-            order_id=OrderId(UUID(order.id)),
-            cover_status=CoverStatus.FailedCoverTransactionError,
-        )
-        return False
-
-    return True
-
-
-def _cover_sell(order: Order, quote: QuoteData) -> bool:
-    transfer_to_lp_blockchain_version = _transfer_funds_to_lp(order)
-
-    if transfer_to_lp_blockchain_version == -1:
-        update_order(
-            order_id=OrderId(UUID(order.id)),
-            cover_status=CoverStatus.FailedCoverTransactionError,
-        )
-        return False
-
-    trade_info = LpClient().trade_and_execute(
-        quote_id=quote.quote_id,
-        direction=Direction[order.direction],
-        tx_version=transfer_to_lp_blockchain_version,
-    )
-
-    if not trade_info:
-        update_order(
-            order_id=OrderId(UUID(order.id)),
-            cover_status=CoverStatus.FailedCoverLPTradeError,
-        )
-        return False
-
-    return True
 
-
-def _transfer_funds_to_lp(order: Order) -> int:
+def _start_cover_sell(order: Order, deadline: datetime) -> None:
     lp_details = LpClient().lp_details()
     inventory_account = get_account(account_name=INVENTORY_ACCOUNT_NAME).id
 
@@ -191,71 +218,108 @@ def _transfer_funds_to_lp(order: Order) -> int:
         destination_address=lp_details.vasp,
         destination_subaddress=lp_details.sub_address,
     )
-    return _wait_for_lp_deposit_transaction_to_complete(tx.id)
 
+    update_order(
+        order_id=OrderId(UUID(order.id)),
+        cover_tx_id=tx.id,
+        cover_deadline=deadline,
+        cover_status=CoverStatus.PendingCoverDeposit,
+    )
 
-def _wait_for_lp_deposit_transaction_to_complete(tx_id: int) -> int:
-    retries = 10
-    interval_s = 2
-    for _ in range(retries):
-        transaction = get_transaction(transaction_id=tx_id)
-        if transaction.status == TransactionStatus.COMPLETED.value:
-            try:
-                return transaction.blockchain_version
-            except Exception as e:
-                log_execution(
-                    f"Trade with LP failed, send transaction error, payment status {transaction.status}"
-                )
-                return -1
-        time.sleep(interval_s)
-
-    log_execution(f"Trade with LP failed, send transaction error, timeout")
-    return -1
-
-
-def _validate_blockchain_transaction(
-    blockchain_version: int, vasp_address: str, internal_subaddress: str, amount: int
-):
-    retries = 10
-    interval_s = 2
-    for _ in range(retries):
-        transaction = get_transaction(blockchain_version=blockchain_version)
-        if transaction:
-            if (
-                transaction.status == TransactionStatus.COMPLETED.value
-                and transaction.destination_address == vasp_address
-                and transaction.destination_subaddress == internal_subaddress
-                and transaction.amount == amount
-            ):
-                return transaction.blockchain_version
-            else:
-                log_execution(
-                    f"Trade with LP failed, send transaction error, "
-                    f"transaction status {transaction.status}, "
-                    f"dest addr: {transaction.destination_address}"
-                    f"dest subaddr: {transaction.destination_subaddress}"
-                    f"amount: {transaction.amount}"
-                )
-                return -1
-        time.sleep(interval_s)
 
-    log_execution(f"Trade with LP failed, send transaction error, timeout")
-    return -1
+def _advance_cover_sell(order: Order, expired: bool) -> None:
+    order_id = OrderId(UUID(order.id))
+    transaction = get_transaction(transaction_id=order.cover_tx_id)
 
+    if transaction.status != TransactionStatus.COMPLETED:
+        if transaction.status == TransactionStatus.CANCELED:
+            log_execution(
+                f"Trade with LP failed, send transaction error, payment status {transaction.status}"
+            )
+        elif expired:
+            log_execution(f"Trade with LP failed, send transaction error, timeout")
+        else:
+            return
+        transition_order_cover(
+            order_id,
+            CoverStatus.PendingCoverDeposit,
+            CoverStatus.FailedCoverTransactionError,
+        )
+        return
 
-def _wait_for_trade(order: Order, trade_id: TradeId) -> Optional[TradeData]:
-    retries = 10
-    polling_interval_s = 2
+    # only the first to claim the deposit trades it
+    if not transition_order_cover(
+        order_id, CoverStatus.PendingCoverDeposit, CoverStatus.PendingCoverTrade
+    ):
+        return
 
-    for _ in range(retries):
-        trade_info = LpClient().trade_info(trade_id)
-        if trade_info.status == TradeStatus.Complete:
-            return trade_info
+    trade_id = LpClient().trade_and_execute(
+        quote_id=QuoteId(UUID(order.quote_id)),
+        direction=Direction[order.direction],
+        tx_version=transaction.blockchain_version,
+    )
+
+    update_order(
+        order_id=order_id, trade_id=str(trade_id), cover_status=CoverStatus.Covered
+    )
 
-        time.sleep(polling_interval_s)
 
+def _get_completed_trade(order: Order) -> Optional[TradeData]:
+    if not order.trade_id:
+        # a sell cover trading with the LP right now
+        return None
+    trade_info = LpClient().trade_info(TradeId(UUID(order.trade_id)))
+    if trade_info.status == TradeStatus.Complete:
+        return trade_info
+    logger.info(f"trade {order.trade_id} status: {trade_info.status}")
     return None
 
 
+def _validate_cover_buy(
+    order: Order, trade_info: Optional[TradeData], expired: bool
+) -> None:
+    order_id = OrderId(UUID(order.id))
+    transaction = get_transaction(blockchain_version=order.cover_tx_version)
+    if not transaction:
+        if expired:
+            log_execution(f"Trade with LP failed, send transaction error, timeout")
+            transition_order_cover(
+                order_id,
+                CoverStatus.PendingCoverValidation,
+                CoverStatus.FailedCoverTransactionError,
+            )
+        return
+
+    if trade_info is None:
+        trade_info = LpClient().trade_info(TradeId(UUID(order.trade_id)))
+
+    vasp_address, internal_subaddress = decode_account(
+        order.cover_deposit_address, context.get().config.diem_address_hrp()
+    )
+    if (
+        transaction.status == TransactionStatus.COMPLETED.value
+        and transaction.destination_address == utils.account_address_hex(vasp_address)
+        and transaction.destination_subaddress == internal_subaddress.hex()
+        and transaction.amount == round(trade_info.amount)
+    ):
+        transition_order_cover(
+            order_id, CoverStatus.PendingCoverValidation, CoverStatus.Covered
+        )
+        return
+
+    log_execution(
+        f"Trade with LP failed, send transaction error, "
+        f"transaction status {transaction.status}, "
+        f"dest addr: {transaction.destination_address}"
+        f"dest subaddr: {transaction.destination_subaddress}"
+        f"amount: {transaction.amount}"
+    )
+    transition_order_cover(
+        order_id,
+        CoverStatus.PendingCoverValidation,
+        CoverStatus.FailedCoverTransactionError,
+    )
+
+
 def get_inventory_deposit_address():
     return get_deposit_address(account_name=INVENTORY_ACCOUNT_NAME)
@@ -2,21 +2,36 @@
 # SPDX-License-Identifier: Apache-2.0
 import json
 import logging
-from datetime import datetime
-from typing import Optional, Tuple, Callable, List, Dict
+import threading
+from concurrent import futures
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from time import perf_counter
+from typing import Optional, Tuple, List, Dict
 
 import context
 from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
-from diem import offchain, identifier
+from diem import offchain, identifier, utils
 from diem_utils.types.currencies import DiemCurrency
+from prometheus_client import Counter, Gauge, Histogram
 from wallet import storage
+from wallet.config import (
+    OFFCHAIN_BATCH_SIZE,
+    OFFCHAIN_CLAIM_LEASE_S,
+    OFFCHAIN_COUNTERPARTY_CONCURRENCY,
+    OFFCHAIN_WORKERS,
+)
 from wallet.services import account, kyc
 
 from ..storage import (
     lock_for_update,
     commit_transaction,
-    get_transactions_by_status,
+    claim_transactions,
+    count_transactions_by_status,
+    db_session,
     get_account_id_from_subaddr,
+    release_transaction_claim,
+    unit_of_work,
     Transaction,
 )
 from ..types import (
@@ -26,6 +41,23 @@ from ..types import (
 
 logger = logging.getLogger(__name__)
 
+OFFCHAIN_BACKLOG = Gauge(
+    "lrw_offchain_backlog", "Off-chain transactions waiting per status", ["status"]
+)
+OFFCHAIN_PROCESSING_SECONDS = Histogram(
+    "lrw_offchain_processing_seconds",
+    "Time to process one off-chain transaction",
+    ["status"],
+)
+TRAVEL_RULE_PAYMENT_SECONDS = Histogram(
+    "lrw_travel_rule_payment_seconds",
+    "Time from saving an outbound travel rule payment to submitting it on-chain",
+    buckets=(0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60, 120),
+)
+OFFCHAIN_FAILURES = Counter(
+    "lrw_offchain_failures", "Off-chain transactions failing to process", ["status"]
+)
+
 
 def save_outbound_transaction(
     sender_id: int,
@@ -34,24 +66,48 @@ def save_outbound_transaction(
     amount: int,
     currency: DiemCurrency,
 ) -> Transaction:
-    sender_onchain_address = context.get().config.vasp_address
-    sender_subaddress = account.generate_new_subaddress(account_id=sender_id)
-    return commit_transaction(
-        _new_payment_command_transaction(
-            offchain.PaymentCommand.init(
-                identifier.encode_account(
-                    sender_onchain_address, sender_subaddress, _hrp()
-                ),
-                _user_kyc_data(sender_id),
-                identifier.encode_account(
-                    destination_address, destination_subaddress, _hrp()
-                ),
+    with unit_of_work():
+        # held until the unit of work commits the debit
+        account.reserve_balance(sender_id, amount, currency)
+        sender_subaddress = account.generate_new_subaddress(account_id=sender_id)
+        return commit_transaction(
+            new_outbound_transaction(
+                sender_id,
+                sender_subaddress,
+                destination_address,
+                destination_subaddress,
                 amount,
-                currency.value,
-            ),
-            TransactionStatus.OFF_CHAIN_OUTBOUND,
+                currency,
+            )
         )
+
+
+def new_outbound_transaction(
+    sender_id: int,
+    sender_subaddress: str,
+    destination_address: str,
+    destination_subaddress: str,
+    amount: int,
+    currency: DiemCurrency,
+) -> Transaction:
+    """The transaction of save_outbound_transaction, left for the caller to commit"""
+    txn = _new_payment_command_transaction(
+        offchain.PaymentCommand.init(
+            identifier.encode_account(
+                context.get().config.vasp_address, sender_subaddress, _hrp()
+            ),
+            _user_kyc_data(sender_id),
+            identifier.encode_account(
+                destination_address, destination_subaddress, _hrp()
+            ),
+            amount,
+            currency.value,
+        ),
+        TransactionStatus.OFF_CHAIN_OUTBOUND,
     )
+    # the sender subaddress may not be committed yet
+    txn.source_id = sender_id
+    return txn
 
 
 def process_inbound_command(
@@ -75,72 +131,208 @@ def _jws(cid: Optional[str], err: Optional[offchain.OffChainErrorObject] = None)
     return (code, offchain.jws.serialize(resp, _compliance_private_key().sign))
 
 
-def process_offchain_tasks() -> None:
-    def send_command(txn, cmd, _) -> None:
-        assert not cmd.is_inbound()
-        txn.status = TransactionStatus.OFF_CHAIN_WAIT
-        _offchain_client().send_command(cmd, _compliance_private_key().sign)
+def _send_command(txn, cmd, _) -> None:
+    assert not cmd.is_inbound()
+    txn.status = TransactionStatus.OFF_CHAIN_WAIT
+    _offchain_client().send_command(cmd, _compliance_private_key().sign)
 
-    def offchain_action(txn, cmd, action) -> None:
-        assert cmd.is_inbound()
-        if action is None:
-            return
-        if action == offchain.Action.EVALUATE_KYC_DATA:
-            new_cmd = _evaluate_kyc_data(cmd)
-            txn.command_json = offchain.to_json(new_cmd)
-            txn.status = _command_transaction_status(
-                new_cmd, TransactionStatus.OFF_CHAIN_OUTBOUND
-            )
-        else:
-            # todo: handle REVIEW_KYC_DATA and CLEAR_SOFT_MATCH
-            raise ValueError(f"unsupported offchain action: {action}, command: {cmd}")
-
-    def submit_txn(txn, cmd, _) -> Transaction:
-        if cmd.is_sender():
-            logger.info(
-                f"Submitting transaction ID:{txn.id} {txn.amount} {txn.currency}"
-            )
-            _offchain_client().send_command(cmd, _compliance_private_key().sign)
-            rpc_txn = context.get().p2p_by_travel_rule(
-                cmd.receiver_account_address(_hrp()),
-                cmd.payment.action.currency,
-                cmd.payment.action.amount,
-                cmd.travel_rule_metadata(_hrp()),
-                bytes.fromhex(cmd.payment.recipient_signature),
-            )
-            txn.sequence = rpc_txn.transaction.sequence_number
-            txn.blockchain_version = rpc_txn.version
-            txn.status = TransactionStatus.COMPLETED
-            logger.info(
-                f"Submitted transaction ID:{txn.id} V:{txn.blockchain_version} {txn.amount} {txn.currency}"
-            )
 
-    _process_by_status(TransactionStatus.OFF_CHAIN_OUTBOUND, send_command)
-    _process_by_status(TransactionStatus.OFF_CHAIN_INBOUND, offchain_action)
-    _process_by_status(TransactionStatus.OFF_CHAIN_READY, submit_txn)
+def _offchain_action(txn, cmd, action) -> None:
+    assert cmd.is_inbound()
+    if action is None:
+        return
+    if action == offchain.Action.EVALUATE_KYC_DATA:
+        new_cmd = _evaluate_kyc_data(cmd)
+        txn.command_json = offchain.to_json(new_cmd)
+        txn.status = _command_transaction_status(
+            new_cmd, TransactionStatus.OFF_CHAIN_OUTBOUND
+        )
+    else:
+        # todo: handle REVIEW_KYC_DATA and CLEAR_SOFT_MATCH
+        raise ValueError(f"unsupported offchain action: {action}, command: {cmd}")
 
 
-def _process_by_status(
-    status: TransactionStatus,
-    callback: Callable[
-        [Transaction, offchain.PaymentCommand, offchain.Action], Optional[Transaction]
-    ],
-) -> None:
-    txns = get_transactions_by_status(status)
-    for txn in txns:
-        cmd = _txn_payment_command(txn)
-        action = cmd.follow_up_action()
+def _submit_txn(txn, cmd, _) -> Transaction:
+    if cmd.is_sender():
+        logger.info(f"Submitting transaction ID:{txn.id} {txn.amount} {txn.currency}")
+        _offchain_client().send_command(cmd, _compliance_private_key().sign)
+        signed_txn = context.get().submit_p2p_by_travel_rule(
+            cmd.receiver_account_address(_hrp()),
+            cmd.payment.action.currency,
+            cmd.payment.action.amount,
+            cmd.travel_rule_metadata(_hrp()),
+            bytes.fromhex(cmd.payment.recipient_signature),
+        )
+        # completed by confirm_submitted_transactions
+        txn.sequence = int(signed_txn.raw_txn.sequence_number)
+        txn.blockchain_hash = utils.transaction_hash(signed_txn)
+        txn.expiration_timestamp_secs = int(
+            signed_txn.raw_txn.expiration_timestamp_secs
+        )
+        txn.status = TransactionStatus.PENDING
+        TRAVEL_RULE_PAYMENT_SECONDS.observe(
+            (datetime.utcnow() - txn.created_timestamp).total_seconds()
+        )
+        logger.info(
+            f"Submitted transaction ID:{txn.id} S:{txn.sequence} {txn.amount} {txn.currency}"
+        )
 
-        def callback_with_status_check(txn):
-            if txn.status == status:
-                callback(txn, cmd, action)
-            return txn
 
-        logger.info(f"lock for update: {action} {cmd}")
+_STATUS_CALLBACKS = {
+    TransactionStatus.OFF_CHAIN_OUTBOUND: _send_command,
+    TransactionStatus.OFF_CHAIN_INBOUND: _offchain_action,
+    TransactionStatus.OFF_CHAIN_READY: _submit_txn,
+}
+
+
+class OffchainTaskScheduler:
+    """
+    Processes off-chain transactions on a thread pool. Each round claims
+    bounded batches per status with a lease on the transaction rows (see
+    storage.claim_transactions), so that several processes share the work
+    and the rows of a crashed one are picked up once their lease expires.
+    At most counterparty_concurrency transactions with the same counterparty
+    VASP are processed at once: a round claims none for a counterparty at its
+    limit, and a transaction skipped because its counterparty got there in
+    the meantime gives its claim back for a later round.
+    """
+
+    def __init__(
+        self,
+        workers: int = OFFCHAIN_WORKERS,
+        batch_size: int = OFFCHAIN_BATCH_SIZE,
+        counterparty_concurrency: int = OFFCHAIN_COUNTERPARTY_CONCURRENCY,
+        lease_s: float = OFFCHAIN_CLAIM_LEASE_S,
+    ) -> None:
+        self.workers = workers
+        self.batch_size = batch_size
+        self.counterparty_concurrency = counterparty_concurrency
+        self.lease = timedelta(seconds=lease_s)
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="offchain"
+        )
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._counterparties: Dict[str, int] = {}
+        self._backlog = 0
+        # set whenever a transaction in flight is done
+        self._room = threading.Event()
+
+    def run(self, wait: bool = True) -> int:
+        """
+        Runs one round and returns how many transactions it claimed. With
+        wait, every status batch is processed before the next one is claimed,
+        otherwise the round only claims as many transactions as the pool has
+        room for and returns.
+        """
+        claimed = 0
+        self._room.clear()
+        backlog = count_transactions_by_status(list(_STATUS_CALLBACKS))
+        for status, count in backlog.items():
+            OFFCHAIN_BACKLOG.labels(status=status).set(count)
+        self._backlog = sum(backlog.values())
+
+        for status, callback in _STATUS_CALLBACKS.items():
+            with self._lock:
+                room = 2 * self.workers - self._in_flight
+                busy = [
+                    counterparty
+                    for counterparty, processing in self._counterparties.items()
+                    if processing >= self.counterparty_concurrency
+                ]
+            limit = self.batch_size if wait else min(self.batch_size, room)
+            if limit <= 0:
+                break
+            txn_ids = claim_transactions(
+                status, limit, datetime.utcnow() + self.lease, busy
+            )
+            claimed += len(txn_ids)
+            with self._lock:
+                self._in_flight += len(txn_ids)
+            tasks = [
+                self._executor.submit(self._process, txn_id, status, callback)
+                for txn_id in txn_ids
+            ]
+            if wait:
+                futures.wait(tasks)
+        return claimed
+
+    def _process(self, txn_id: int, status: TransactionStatus, callback) -> None:
+        start = perf_counter()
+        counterparty = None
         try:
+            txn = storage.get_transaction(txn_id)
+            counterparty = _counterparty(txn)
+            if not self._enter(counterparty):
+                counterparty = None
+                return
+
+            cmd = _txn_payment_command(txn)
+            action = cmd.follow_up_action()
+
+            def callback_with_status_check(txn):
+                if txn.status == status:
+                    callback(txn, cmd, action)
+                return txn
+
+            logger.info(f"lock for update: {action} {cmd}")
             lock_for_update(txn.reference_id, callback_with_status_check)
+            OFFCHAIN_PROCESSING_SECONDS.labels(status=status.value).observe(
+                perf_counter() - start
+            )
         except Exception:
             logger.exception("process offchain transaction failed")
+            OFFCHAIN_FAILURES.labels(status=status.value).inc()
+        finally:
+            if counterparty is not None:
+                self._exit(counterparty)
+            try:
+                release_transaction_claim(txn_id)
+            finally:
+                db_session.remove()
+                with self._lock:
+                    self._in_flight -= 1
+                self._room.set()
+
+    def wait_for_room(self, timeout: float) -> bool:
+        """
+        When the last round left a backlog because the pool was full, waits
+        up to timeout seconds for a transaction in flight to be done and
+        returns True. Otherwise returns False right away.
+        """
+        with self._lock:
+            full = self._in_flight >= 2 * self.workers
+        if not (full and self._backlog):
+            return False
+        self._room.wait(timeout)
+        return True
+
+    def _enter(self, counterparty: str) -> bool:
+        with self._lock:
+            processing = self._counterparties.get(counterparty, 0)
+            if processing >= self.counterparty_concurrency:
+                return False
+            self._counterparties[counterparty] = processing + 1
+            return True
+
+    def _exit(self, counterparty: str) -> None:
+        with self._lock:
+            self._counterparties[counterparty] -= 1
+            if not self._counterparties[counterparty]:
+                del self._counterparties[counterparty]
+
+
+def _counterparty(txn: Transaction) -> str:
+    if txn.source_address == context.get().config.vasp_address:
+        return txn.destination_address
+    return txn.source_address
+
+
+offchain_task_scheduler = OffchainTaskScheduler()
+
+
+def process_offchain_tasks(wait: bool = True) -> int:
+    return offchain_task_scheduler.run(wait)
 
 
 def _evaluate_kyc_data(command: offchain.PaymentObject) -> offchain.PaymentObject:
@@ -3,7 +3,6 @@
 # Copyright (c) The Diem Core Contributors
 # SPDX-License-Identifier: Apache-2.0
 
-import time
 import typing
 import uuid
 from datetime import datetime, timedelta
@@ -15,6 +14,7 @@ from diem_utils.types.liquidity.currency import Currency, CurrencyPair, Currency
 from wallet import services
 from wallet import storage
 from wallet.services import inventory, INVENTORY_ACCOUNT_NAME
+from wallet.services.account import get_internal_subaddress
 from wallet.services.fx.fx import get_rate
 from wallet.services.inventory import buy_funds, INVENTORY_COVER_CURRENCY
 from wallet.services.transaction import (
@@ -45,9 +45,6 @@ import logging
 logging.getLogger(__name__)
 
 
-PAYMENT_PROCESSING_DUMMY_SLEEP_TIME = 3
-
-
 def process_payment_method(
     payment_method: str, amount: int, action: PaymentMethodAction
 ):
@@ -66,7 +63,6 @@ def process_payment_method(
 def process_order_payment(order_id, payment_method, action: PaymentMethodAction):
     order = get_order(order_id)
 
-    time.sleep(PAYMENT_PROCESSING_DUMMY_SLEEP_TIME)
     charge_token = process_payment_method(payment_method, order.exchange_amount, action)
 
     if charge_token:
@@ -214,26 +210,34 @@ def execute_convert(order: Order) -> ConvertResult:
         return ConvertResult.InsufficientInventoryBalance
 
     try:
-        to_inventory_tx = internal_transaction(
-            sender_id=user_account,
-            receiver_id=inventory_account,
-            amount=from_amount,
-            currency=from_diem_currency,
-            payment_type=TransactionType.INTERNAL,
-        )
-        from_inventory_tx = internal_transaction(
-            sender_id=inventory_account,
-            receiver_id=user_account,
-            amount=to_amount,
-            currency=to_diem_currency,
-            payment_type=TransactionType.INTERNAL,
-        )
-        update_order(
-            order_id=order_id,
-            internal_ledger_tx=to_inventory_tx.id,
-            correlated_tx=from_inventory_tx.id,
-            order_status=OrderStatus.Executed,
-        )
+        # resolved before the unit of work: allocating one claims subaddress
+        # counters on a connection of its own, which would wait on the writes
+        # the unit has flushed when the DB locks as a whole (SQLite)
+        get_internal_subaddress(user_account)
+        get_internal_subaddress(inventory_account)
+
+        # both legs and the order update are committed together, or not at all
+        with storage.unit_of_work():
+            to_inventory_tx = internal_transaction(
+                sender_id=user_account,
+                receiver_id=inventory_account,
+                amount=from_amount,
+                currency=from_diem_currency,
+                payment_type=TransactionType.INTERNAL,
+            )
+            from_inventory_tx = internal_transaction(
+                sender_id=inventory_account,
+                receiver_id=user_account,
+                amount=to_amount,
+                currency=to_diem_currency,
+                payment_type=TransactionType.INTERNAL,
+            )
+            update_order(
+                order_id=order_id,
+                internal_ledger_tx=to_inventory_tx.id,
+                correlated_tx=from_inventory_tx.id,
+                order_status=OrderStatus.Executed,
+            )
         return ConvertResult.Success
     except Exception:
         logging.exception("execute convert")
@@ -0,0 +1,231 @@
+# Copyright (c) The Diem Core Contributors
+# SPDX-License-Identifier: Apache-2.0
+
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+from typing import List, Optional, Tuple
+from uuid import uuid4
+
+import context
+from diem import utils
+from diem_utils.types.currencies import DiemCurrency
+from wallet import services, storage
+from wallet.config import PAYOUT_MAX_ITEMS
+from wallet.logging import log_execution
+from wallet.services import account as account_service, offchain as offchain_service
+from wallet.services.risk import risk_check
+from wallet.services.transaction import SelfAsDestinationError
+from wallet.storage import (
+    SubAddress,
+    Transaction,
+    add_payout_transactions,
+    get_account_ids_from_subaddrs,
+    get_payout_transactions,
+    record_submitted_transactions,
+)
+from wallet.types import TransactionStatus, TransactionType
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Payout:
+    destination_address: str
+    destination_subaddress: str
+    amount: int
+
+
+class InvalidPayoutError(Exception):
+    pass
+
+
+def send_payouts(
+    sender_id: int, currency: DiemCurrency, payouts: List[Payout]
+) -> Tuple[str, List[Transaction]]:
+    """
+    Sends a batch of payouts from one account and returns the batch id with
+    the transaction of each payout. The balance is checked once for the
+    batch total and every transaction is written in a single commit, then the
+    on-chain ones are submitted back to back, see submit_payouts.
+    Payouts go the way send_transaction would send them: internally, on-chain,
+    or through the off-chain travel rule exchange above the risk threshold.
+    """
+    receiver_ids = _validate_payouts(sender_id, payouts)
+    log_execution(f"payout batch of {len(payouts)} from sender {sender_id}")
+
+    batch_id = uuid4().hex
+    vasp_address = context.get().config.vasp_address
+    subaddresses = []
+    transactions = []
+
+    def new_subaddress(account_id: int) -> str:
+        subaddress = account_service.generate_sub_address()
+        subaddresses.append(SubAddress(address=subaddress, account_id=account_id))
+        return subaddress
+
+    # resolved and allocated before the balance is reserved, so the lock is
+    # only held for the write of the batch
+    for payout, receiver_id in zip(payouts, receiver_ids):
+        if receiver_id is not None:
+            txn = _new_transaction(
+                TransactionType.INTERNAL,
+                TransactionStatus.COMPLETED,
+                sender_id,
+                account_service.get_internal_subaddress(sender_id),
+                vasp_address,
+                account_service.get_internal_subaddress(receiver_id),
+                payout.amount,
+                currency,
+            )
+            txn.destination_id = receiver_id
+        elif risk_check(sender_id, payout.amount):
+            txn = _new_transaction(
+                TransactionType.EXTERNAL,
+                TransactionStatus.PENDING,
+                sender_id,
+                new_subaddress(sender_id),
+                payout.destination_address,
+                payout.destination_subaddress,
+                payout.amount,
+                currency,
+            )
+        else:
+            txn = offchain_service.new_outbound_transaction(
+                sender_id,
+                new_subaddress(sender_id),
+                payout.destination_address,
+                payout.destination_subaddress,
+                payout.amount,
+                currency,
+            )
+        txn.payout_batch_id = batch_id
+        transactions.append(txn)
+
+    with storage.unit_of_work():
+        # held until the unit of work commits the debits
+        account_service.reserve_balance(
+            sender_id, sum(payout.amount for payout in payouts), currency
+        )
+        add_payout_transactions(subaddresses, transactions)
+    log_execution(f"payout batch {batch_id} saved")
+
+    if any(txn.status == TransactionStatus.PENDING for txn in transactions):
+        if services.run_bg_tasks():
+            from ..background_tasks.background import async_submit_payouts
+
+            async_submit_payouts.send(batch_id)
+        else:
+            submit_payouts(batch_id)
+
+    return batch_id, transactions
+
+
+def get_payouts(batch_id: str) -> List[Transaction]:
+    return get_payout_transactions(batch_id)
+
+
+def submit_payouts(batch_id: str) -> None:
+    """
+    Signs the on-chain transactions of the batch with locally allocated
+    sequence numbers and submits them one after the other, without waiting
+    for them to execute. They are confirmed later by
+    confirm_submitted_transactions.
+    A failed submit leaves a gap in the sequence numbers that the later
+    transactions would wait behind until they expire, so the batch stops
+    there and the failed transaction and the rest are canceled.
+    """
+    ctx = context.get()
+    submitted = {}
+    failed = []
+    for txn in get_payout_transactions(batch_id):
+        if txn.status != TransactionStatus.PENDING or txn.blockchain_hash is not None:
+            continue
+        if failed:
+            failed.append(txn.id)
+            continue
+
+        try:
+            signed_txn = ctx.create_p2p_by_general(
+                currency=DiemCurrency[txn.currency].value,
+                amount=txn.amount,
+                receiver_vasp_address=txn.destination_address,
+                receiver_sub_address=txn.destination_subaddress,
+                sender_sub_address=txn.source_subaddress,
+            )
+            ctx.submit(signed_txn)
+        except Exception:
+            logger.exception(f"submit payout transaction {txn.id} failed")
+            failed.append(txn.id)
+            continue
+        submitted[txn.id] = (
+            int(signed_txn.raw_txn.sequence_number),
+            utils.transaction_hash(signed_txn),
+            int(signed_txn.raw_txn.expiration_timestamp_secs),
+        )
+
+    record_submitted_transactions(submitted, failed)
+    log_execution(
+        f"payout batch {batch_id} submitted {len(submitted)} transactions, "
+        f"canceled {len(failed)}"
+    )
+
+
+def _validate_payouts(sender_id: int, payouts: List[Payout]) -> List[Optional[int]]:
+    """Returns the receiving account of each payout, None for other VASPs"""
+    if not payouts:
+        raise InvalidPayoutError("A payout batch needs at least one payout")
+    if len(payouts) > PAYOUT_MAX_ITEMS:
+        raise InvalidPayoutError(
+            f"A payout batch has at most {PAYOUT_MAX_ITEMS} payouts, got {len(payouts)}"
+        )
+
+    vasp_address = context.get().config.vasp_address
+    for payout in payouts:
+        if payout.amount <= 0:
+            raise InvalidPayoutError(f"Invalid payout amount {payout.amount}")
+        if not payout.destination_subaddress:
+            # like send_transaction, which does not handle them yet
+            raise InvalidPayoutError("Payouts to unhosted wallets are not supported")
+
+    account_ids = get_account_ids_from_subaddrs(
+        payout.destination_subaddress
+        for payout in payouts
+        if payout.destination_address == vasp_address
+    )
+    receiver_ids = []
+    for payout in payouts:
+        receiver_id = None
+        if payout.destination_address == vasp_address:
+            receiver_id = account_ids.get(payout.destination_subaddress)
+        if receiver_id == sender_id:
+            raise SelfAsDestinationError(
+                "It is not possible to send transaction to your own wallet."
+            )
+        receiver_ids.append(receiver_id)
+
+    return receiver_ids
+
+
+def _new_transaction(
+    payment_type: TransactionType,
+    status: TransactionStatus,
+    sender_id: int,
+    sender_subaddress: str,
+    destination_address: str,
+    destination_subaddress: str,
+    amount: int,
+    currency: DiemCurrency,
+) -> Transaction:
+    return Transaction(
+        type=payment_type,
+        status=status,
+        amount=amount,
+        currency=currency,
+        created_timestamp=datetime.utcnow(),
+        source_id=sender_id,
+        source_address=context.get().config.vasp_address,
+        source_subaddress=sender_subaddress,
+        destination_address=destination_address,
+        destination_subaddress=destination_subaddress,
+    )
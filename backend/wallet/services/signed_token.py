@@ -0,0 +1,99 @@
+# Copyright (c) The Diem Core Contributors
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+Self-contained access tokens, used instead of Token rows when TOKEN_MODE is
+"signed". A token is <claims>.<signature>, both base64url encoded, where the
+signature is HMAC-SHA256 of the encoded claims keyed with SECRET_KEY.
+Revoked tokens are kept in a revocation list until they would have expired,
+shared by all web processes.
+
+The admin flag is part of the claims but admin rights are still read from the
+user row (see user.get_user_by_token), so demoting an admin does not wait for
+the token to expire.
+"""
+
+import base64
+import hashlib
+import hmac
+import json
+from dataclasses import dataclass
+from time import time
+from typing import Optional
+from uuid import uuid4
+
+from wallet.cache import create_cache
+from wallet.config import SECRET_KEY, TOKEN_MODE, TOKEN_REVOCATION_BACKEND
+
+if TOKEN_MODE == "signed" and TOKEN_REVOCATION_BACKEND == "memory":
+    # a logout or a blocked user would only be seen by the process serving it
+    raise ValueError("Signed tokens need a shared TOKEN_REVOCATION_BACKEND")
+
+
+@dataclass(frozen=True)
+class TokenClaims:
+    token_id: str
+    user_id: int
+    is_admin: bool
+    issued_at: float
+    expiration_time: float
+
+
+# token id -> True and "user:<user id>" -> time all user tokens got revoked
+revocation_list = create_cache(
+    "revoked_tokens", TOKEN_REVOCATION_BACKEND, max_size=None, ttl=0
+)
+
+
+def issue_token(user_id: int, is_admin: bool, expiration_time: float) -> str:
+    claims = {
+        "jti": uuid4().hex,
+        "uid": user_id,
+        "adm": is_admin,
+        "iat": time(),
+        "exp": expiration_time,
+    }
+    payload = _encode(json.dumps(claims, separators=(",", ":")).encode())
+    return f"{payload}.{_sign(payload)}"
+
+
+def verify_token(token: str) -> Optional[TokenClaims]:
+    """Returns the token claims, None when token is forged, expired or revoked"""
+    payload, _, signature = token.partition(".")
+    if not hmac.compare_digest(signature.encode(), _sign(payload).encode()):
+        return None
+
+    claims = json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+    claims = TokenClaims(
+        token_id=claims["jti"],
+        user_id=claims["uid"],
+        is_admin=claims["adm"],
+        issued_at=claims["iat"],
+        expiration_time=claims["exp"],
+    )
+    if time() >= claims.expiration_time or revocation_list.get(claims.token_id):
+        return None
+
+    revoked_at = revocation_list.get(f"user:{claims.user_id}")
+    if revoked_at is not None and claims.issued_at <= revoked_at:
+        return None
+
+    return claims
+
+
+def revoke_token(claims: TokenClaims) -> None:
+    revocation_list.set(claims.token_id, True, ttl=claims.expiration_time - time())
+
+
+def revoke_user_tokens(user_id: int, max_token_lifetime: float) -> None:
+    """Revokes every token issued to user_id so far, none outlives max_token_lifetime"""
+    revocation_list.set(f"user:{user_id}", time(), ttl=max_token_lifetime)
+
+
+def _sign(payload: str) -> str:
+    digest = hmac.new(SECRET_KEY.encode(), payload.encode(), hashlib.sha256).digest()
+    return _encode(digest)
+
+
+def _encode(value: bytes) -> str:
+    return base64.urlsafe_b64encode(value).decode().rstrip("=")
@@ -0,0 +1,66 @@
+# Copyright (c) The Diem Core Contributors
+# SPDX-License-Identifier: Apache-2.0
+
+import hashlib
+import hmac
+import threading
+from typing import Callable
+
+from diem import identifier
+
+_HALF_BITS = identifier.DIEM_SUBADDRESS_SIZE * 4
+_HALF_MASK = (1 << _HALF_BITS) - 1
+_ROUNDS = 4
+
+
+class SubAddressAllocator:
+    """
+    Derives subaddresses from a counter shared by all processes. Counters are
+    claimed from the DB in blocks of block_size and each one is mapped through
+    a keyed permutation of the subaddress space, so distinct counters give
+    distinct subaddresses that cannot be guessed from each other, without a
+    lookup per subaddress.
+    """
+
+    def __init__(
+        self, key: bytes, block_size: int, claim: Callable[[int], int]
+    ) -> None:
+        self.key = key
+        self.block_size = block_size
+        self.claim = claim
+        self._lock = threading.Lock()
+        self._next = 0
+        self._end = 0
+
+    def allocate(self) -> str:
+        while True:
+            subaddress = self._permute(self._next_counter())
+            # all zeros means no subaddress on chain
+            if subaddress:
+                return subaddress.to_bytes(identifier.DIEM_SUBADDRESS_SIZE, "big").hex()
+
+    def reset(self) -> None:
+        """Drops the unused counters of the claimed block"""
+        with self._lock:
+            self._next = self._end = 0
+
+    def _next_counter(self) -> int:
+        with self._lock:
+            if self._next == self._end:
+                self._next = self.claim(self.block_size)
+                self._end = self._next + self.block_size
+            counter = self._next
+            self._next += 1
+            return counter
+
+    def _permute(self, counter: int) -> int:
+        # Feistel network, a bijection whatever the round function
+        left, right = counter >> _HALF_BITS, counter & _HALF_MASK
+        for i in range(_ROUNDS):
+            left, right = right, left ^ self._round(i, right)
+        return (left << _HALF_BITS) | right
+
+    def _round(self, i: int, half: int) -> int:
+        message = bytes([i]) + half.to_bytes(_HALF_BITS // 8, "big")
+        digest = hmac.new(self.key, message, hashlib.sha256).digest()
+        return int.from_bytes(digest[: _HALF_BITS // 8], "big")
@@ -2,23 +2,27 @@ import logging
 import os
 
 from diem import jsonrpc, diem_types
-from sqlalchemy import desc
-from sqlalchemy_paginator import Paginator
-from wallet.services import account as account_service, INVENTORY_ACCOUNT_NAME
+from wallet.services import INVENTORY_ACCOUNT_NAME
 from wallet.services.account import generate_new_subaddress
 from wallet.storage import (
     get_transaction_by_blockchain_version,
+    get_known_blockchain_versions,
+    get_highest_blockchain_version,
+    get_total_currency_balance,
+    get_sync_checkpoint,
+    set_sync_checkpoint,
     add_transaction,
     TransactionStatus,
     TransactionType,
-    delete_transaction_by_id,
+    delete_redundant_transactions,
+    get_account_id_from_subaddr,
+    get_account_ids_from_subaddrs,
     Account,
-    Transaction,
-    SubAddress,
 )
 
 CURRENCY = "XUS"
-PAGE_SIZE = 10
+# events fetched per get_events call, the JSON-RPC server caps it at 1000
+EVENTS_PAGE_SIZE = 500
 
 VASP_ADDRESS = os.getenv("VASP_ADDR")
 JSON_RPC_URL = os.getenv("JSON_RPC_URL")
@@ -27,26 +31,37 @@ logger = logging.getLogger("sync-db")
 
 
 def sync_db():
+    """
+    Reconciles the DB with the chain when their balances differ. The sync
+    starts from the checkpoint left by the last sync that ended with equal
+    balances, and from the first event only when that does not reconcile them.
+    """
     client = jsonrpc.Client(JSON_RPC_URL)
     onchain_account = client.get_account(VASP_ADDRESS)
 
-    transactions_in_db = Transaction.query.filter_by(type=TransactionType.EXTERNAL)
-    count = transactions_in_db.count()
-
-    if count > 0:
-        up_to_version = (
-            transactions_in_db.order_by(desc(Transaction.blockchain_version))
-            .first()
-            .blockchain_version
-        )
-    else:
+    up_to_version = get_highest_blockchain_version(TransactionType.EXTERNAL)
+    if up_to_version is None:
         metadata = client.get_metadata()
         up_to_version = metadata.version
 
-    if sync_required(onchain_account, up_to_version):
-        sync(client, onchain_account, up_to_version)
-    else:
+    if not sync_required(onchain_account, up_to_version):
         logger.info("balances equal, no synchronization required")
+        return
+
+    checkpoint = get_sync_checkpoint()
+    sequences = sync(client, onchain_account, up_to_version, checkpoint)
+
+    if checkpoint and sync_required(onchain_account, up_to_version):
+        logger.info("balances differ after sync from checkpoint, syncing all events")
+        sequences = sync(client, onchain_account, up_to_version, {})
+
+    if not sync_required(onchain_account, up_to_version):
+        set_sync_checkpoint(
+            {
+                events_key: (sequence, up_to_version)
+                for events_key, sequence in sequences.items()
+            }
+        )
 
 
 def sync_required(onchain_account, up_to_version):
@@ -65,66 +80,100 @@ def get_onchain_balance(account):
 
 
 def calculate_lrw_balance(up_to_version):
-    db_balance = 0
-    query = Account.query
-    paginator = Paginator(query, PAGE_SIZE)
+    db_balance = get_total_currency_balance(CURRENCY, up_to_version)
+    logger.info(f"LRW balance {db_balance} up to version {up_to_version}")
 
-    for page in paginator:
-        accounts = page.object_list
+    return db_balance
 
-        for account in accounts:
-            balance = account_service.get_account_balance_by_id(
-                account_id=account.id,
-                up_to_version=up_to_version,
-            ).total.get(CURRENCY)
 
-            logger.info(f"account name {account.name} balance {balance}")
-            db_balance += balance
+def sync(client, onchain_account, up_to_version, checkpoint):
+    """
+    Syncs the payments of both event keys from their checkpoint sequence, and
+    removes the DB transactions after the checkpoint version that were not
+    seen. Returns the sequence to resume each key from.
+    """
+    events_keys = [onchain_account.received_events_key, onchain_account.sent_events_key]
+    from_version = None
+    starts = {events_key: 0 for events_key in events_keys}
+    if all(events_key in checkpoint for events_key in events_keys):
+        from_version = min(checkpoint[events_key][1] for events_key in events_keys)
+        starts = {events_key: checkpoint[events_key][0] for events_key in events_keys}
+        logger.info(f"syncing from checkpoint {checkpoint}")
 
-    return db_balance
+    processed_transactions = set()
+    sequences = {}
+    for events_key in events_keys:
+        processed, sequences[events_key] = sync_transactions(
+            events_key, client, up_to_version, starts[events_key]
+        )
+        processed_transactions.update(processed)
 
+    remove_redundant(processed_transactions, from_version)
 
-def sync(client, onchain_account, up_to_version):
-    # sync incoming transaction
-    incoming_processed_transactions = sync_transactions(
-        onchain_account.received_events_key, client, up_to_version
-    )
-    # sync outgoing transaction
-    outgoing_processed_transactions = sync_transactions(
-        onchain_account.sent_events_key, client, up_to_version
-    )
-    processed_transactions = incoming_processed_transactions.union(
-        outgoing_processed_transactions
-    )
-    remove_redundant(processed_transactions)
+    return sequences
 
 
-def sync_transactions(events_key, client, up_to_version):
-    start = 0
+def sync_transactions(events_key, client, up_to_version, start=0):
+    """
+    Syncs the payments of the events from sequence start on. Events come in
+    pages and only the transactions missing from the DB are fetched, by
+    ranges of consecutive versions. Returns the versions seen and the
+    sequence of the first event after up_to_version.
+    """
     processed_transactions = set()
+    next_sequence = None
 
     while True:
         events = client.get_events(
-            event_stream_key=events_key, start=start, limit=PAGE_SIZE
+            event_stream_key=events_key, start=start, limit=EVENTS_PAGE_SIZE
+        )
+
+        versions = [event.transaction_version for event in events]
+        known_versions = get_known_blockchain_versions(versions)
+        missing_versions = sorted(
+            {v for v in versions if v <= up_to_version and v not in known_versions}
         )
+        transactions = get_transactions_by_version(client, missing_versions)
+        prefetch_subaddresses(transactions)
+        for transaction in transactions:
+            sync_transaction(transaction)
+        processed_transactions.update(versions)
 
-        if not events:
-            return processed_transactions
+        for index, version in enumerate(versions):
+            if next_sequence is None and version > up_to_version:
+                next_sequence = start + index
 
-        for event in events:
-            blockchain_version = event.transaction_version
+        start += len(events)
+        if len(events) < EVENTS_PAGE_SIZE:
+            break
 
-            transactions = client.get_transactions(blockchain_version, 1)
+    return processed_transactions, start if next_sequence is None else next_sequence
 
-            if transactions:
-                transaction = transactions[0]
 
-                if transaction and transaction.version <= up_to_version:
-                    sync_transaction(transaction)
+def prefetch_subaddresses(transactions):
+    """Caches the accounts of the transactions subaddresses with one query"""
+    subaddresses = set()
+    for transaction in transactions:
+        script = transaction.transaction.script
+        if script.type == "peer_to_peer_with_metadata" and script.metadata:
+            subaddresses.update(deserialize_metadata(script.metadata))
+    subaddresses.discard(None)
 
-                processed_transactions.add(transaction.version)
+    get_account_ids_from_subaddrs(subaddresses)
+
+
+def get_transactions_by_version(client, versions):
+    """Fetches the transactions of sorted versions, a call per consecutive run"""
+    transactions = []
+    run_start = 0
+    for index in range(1, len(versions) + 1):
+        if index == len(versions) or versions[index] != versions[index - 1] + 1:
+            transactions += client.get_transactions(
+                versions[run_start], index - run_start
+            )
+            run_start = index
 
-        start += PAGE_SIZE
+    return transactions
 
 
 def sync_transaction(transaction):
@@ -200,35 +249,19 @@ def deserialize_metadata(metadata):
     return receiver_sub_address, sender_sub_address
 
 
-def remove_redundant(processed_transactions):
-    query = Transaction.query
-    paginator = Paginator(query, PAGE_SIZE)
-
-    for page in paginator:
-        transactions = page.object_list
-
-        for transaction in transactions:
-            if (
-                transaction.type == TransactionType.EXTERNAL
-                and transaction.blockchain_version not in processed_transactions
-            ):
-                logger.info(
-                    f"transaction with blockchain version {transaction.blockchain_version} was not found in "
-                    f"blockchain while synchronization and therefore is been deleted "
-                )
-
-                delete_transaction_by_id(transaction.id)
+def remove_redundant(processed_transactions, from_version=None):
+    removed = delete_redundant_transactions(processed_transactions, from_version)
+    logger.info(
+        f"{removed} transactions were not found in blockchain while synchronization "
+        f"and therefore were deleted"
+    )
 
 
 def handle_outgoing_transaction(sender_sub_address):
     if sender_sub_address:
-        sender_sub_record = SubAddress.query.filter_by(
-            address=sender_sub_address
-        ).first()
+        source_id = get_account_id_from_subaddr(sender_sub_address)
 
-        if sender_sub_record:
-            source_id = sender_sub_record.account_id
-        else:
+        if source_id is None:
             source_id = Account.query.filter_by(name=INVENTORY_ACCOUNT_NAME).first().id
     else:
         source_id = Account.query.filter_by(name=INVENTORY_ACCOUNT_NAME).first().id
@@ -239,13 +272,9 @@ def handle_outgoing_transaction(sender_sub_address):
 
 def handle_incoming_transaction(receiver_sub_address):
     if receiver_sub_address:
-        sub_address_record = SubAddress.query.filter_by(
-            address=receiver_sub_address
-        ).first()
+        destination_id = get_account_id_from_subaddr(receiver_sub_address)
 
-        if sub_address_record:
-            destination_id = sub_address_record.account_id
-        else:
+        if destination_id is None:
             destination_id = (
                 Account.query.filter_by(name=INVENTORY_ACCOUNT_NAME).first().id
             )
@@ -1,10 +1,13 @@
 # Copyright (c) The Diem Core Contributors
 # SPDX-License-Identifier: Apache-2.0
 
-from typing import Optional
+from typing import Dict, Optional
 
-from diem import diem_types
+from diem import diem_types, utils
+from diem.jsonrpc import constants
 from diem_utils.types.currencies import DiemCurrency
+from prometheus_client import Counter, Gauge
+from wallet.config import CONFIRMATION_PAGE_SIZE
 from wallet.services import (
     account as account_service,
     kyc,
@@ -24,13 +27,15 @@ from ..storage import (
     get_total_currency_debits,
     get_transaction_status,
     get_transaction_by_reference_id,
+    get_submitted_transactions,
+    has_submitted_transactions_after,
+    resolve_submitted_transactions,
 )
 from ..storage import get_account_id_from_subaddr, get_account
 from ..types import (
     TransactionDirection,
     TransactionType,
     TransactionStatus,
-    BalanceError,
     Balance,
 )
 
@@ -38,6 +43,15 @@ import context, logging
 
 logger = logging.getLogger(name="wallet-service:transaction")
 
+SUBMITTED_TRANSACTIONS = Gauge(
+    "lrw_submitted_transactions", "On-chain transactions waiting for confirmation"
+)
+CONFIRMED_TRANSACTIONS = Counter(
+    "lrw_confirmed_transactions",
+    "Submitted on-chain transactions resolved",
+    ["result"],
+)
+
 
 class RiskCheckError(Exception):
     pass
@@ -120,6 +134,7 @@ def process_incoming_transaction(
                 sequence=sequence,
                 blockchain_tx_version=blockchain_version,
             )
+            _notify_covers(cover_tx_id=transaction.id)
 
             return
 
@@ -165,6 +180,13 @@ def process_incoming_transaction(
     log_str = "Settled On Chain"
     add_transaction_log(tx.id, log_str)
     log_execution(f"Processed incoming transaction, saving internally as txn {tx.id}")
+    _notify_covers(cover_tx_version=blockchain_version)
+
+
+def _notify_covers(**waiting_for) -> None:
+    from .inventory import advance_covers_waiting_for
+
+    advance_covers_waiting_for(**waiting_for)
 
 
 def send_transaction(
@@ -193,12 +215,8 @@ def send_transaction(
             sender_id=sender_id, destination_address=destination_address
         )
 
-    if not validate_balance(sender_id, amount, currency):
-        raise BalanceError(
-            f"Balance {account_service.get_account_balance_by_id(account_id=sender_id).total[currency]} "
-            f"is less than amount needed {amount}"
-        )
-
+    # every path reserves the balance as it writes the debit, raising
+    # BalanceError when it is insufficient
     if account_service.is_in_wallet(destination_subaddress, destination_address):
         return _send_transaction_internal(
             sender_id=sender_id,
@@ -281,12 +299,29 @@ def update_transaction(
     status: Optional[TransactionStatus] = None,
     sequence: Optional[int] = None,
     blockchain_tx_version: Optional[int] = None,
+    blockchain_hash: Optional[str] = None,
+    expiration_timestamp_secs: Optional[int] = None,
 ) -> None:
     storage.update_transaction(
         transaction_id=transaction_id,
         sequence=sequence,
         status=status,
         blockchain_version=blockchain_tx_version,
+        blockchain_hash=blockchain_hash,
+        expiration_timestamp_secs=expiration_timestamp_secs,
+    )
+
+
+def set_transaction_submitted(
+    transaction_id: int, signed_txn: diem_types.SignedTransaction
+) -> None:
+    """Leaves the transaction PENDING until confirm_submitted_transactions"""
+    update_transaction(
+        transaction_id=transaction_id,
+        status=TransactionStatus.PENDING,
+        sequence=int(signed_txn.raw_txn.sequence_number),
+        blockchain_hash=utils.transaction_hash(signed_txn),
+        expiration_timestamp_secs=int(signed_txn.raw_txn.expiration_timestamp_secs),
     )
 
 
@@ -327,33 +362,32 @@ def internal_transaction(
 
     log_execution("Enter internal_transaction")
 
-    if not validate_balance(sender_id, amount, currency):
-        raise BalanceError(
-            f"Balance {account_service.get_account_balance_by_id(account_id=sender_id).total[currency]} "
-            f"is less than amount needed {amount}"
-        )
-
-    sender_subaddress = account_service.generate_new_subaddress(sender_id)
-    receiver_subaddress = account_service.generate_new_subaddress(receiver_id)
+    sender_subaddress = account_service.get_internal_subaddress(sender_id)
+    receiver_subaddress = account_service.get_internal_subaddress(receiver_id)
     internal_vasp_address = context.get().config.vasp_address
 
-    transaction = add_transaction(
-        amount=amount,
-        currency=currency,
-        payment_type=payment_type,
-        status=TransactionStatus.COMPLETED,
-        source_id=sender_id,
-        source_address=internal_vasp_address,
-        source_subaddress=sender_subaddress,
-        destination_id=receiver_id,
-        destination_address=internal_vasp_address,
-        destination_subaddress=receiver_subaddress,
-    )
+    with storage.unit_of_work():
+        # held until the unit of work commits the debit
+        account_service.reserve_balance(sender_id, amount, currency)
+
+        transaction = add_transaction(
+            amount=amount,
+            currency=currency,
+            payment_type=payment_type,
+            status=TransactionStatus.COMPLETED,
+            source_id=sender_id,
+            source_address=internal_vasp_address,
+            source_subaddress=sender_subaddress,
+            destination_id=receiver_id,
+            destination_address=internal_vasp_address,
+            destination_subaddress=receiver_subaddress,
+        )
+
+        log_execution(
+            f"Transfer from {sender_id} to {receiver_id} started with transaction id {transaction.id}"
+        )
+        add_transaction_log(transaction.id, "Transfer completed")
 
-    log_execution(
-        f"Transfer from {sender_id} to {receiver_id} started with transaction id {transaction.id}"
-    )
-    add_transaction_log(transaction.id, "Transfer completed")
     return transaction
 
 
@@ -369,27 +403,25 @@ def external_transaction(
         f"external_transaction {sender_id} to receiver {receiver_address}, "
         f"receiver subaddress {receiver_subaddress}, amount {amount}"
     )
-    if not validate_balance(sender_id, amount, currency):
-        raise BalanceError(
-            f"Balance {account_service.get_account_balance_by_id(account_id=sender_id).total[currency]} "
-            f"is less than amount needed {amount}"
-        )
-
     sender_onchain_address = context.get().config.vasp_address
-    sender_subaddress = account_service.generate_new_subaddress(account_id=sender_id)
 
-    transaction = add_transaction(
-        amount=amount,
-        currency=currency,
-        payment_type=payment_type,
-        status=TransactionStatus.PENDING,
-        source_id=sender_id,
-        source_address=sender_onchain_address,
-        source_subaddress=sender_subaddress,
-        destination_id=None,
-        destination_address=receiver_address,
-        destination_subaddress=receiver_subaddress,
-    )
+    with storage.unit_of_work():
+        # held until the unit of work commits the debit
+        account_service.reserve_balance(sender_id, amount, currency)
+        sender_subaddress = account_service.generate_new_subaddress(sender_id)
+
+        transaction = add_transaction(
+            amount=amount,
+            currency=currency,
+            payment_type=payment_type,
+            status=TransactionStatus.PENDING,
+            source_id=sender_id,
+            source_address=sender_onchain_address,
+            source_subaddress=sender_subaddress,
+            destination_id=None,
+            destination_address=receiver_address,
+            destination_subaddress=receiver_subaddress,
+        )
 
     if services.run_bg_tasks():
         from ..background_tasks.background import async_external_transaction
@@ -402,12 +434,19 @@ def external_transaction(
 
 
 def submit_onchain(transaction_id: int) -> None:
+    """
+    Submits the transaction and returns, it stays PENDING until
+    confirm_submitted_transactions finds it on chain.
+    """
     transaction = get_transaction(transaction_id)
-    if transaction.status == TransactionStatus.PENDING:
+    if (
+        transaction.status == TransactionStatus.PENDING
+        and transaction.blockchain_hash is None
+    ):
         try:
             diem_currency = DiemCurrency[transaction.currency]
 
-            jsonrpc_txn = context.get().p2p_by_general(
+            signed_txn = context.get().submit_p2p_by_general(
                 currency=diem_currency.value,
                 amount=transaction.amount,
                 receiver_vasp_address=transaction.destination_address,
@@ -415,18 +454,8 @@ def submit_onchain(transaction_id: int) -> None:
                 sender_sub_address=transaction.source_subaddress,
             )
 
-            update_transaction(
-                transaction_id=transaction_id,
-                status=TransactionStatus.COMPLETED,
-                sequence=jsonrpc_txn.transaction.sequence_number,
-                blockchain_tx_version=jsonrpc_txn.version,
-            )
-            add_transaction_log(transaction_id, "On Chain Transfer Complete")
-            log_execution(
-                "On chain transfer complete "
-                f"txid: {transaction_id} "
-                f"v: {jsonrpc_txn.version} "
-            )
+            set_transaction_submitted(transaction_id, signed_txn)
+            add_transaction_log(transaction_id, "On Chain Transfer Submitted")
         except Exception:
             logger.exception(f"Error in _async_start_onchain_transfer")
             add_transaction_log(transaction_id, "On Chain Transfer Failed")
@@ -434,6 +463,73 @@ def submit_onchain(transaction_id: int) -> None:
             update_transaction(
                 transaction_id=transaction_id, status=TransactionStatus.CANCELED
             )
+            _notify_covers(cover_tx_id=transaction_id)
+
+
+def confirm_submitted_transactions() -> int:
+    """
+    Resolves every submitted transaction at once: the VASP account
+    transactions covering their sequence numbers are read in ranged calls,
+    then executed transactions are completed and failed, replaced or expired
+    ones are canceled in a single commit. Returns how many were resolved.
+    """
+    submitted = get_submitted_transactions()
+    SUBMITTED_TRANSACTIONS.set(len(submitted))
+    if not submitted:
+        return 0
+
+    ctx = context.get()
+    client = ctx.jsonrpc_client
+    executed = {}
+    start = submitted[0].sequence
+    stop = submitted[-1].sequence + 1
+    while start < stop:
+        limit = min(CONFIRMATION_PAGE_SIZE, stop - start)
+        page = client.get_account_transactions(ctx.config.vasp_address, start, limit)
+        for onchain_txn in page:
+            executed[onchain_txn.transaction.sequence_number] = onchain_txn
+        if len(page) < limit:
+            # later sequence numbers are not executed yet either
+            break
+        start += limit
+    state = client.get_last_known_state()
+    ledger_secs = state.timestamp_usecs // 1_000_000 if state else 0
+
+    versions: Dict[int, Optional[int]] = {}
+    expired = None
+    for txn in submitted:
+        onchain_txn = executed.get(txn.sequence)
+        if onchain_txn is not None:
+            succeeded = (
+                onchain_txn.hash == txn.blockchain_hash
+                and onchain_txn.vm_status.type == constants.VM_STATUS_EXECUTED
+            )
+            versions[txn.id] = onchain_txn.version if succeeded else None
+        elif txn.expiration_timestamp_secs <= ledger_secs:
+            versions[txn.id] = None
+            expired = txn.sequence
+    if not versions:
+        return 0
+
+    resolved = resolve_submitted_transactions(versions)
+    if expired is not None and not has_submitted_transactions_after(expired):
+        # their sequence numbers are free again, the allocator is shared by
+        # the processes signing for the account (wallet.config.create_context)
+        # so all of them allocate from chain next. While later transactions
+        # are pending they keep their numbers, and resync once they expire
+        ctx.sequence_allocator.resync()
+    for transaction_id in resolved:
+        version = versions[transaction_id]
+        if version is None:
+            CONFIRMED_TRANSACTIONS.labels(result="canceled").inc()
+            log_execution(f"On Chain Transfer Failed txid: {transaction_id}")
+        else:
+            CONFIRMED_TRANSACTIONS.labels(result="completed").inc()
+            log_execution(
+                f"On chain transfer complete txid: {transaction_id} v: {version}"
+            )
+        _notify_covers(cover_tx_id=transaction_id)
+    return len(resolved)
 
 
 def get_total_balance() -> Balance:
@@ -5,12 +5,21 @@ import hashlib
 import os
 from enum import Enum
 from time import time
-from typing import Optional, List
+from typing import NamedTuple, Optional, List
 from uuid import uuid4
 
+from sqlalchemy.orm import make_transient_to_detached
+
 from diem_utils.types.currencies import FiatCurrency
 from wallet import storage
-from wallet.config import ADMIN_LOGIN_ENABLED
+from wallet.cache import create_cache
+from wallet.config import (
+    ADMIN_LOGIN_ENABLED,
+    TOKEN_CACHE_BACKEND,
+    TOKEN_CACHE_TTL_S,
+    TOKEN_MODE,
+)
+from wallet.services import signed_token
 from wallet.storage import (
     add_user,
     RegistrationStatus,
@@ -21,12 +30,28 @@ from wallet.storage import (
     update_token,
     create_token,
     PaymentMethod,
+    db_session,
 )
 from wallet.types import LoginError, UsernameExistsError
 
 TOKEN_VALID_TIME: int = 600
 
 
+class TokenSession(NamedTuple):
+    user_id: int
+    expiration_time: float
+    is_admin: bool
+    is_blocked: bool
+
+
+if TOKEN_MODE == "db" and TOKEN_CACHE_BACKEND != "redis":
+    # a logout or a blocked user would only be seen by the process serving it
+    raise ValueError("Token sessions need the shared TOKEN_CACHE_BACKEND redis")
+
+# token id -> TokenSession, so that authenticating a request needs no queries
+token_cache = create_cache("token", TOKEN_CACHE_BACKEND, None, TOKEN_CACHE_TTL_S)
+
+
 class UsersFilter(Enum):
     All = (0,)
     Admins = (1,)
@@ -142,6 +167,9 @@ def create_password_reset_token(user: User) -> str:
 
 def add_token(user_id: int) -> int:
     expiration_time = time() + TOKEN_VALID_TIME
+    if TOKEN_MODE == "signed":
+        is_admin = get_user(user_id).is_admin
+        return signed_token.issue_token(user_id, is_admin, expiration_time)
     token_id = create_token(user_id=user_id, expiration_time=expiration_time)
     return token_id
 
@@ -150,10 +178,10 @@ def is_valid_token(token_id: str) -> bool:
     """
     Token validity needs to be checked every time and session should be extended with every service call.
     """
-    token = get_token(token_id)
-    if token is None:
+    session = _get_token_session(token_id)
+    if session is None or session.is_blocked:
         return False
-    return time() < token.expiration_time
+    return time() < session.expiration_time
 
 
 def get_user_by_reset_token(reset_token: str) -> User:
@@ -161,20 +189,89 @@ def get_user_by_reset_token(reset_token: str) -> User:
 
 
 def get_user_by_token(token_id: str) -> User:
-    token = get_token(token_id)
-    return get_user(token.user_id)
+    session = _get_token_session(token_id)
+    if session is None:
+        raise KeyError(token_id)
+    # attach the user without loading it, its columns load on first access.
+    # The admin flag of signed tokens may be outdated, it is loaded from the row
+    if TOKEN_MODE == "signed":
+        user = User(id=session.user_id)
+    else:
+        user = User(id=session.user_id, is_admin=session.is_admin)
+    make_transient_to_detached(user)
+    return db_session.merge(user, load=False)
 
 
 def revoke_token(token_id: str) -> None:
+    if TOKEN_MODE == "signed":
+        claims = signed_token.verify_token(token_id)
+        if claims is not None:
+            signed_token.revoke_token(claims)
+        return
     storage.delete_token(token_id=token_id)
+    token_cache.delete(token_id)
 
 
-def extend_token_expiration(token_id) -> None:
+def extend_token_expiration(token_id) -> str:
+    """
+    Returns the token to use from now on, signed tokens can't change so a
+    new one valid for TOKEN_VALID_TIME is issued in their place.
+    """
+    if TOKEN_MODE == "signed":
+        claims = signed_token.verify_token(token_id)
+        if claims is None:
+            raise KeyError(token_id)
+        token = signed_token.issue_token(
+            claims.user_id, claims.is_admin, time() + TOKEN_VALID_TIME
+        )
+        # the replaced token must not be refreshed again
+        signed_token.revoke_token(claims)
+        return token
     token = get_token(token_id)
     if token is None:
         raise KeyError(token_id)
     new_expiration_time = token.expiration_time + TOKEN_VALID_TIME
     update_token(token_id=token_id, expiration_time=new_expiration_time)
+    token_cache.delete(token_id)
+    return token_id
+
+
+def delete_user_tokens(user_id: int) -> None:
+    if TOKEN_MODE == "signed":
+        signed_token.revoke_user_tokens(user_id, TOKEN_VALID_TIME)
+        return
+    token_ids = storage.get_user_token_ids(user_id)
+    storage.delete_user_tokens(user_id)
+    for token_id in token_ids:
+        token_cache.delete(token_id)
+
+
+def _get_token_session(token_id: str) -> Optional[TokenSession]:
+    if TOKEN_MODE == "signed":
+        claims = signed_token.verify_token(token_id)
+        if claims is None:
+            return None
+        return TokenSession(
+            user_id=claims.user_id,
+            expiration_time=claims.expiration_time,
+            is_admin=claims.is_admin,
+            is_blocked=False,
+        )
+
+    session = token_cache.get(token_id)
+    if session is None:
+        token = get_token(token_id)
+        if token is None:
+            return None
+        user = get_user(token.user_id)
+        session = TokenSession(
+            user_id=user.id,
+            expiration_time=token.expiration_time,
+            is_admin=user.is_admin,
+            is_blocked=user.is_blocked,
+        )
+        token_cache.set(token_id, session)
+    return session
 
 
 def _generate_password_hash_and_salt(
@@ -211,5 +308,5 @@ def get_user_count():
 
 
 def block_user(user_id: int):
-    storage.delete_user_tokens(user_id)
+    delete_user_tokens(user_id)
     storage.block_user(user_id)
@@ -24,9 +24,14 @@ db_session = scoped_session(
 Base = declarative_base(metadata=metadata)
 Base.query = db_session.query_property()
 
+from .unit_of_work import *
 from .user import *
 from .account import *
 from .order import *
 from .token import *
 from .transaction import *
 from .logs import *
+from .balance import *
+from .pubsub import *
+from .notify import *
+from .sync import *
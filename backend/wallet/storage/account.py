@@ -3,10 +3,54 @@
 # Copyright (c) The Diem Core Contributors
 # SPDX-License-Identifier: Apache-2.0
 
-from typing import Optional
+from typing import Dict, Iterable, Optional
 
-from . import db_session, get_user
-from .models import Account, SubAddress
+from prometheus_client import Gauge
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+
+from . import db_session, engine, get_user
+from .models import Account, SubAddress, SubAddressCounter
+from .unit_of_work import commit, on_commit
+from ..cache import create_cache
+from ..config import (
+    SUBADDRESS_CACHE_BACKEND,
+    SUBADDRESS_CACHE_SIZE,
+    SUBADDRESS_CACHE_TTL_S,
+)
+
+# subaddress -> account id, entries are added once their row is committed and
+# stay valid since a subaddress never moves to another account
+subaddress_cache = create_cache(
+    "subaddress",
+    SUBADDRESS_CACHE_BACKEND,
+    SUBADDRESS_CACHE_SIZE,
+    SUBADDRESS_CACHE_TTL_S,
+)
+
+# account id -> internal subaddress, set once per account
+internal_subaddress_cache = create_cache(
+    "internal_subaddress",
+    SUBADDRESS_CACHE_BACKEND,
+    SUBADDRESS_CACHE_SIZE,
+    SUBADDRESS_CACHE_TTL_S,
+)
+
+SUBADDRESS_CACHE_LOOKUPS = Gauge(
+    "lrw_subaddress_cache_lookups",
+    "Subaddress to account lookups by cache result since start",
+    ["result"],
+)
+SUBADDRESS_CACHE_LOOKUPS.labels("hit").set_function(lambda: subaddress_cache.hits)
+SUBADDRESS_CACHE_LOOKUPS.labels("miss").set_function(lambda: subaddress_cache.misses)
+SUBADDRESS_CACHE_HIT_RATIO = Gauge(
+    "lrw_subaddress_cache_hit_ratio",
+    "Share of subaddress to account lookups answered by the cache",
+)
+SUBADDRESS_CACHE_HIT_RATIO.set_function(
+    lambda: subaddress_cache.hits
+    / max(1, subaddress_cache.hits + subaddress_cache.misses)
+)
 
 
 def create_account(account_name: str, user_id: Optional[int] = None) -> Account:
@@ -18,7 +62,7 @@ def create_account(account_name: str, user_id: Optional[int] = None) -> Account:
     else:
         db_session.add(account)
 
-    db_session.commit()
+    commit()
     return account
 
 
@@ -33,17 +77,109 @@ def get_account(
 
 
 def get_account_id_from_subaddr(subaddr: str) -> Optional[int]:
-    subaddr_record = SubAddress.query.filter_by(address=subaddr).first()
-    return subaddr_record.account_id if subaddr_record else None
+    account_id = subaddress_cache.get(subaddr)
+    if account_id is None:
+        subaddr_record = SubAddress.query.filter_by(address=subaddr).first()
+        if subaddr_record is None:
+            return None
+        account_id = subaddr_record.account_id
+        subaddress_cache.set(subaddr, account_id)
+    return account_id
+
+
+def get_account_ids_from_subaddrs(subaddrs: Iterable[str]) -> Dict[str, int]:
+    """
+    Returns the account id of each of the subaddresses found, those missing
+    from the cache are looked up with a single query
+    """
+    account_ids = {}
+    missing = []
+    for subaddr in set(subaddrs):
+        account_id = subaddress_cache.get(subaddr)
+        if account_id is None:
+            missing.append(subaddr)
+        else:
+            account_ids[subaddr] = account_id
+
+    if missing:
+        for subaddr, account_id in SubAddress.query.with_entities(
+            SubAddress.address, SubAddress.account_id
+        ).filter(SubAddress.address.in_(missing)):
+            subaddress_cache.set(subaddr, account_id)
+            account_ids[subaddr] = account_id
+
+    return account_ids
+
+
+def cache_subaddresses(account_ids: Dict[str, int]) -> None:
+    """Caches subaddress -> account id of committed subaddress rows"""
+    for subaddr, account_id in account_ids.items():
+        subaddress_cache.set(subaddr, account_id)
 
 
 def add_subaddress(account_id: int, subaddr: str) -> str:
-    account = Account.query.get(account_id)
-    account.subaddresses.append(SubAddress(address=subaddr))
-    db_session.add(account)
-    db_session.commit()
+    db_session.add(SubAddress(address=subaddr, account_id=account_id))
+    commit()
+    on_commit(lambda: subaddress_cache.set(subaddr, account_id))
     return subaddr
 
 
+def get_internal_subaddress(account_id: int) -> Optional[str]:
+    subaddr = internal_subaddress_cache.get(account_id)
+    if subaddr is None:
+        subaddr = (
+            Account.query.with_entities(Account.internal_subaddress)
+            .filter(Account.id == account_id)
+            .scalar()
+        )
+        if subaddr is not None:
+            on_commit(lambda: internal_subaddress_cache.set(account_id, subaddr))
+    return subaddr
+
+
+def set_internal_subaddress(account_id: int, subaddr: str) -> str:
+    """
+    Makes subaddr the internal subaddress of the account unless it has one
+    already, returns the one the account ends up with
+    """
+    db_session.add(SubAddress(address=subaddr, account_id=account_id))
+    Account.query.filter(
+        Account.id == account_id, Account.internal_subaddress.is_(None)
+    ).update({Account.internal_subaddress: subaddr}, synchronize_session=False)
+    commit()
+    on_commit(lambda: subaddress_cache.set(subaddr, account_id))
+
+    return get_internal_subaddress(account_id)
+
+
+def claim_subaddress_counters(count: int) -> int:
+    """
+    Reserves count consecutive subaddress counters and returns the first,
+    in a transaction of its own so the caller's is left alone
+    """
+    table = SubAddressCounter.__table__
+    while True:
+        try:
+            with engine.begin() as connection:
+                # the update locks the row until the read below
+                result = connection.execute(
+                    table.update()
+                    .where(table.c.id == 1)
+                    .values(next=table.c.next + count)
+                )
+                if result.rowcount == 0:
+                    connection.execute(table.insert().values(id=1, next=count))
+                    return 0
+                return (
+                    connection.execute(
+                        select([table.c.next]).where(table.c.id == 1)
+                    ).scalar()
+                    - count
+                )
+        except IntegrityError:
+            # another process inserted the row first
+            continue
+
+
 def is_subaddress_exists(subaddr: str) -> bool:
     return SubAddress.query.filter(SubAddress.address == subaddr).first()
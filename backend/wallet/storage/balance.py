@@ -0,0 +1,271 @@
+# pyre-ignore-all-errors
+
+# Copyright (c) The Diem Core Contributors
+# SPDX-License-Identifier: Apache-2.0
+
+from collections import defaultdict
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import and_, event, func
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import attributes
+
+from . import db_session
+from .models import AccountBalance, Transaction, TransactionLog
+from ..types import Balance, BalanceError, TransactionStatus
+from diem_utils.types.currencies import DiemCurrency
+
+# (account_id, currency) -> [total, frozen]
+BalanceDeltas = Dict[Tuple[int, str], List[int]]
+
+_LEDGER_FIELDS = ("source_id", "destination_id", "status", "currency", "amount")
+_DELETED_ENTRIES_KEY = "deleted_ledger_entries"
+
+
+def get_account_balance(account_id: int) -> Balance:
+    """Returns the materialized account balance"""
+    return _to_balance(
+        AccountBalance.query.with_entities(
+            AccountBalance.currency, AccountBalance.total, AccountBalance.frozen
+        ).filter(AccountBalance.account_id == account_id)
+    )
+
+
+def reserve_balance(account_id: int, amount: int, currency: DiemCurrency) -> Balance:
+    """
+    Check that the account can be debited by amount and keep its balance rows
+    locked (SELECT ... FOR UPDATE) until the caller commits the debit, so
+    concurrent sends from one account are serialized instead of double-spending.
+    Raises BalanceError when the balance is insufficient, the caller rolls
+    back to release the lock.
+    """
+    rows = (
+        AccountBalance.query.with_entities(
+            AccountBalance.currency, AccountBalance.total, AccountBalance.frozen
+        )
+        .filter(AccountBalance.account_id == account_id)
+        .with_for_update()
+        .all()
+    )
+    balance = _to_balance(rows)
+    total = balance.total[DiemCurrency(currency)]
+    if amount > total:
+        raise BalanceError(f"Balance {total} is less than amount needed {amount}")
+
+    return balance
+
+
+def get_all_account_balances() -> BalanceDeltas:
+    rows = AccountBalance.query.with_entities(
+        AccountBalance.account_id,
+        AccountBalance.currency,
+        AccountBalance.total,
+        AccountBalance.frozen,
+    ).all()
+    return {(r.account_id, r.currency): [r.total, r.frozen] for r in rows}
+
+
+def compute_ledger_balances(
+    account_id: Optional[int] = None, criterion=None
+) -> BalanceDeltas:
+    """
+    Recomputes balances from the transaction table with two aggregate queries,
+    over the transactions matching criterion when given
+    """
+    credits = Transaction.query.with_entities(
+        Transaction.destination_id,
+        Transaction.currency,
+        func.sum(Transaction.amount).label("amount"),
+    ).filter(
+        and_(
+            Transaction.destination_id.isnot(None),
+            Transaction.status == TransactionStatus.COMPLETED,
+        )
+    )
+    debits = Transaction.query.with_entities(
+        Transaction.source_id,
+        Transaction.currency,
+        Transaction.status,
+        func.sum(Transaction.amount).label("amount"),
+    ).filter(Transaction.source_id.isnot(None))
+
+    if account_id is not None:
+        credits = credits.filter(Transaction.destination_id == account_id)
+        debits = debits.filter(Transaction.source_id == account_id)
+    if criterion is not None:
+        credits = credits.filter(criterion)
+        debits = debits.filter(criterion)
+
+    balances = defaultdict(lambda: [0, 0])
+    for destination_id, currency, amount in credits.group_by(
+        Transaction.destination_id, Transaction.currency
+    ):
+        balances[(destination_id, currency)][0] += amount
+    for source_id, currency, status, amount in debits.group_by(
+        Transaction.source_id, Transaction.currency, Transaction.status
+    ):
+        _apply_debit(balances, source_id, currency, status, amount)
+
+    return dict(balances)
+
+
+def delete_ledger_transactions(criterion) -> int:
+    """
+    Bulk deletes the transactions matching criterion, with their logs, and
+    takes their entries off the materialized balances, which the flush hook
+    does not see for bulk deletes. Returns the number of transactions deleted,
+    the caller commits.
+    """
+    deltas = compute_ledger_balances(criterion=criterion)
+    ids = Transaction.query.with_entities(Transaction.id).filter(criterion)
+    TransactionLog.query.filter(TransactionLog.tx_id.in_(ids.subquery())).delete(
+        synchronize_session=False
+    )
+    deleted = Transaction.query.filter(criterion).delete(synchronize_session=False)
+    _apply_balance_deltas(
+        db_session.connection(),
+        {key: [-total, -frozen] for key, (total, frozen) in deltas.items()},
+    )
+    return deleted
+
+
+def repair_account_balance(account_id: int, currency: str) -> Tuple[int, int]:
+    """
+    Overwrites the materialized balance with the ledger one. The ledger is read
+    while the balance row is locked, so a delta committed meanwhile is either
+    already in the ledger read or applied after this commit, never lost.
+    Returns the (total, frozen) written.
+    """
+    # the row must exist to be locked
+    _add_to_balance(db_session.connection(), account_id, currency, 0, 0)
+    query = AccountBalance.query.filter_by(account_id=account_id, currency=currency)
+    query.with_for_update().one()
+
+    total, frozen = compute_ledger_balances(
+        account_id, Transaction.currency == currency
+    ).get((account_id, currency), [0, 0])
+    query.update(
+        {AccountBalance.total: total, AccountBalance.frozen: frozen},
+        synchronize_session=False,
+    )
+    db_session.commit()
+    return total, frozen
+
+
+def _to_balance(rows) -> Balance:
+    balance = Balance()
+    for currency, total, frozen in rows:
+        balance.total[DiemCurrency[currency]] = total
+        balance.frozen[DiemCurrency[currency]] = frozen
+    return balance
+
+
+def _apply_debit(balances, source_id, currency, status, amount, sign=1) -> None:
+    if status == TransactionStatus.PENDING:
+        balances[(source_id, currency)][1] += sign * amount
+    if status != TransactionStatus.CANCELED:
+        balances[(source_id, currency)][0] -= sign * amount
+
+
+def _apply_entry(balances: BalanceDeltas, entry: Optional[Dict], sign: int) -> None:
+    if entry is None or entry["amount"] is None or entry["currency"] is None:
+        return
+    # enum members and their raw column values must land on the same row
+    currency = getattr(entry["currency"], "value", entry["currency"])
+    if (
+        entry["destination_id"] is not None
+        and entry["status"] == TransactionStatus.COMPLETED
+    ):
+        balances[(entry["destination_id"], currency)][0] += sign * entry["amount"]
+    if entry["source_id"] is not None:
+        _apply_debit(
+            balances,
+            entry["source_id"],
+            currency,
+            entry["status"],
+            entry["amount"],
+            sign,
+        )
+
+
+def _current_entry(txn: Transaction) -> Dict:
+    return {field: getattr(txn, field) for field in _LEDGER_FIELDS}
+
+
+def _previous_entry(txn: Transaction) -> Dict:
+    entry = {}
+    for field in _LEDGER_FIELDS:
+        history = attributes.get_history(txn, field)
+        if history.deleted:
+            entry[field] = history.deleted[0]
+        elif history.unchanged:
+            entry[field] = history.unchanged[0]
+        else:
+            entry[field] = None
+    return entry
+
+
+def _transactions(objects) -> Iterator[Transaction]:
+    return (obj for obj in objects if isinstance(obj, Transaction))
+
+
+@event.listens_for(db_session, "before_flush")
+def _collect_deleted_ledger_entries(session, flush_context, instances) -> None:
+    # rows are gone by the time after_flush runs, read them while we still can
+    session.info[_DELETED_ENTRIES_KEY] = [
+        _previous_entry(txn) for txn in _transactions(session.deleted)
+    ]
+
+
+@event.listens_for(db_session, "after_flush")
+def _update_account_balances(session, flush_context) -> None:
+    deltas = defaultdict(lambda: [0, 0])
+
+    for txn in _transactions(session.new):
+        _apply_entry(deltas, _current_entry(txn), 1)
+    for txn in _transactions(session.dirty):
+        if session.is_modified(txn):
+            _apply_entry(deltas, _previous_entry(txn), -1)
+            _apply_entry(deltas, _current_entry(txn), 1)
+    for entry in session.info.pop(_DELETED_ENTRIES_KEY, []):
+        _apply_entry(deltas, entry, -1)
+
+    _apply_balance_deltas(session.connection(), deltas)
+
+
+def _apply_balance_deltas(connection, deltas: BalanceDeltas) -> None:
+    for (account_id, currency), (total, frozen) in deltas.items():
+        if total or frozen:
+            _add_to_balance(connection, account_id, currency, total, frozen)
+
+
+def _add_to_balance(connection, account_id, currency, total, frozen) -> None:
+    table = AccountBalance.__table__
+    if connection.dialect.name == "postgresql":
+        # concurrent first entries of an account would both miss the update
+        insert = postgresql.insert(table).values(
+            account_id=account_id, currency=currency, total=total, frozen=frozen
+        )
+        connection.execute(
+            insert.on_conflict_do_update(
+                index_elements=[table.c.account_id, table.c.currency],
+                set_={
+                    "total": table.c.total + insert.excluded.total,
+                    "frozen": table.c.frozen + insert.excluded.frozen,
+                },
+            )
+        )
+        return
+
+    # sqlite serializes writers, nothing runs between the update and the insert
+    result = connection.execute(
+        table.update()
+        .where(and_(table.c.account_id == account_id, table.c.currency == currency))
+        .values(total=table.c.total + total, frozen=table.c.frozen + frozen)
+    )
+    if result.rowcount == 0:
+        connection.execute(
+            table.insert().values(
+                account_id=account_id, currency=currency, total=total, frozen=frozen
+            )
+        )
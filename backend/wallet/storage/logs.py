@@ -3,18 +3,226 @@
 # Copyright (c) The Diem Core Contributors
 # SPDX-License-Identifier: Apache-2.0
 
+import atexit
+import logging
+import queue
+import threading
 from datetime import datetime
-from . import db_session
-from .models import ExecutionLog
+from time import monotonic
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from prometheus_client import Counter
+from sqlalchemy import tuple_
+
+from . import db_session, engine
+from .models import ExecutionLog, TransactionLog
+from .unit_of_work import commit, on_commit
+from ..config import (
+    LOG_WRITER_BATCH_SIZE,
+    LOG_WRITER_DROP_POLICY,
+    LOG_WRITER_FLUSH_INTERVAL_MS,
+    LOG_WRITER_QUEUE_SIZE,
+)
+
+logger = logging.getLogger(__name__)
+
+LOG_ENTRIES_WRITTEN = Counter(
+    "lrw_log_entries_written", "Log entries inserted by the log writer", ["table"]
+)
+LOG_ENTRIES_DROPPED = Counter(
+    "lrw_log_entries_dropped", "Log entries the log writer gave up on", ["reason"]
+)
+
+# (table, row values)
+LogEntry = Tuple[str, Dict]
+
+_MODELS = {
+    ExecutionLog.__tablename__: ExecutionLog,
+    TransactionLog.__tablename__: TransactionLog,
+}
+
+
+class LogWriter:
+    """
+    Buffers log rows in a bounded queue that a background thread drains,
+    inserting every flush_interval_ms or batch_size rows with one executemany
+    per table. When the queue is full, "drop" policy discards the new entry
+    while "block" waits up to one flush interval for room before dropping it.
+    A batch that fails is retried row by row, so only the failing rows are
+    dropped. Entries written in a unit of work are queued once it commits.
+    Until start() is called, entries are written inline through db_session.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = LOG_WRITER_BATCH_SIZE,
+        flush_interval_ms: int = LOG_WRITER_FLUSH_INTERVAL_MS,
+        queue_size: int = LOG_WRITER_QUEUE_SIZE,
+        drop_policy: str = LOG_WRITER_DROP_POLICY,
+    ) -> None:
+        if drop_policy not in ("drop", "block"):
+            raise ValueError(f"Unknown log writer drop policy {drop_policy}")
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self.drop_policy = drop_policy
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+        self._closed_at_exit = False
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="log-writer", daemon=True
+        )
+        self._thread.start()
+        if not self._closed_at_exit:
+            atexit.register(self.close)
+            self._closed_at_exit = True
+
+    def write(self, table: str, values: Dict) -> None:
+        if not self.running:
+            db_session.add(_MODELS[table](**values))
+            commit()
+            return
+
+        on_commit(lambda: self._enqueue(table, values))
+
+    def _enqueue(self, table: str, values: Dict) -> None:
+        try:
+            if self.drop_policy == "block":
+                self._queue.put((table, values), timeout=self.flush_interval)
+            else:
+                self._queue.put_nowait((table, values))
+        except queue.Full:
+            LOG_ENTRIES_DROPPED.labels(reason="queue_full").inc()
+
+    def flush(self) -> None:
+        """Blocks until every entry written so far has been inserted or dropped"""
+        if self.running:
+            self._queue.join()
+
+    def close(self) -> None:
+        """Stops the background thread after it inserted the queued entries"""
+        if not self.running:
+            return
+        self._stopped.set()
+        self._thread.join()
+        self._thread = None
+
+    def _run(self) -> None:
+        while not (self._stopped.is_set() and self._queue.empty()):
+            batch = self._next_batch()
+            if not batch:
+                continue
+            try:
+                self._insert(batch)
+            except Exception:
+                logger.exception(f"failed to insert {len(batch)} log entries")
+                LOG_ENTRIES_DROPPED.labels(reason="insert_failed").inc(len(batch))
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _next_batch(self) -> List[LogEntry]:
+        batch = []
+        deadline = monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            timeout = deadline - monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return batch
+
+    @staticmethod
+    def _insert(batch: List[LogEntry]) -> None:
+        rows_by_table = {}
+        for table, values in batch:
+            rows_by_table.setdefault(table, []).append(values)
+
+        try:
+            _insert_rows(rows_by_table)
+        except Exception:
+            # e.g. a transaction log of a transaction that was deleted, it
+            # fails the whole batch, retry the rows alone to drop only it
+            logger.warning(f"failed to insert {len(batch)} log entries, retrying")
+            for table, values in batch:
+                try:
+                    _insert_rows({table: [values]})
+                except Exception:
+                    logger.exception(f"dropping {table} entry {values}")
+                    LOG_ENTRIES_DROPPED.labels(reason="insert_failed").inc()
+
+
+def _insert_rows(rows_by_table: Dict[str, List[Dict]]) -> None:
+    with engine.begin() as connection:
+        for table, rows in rows_by_table.items():
+            connection.execute(_MODELS[table].__table__.insert(), rows)
+    for table, rows in rows_by_table.items():
+        LOG_ENTRIES_WRITTEN.labels(table=table).inc(len(rows))
+
+
+log_writer = LogWriter()
 
 
 # logs to both database and stdout
 def add_execution_log(message) -> None:
-    # get the previous frame in the stack
-    log = ExecutionLog(log=message, timestamp=datetime.utcnow())
-    db_session.add(log)
-    db_session.commit()
+    log_writer.write(
+        ExecutionLog.__tablename__, {"log": message, "timestamp": datetime.utcnow()}
+    )
+
+
+def get_execution_logs(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    after: Optional[Tuple[datetime, int]] = None,
+    limit: Optional[int] = None,
+    batch_size: int = 1000,
+) -> Iterator[ExecutionLog]:
+    """
+    Yields execution logs in (timestamp, id) order, fetching batch_size rows
+    at a time. start / end bound the timestamps, after is the (timestamp, id)
+    key of the last log already read.
+    """
+    query = ExecutionLog.query
+    if start:
+        query = query.filter(ExecutionLog.timestamp >= start)
+    if end:
+        query = query.filter(ExecutionLog.timestamp < end)
+    if after:
+        query = query.filter(
+            tuple_(ExecutionLog.timestamp, ExecutionLog.id) > tuple_(*after)
+        )
+    query = query.order_by(ExecutionLog.timestamp, ExecutionLog.id)
+    if limit:
+        query = query.limit(limit)
+    return query.yield_per(batch_size)
 
 
-def get_execution_logs():
-    return [log for log in ExecutionLog.query.all()]
+def delete_execution_logs(before: datetime, batch_size: int = 1000) -> int:
+    """Deletes logs older than before, batch_size rows per transaction"""
+    deleted = 0
+    while True:
+        ids = [
+            log_id
+            for log_id, in ExecutionLog.query.with_entities(ExecutionLog.id)
+            .filter(ExecutionLog.timestamp < before)
+            .order_by(ExecutionLog.timestamp)
+            .limit(batch_size)
+        ]
+        if not ids:
+            return deleted
+        ExecutionLog.query.filter(ExecutionLog.id.in_(ids)).delete(
+            synchronize_session=False
+        )
+        db_session.commit()
+        deleted += len(ids)
@@ -15,8 +15,9 @@ from sqlalchemy import (
     ForeignKey,
     BigInteger,
     Float,
+    Index,
 )
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, column_property
 from . import Base
 
 
@@ -59,6 +60,8 @@ class Account(Base):
     id = Column(Integer, primary_key=True, autoincrement=True)
     name = Column(String, nullable=False, unique=True)
     subaddresses = relationship("SubAddress", backref="account", lazy=True)
+    # subaddress of the account in internal transfers, allocated on first use
+    internal_subaddress = Column(String, nullable=True)
 
 
 class SubAddress(Base):
@@ -69,6 +72,13 @@ class SubAddress(Base):
     account_id = Column(Integer, ForeignKey("account.id"), nullable=False)
 
 
+# next counter the subaddress allocator derives subaddresses from, single row
+class SubAddressCounter(Base):
+    __tablename__ = "subaddress_counter"
+    id = Column(Integer, primary_key=True)
+    next = Column(BigInteger, nullable=False)
+
+
 class PaymentMethod(Base):
     __tablename__ = "paymentmethod"
 
@@ -84,18 +94,29 @@ class Transaction(Base):
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     type = Column(String, nullable=False)
-    amount = Column(BigInteger, nullable=False)
-    currency = Column(String, nullable=False)
-    status = Column(String, nullable=False, index=True)
-    source_id = Column(Integer, ForeignKey("account.id"), nullable=True)
+    # columns feeding AccountBalance keep their previous value on change,
+    # so the balance maintenance hook can reverse the old ledger entry
+    amount = column_property(Column(BigInteger, nullable=False), active_history=True)
+    currency = column_property(Column(String, nullable=False), active_history=True)
+    status = column_property(
+        Column(String, nullable=False, index=True), active_history=True
+    )
+    source_id = column_property(
+        Column(Integer, ForeignKey("account.id"), nullable=True), active_history=True
+    )
     source_address = Column(String, nullable=True)
     source_subaddress = Column(String, nullable=True)
-    destination_id = Column(Integer, ForeignKey("account.id"), nullable=True)
+    destination_id = column_property(
+        Column(Integer, ForeignKey("account.id"), nullable=True), active_history=True
+    )
     destination_address = Column(String, nullable=True)
     destination_subaddress = Column(String, nullable=True)
     created_timestamp = Column(DateTime, nullable=False)
     blockchain_version = Column(Integer, nullable=True)
     sequence = Column(Integer, nullable=True)
+    # a submitted transaction waiting for confirm_submitted_transactions
+    blockchain_hash = Column(String, nullable=True)
+    expiration_timestamp_secs = Column(BigInteger, nullable=True)
     logs = relationship("TransactionLog", backref="tx", lazy=True)
     source_account = relationship(
         "Account", backref="sent_transactions", foreign_keys=[source_id]
@@ -106,6 +127,30 @@ class Transaction(Base):
 
     reference_id = Column(String, nullable=True, unique=True, index=True)
     command_json = Column(String, nullable=True)
+    # lease of the off-chain scheduler processing the transaction, see
+    # claim_transactions
+    offchain_claimed_until = Column(DateTime, nullable=True)
+    # set on the transactions of a bulk payout, see send_payouts
+    payout_batch_id = Column(String, nullable=True, index=True)
+
+    # serve the account history pages (see get_account_transactions_page)
+    __table_args__ = (
+        Index("ix_transaction_source_id_created", "source_id", "created_timestamp"),
+        Index(
+            "ix_transaction_destination_id_created",
+            "destination_id",
+            "created_timestamp",
+        ),
+    )
+
+
+# Materialized per-account balance, maintained on every Transaction flush
+class AccountBalance(Base):
+    __tablename__ = "account_balance"
+    account_id = Column(Integer, ForeignKey("account.id"), primary_key=True)
+    currency = Column(String, primary_key=True)
+    total = Column(BigInteger, nullable=False, default=0)
+    frozen = Column(BigInteger, nullable=False, default=0)
 
 
 # Execution log for transaction
@@ -122,7 +167,7 @@ class ExecutionLog(Base):
     __tablename__ = "executionlog"
     id = Column(Integer, primary_key=True, autoincrement=True)
     log = Column(String, nullable=False)
-    timestamp = Column(DateTime, nullable=False)
+    timestamp = Column(DateTime, nullable=False, index=True)
 
 
 class Order(Base):
@@ -147,6 +192,14 @@ class Order(Base):
     charge_token = Column(String, nullable=True)
     order_type = Column(String, nullable=False)
     correlated_tx = Column(Integer, ForeignKey("transaction.id"), nullable=True)
+    # what a pending cover waits for, see services.inventory.advance_cover
+    trade_id = Column(String, nullable=True)
+    cover_deposit_address = Column(String, nullable=True)
+    cover_tx_id = Column(
+        Integer, ForeignKey("transaction.id"), nullable=True, index=True
+    )
+    cover_tx_version = Column(BigInteger, nullable=True, index=True)
+    cover_deadline = Column(DateTime, nullable=True)
 
 
 class Token(Base):
@@ -154,3 +207,35 @@ class Token(Base):
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid1()))
     user_id = Column(Integer, ForeignKey("user.id"), nullable=False)
     expiration_time = Column(Float, nullable=False)
+
+
+# next event sequence number the pubsub client fetches per event key
+class PubSubProgress(Base):
+    __tablename__ = "pubsub_progress"
+    event_key = Column(String, primary_key=True)
+    sequence = Column(BigInteger, nullable=False)
+
+
+# one row per event the pubsub client handed to the wallet
+class PubSubEvent(Base):
+    __tablename__ = "pubsub_event"
+    event_key = Column(String, primary_key=True)
+    sequence = Column(BigInteger, primary_key=True)
+    timestamp = Column(DateTime, nullable=False)
+
+
+# one row per event the wallet processed, so that an event sent again is skipped
+class ProcessedPubSubEvent(Base):
+    __tablename__ = "pubsub_processed_event"
+    event_key = Column(String, primary_key=True)
+    sequence = Column(BigInteger, primary_key=True)
+    timestamp = Column(DateTime, nullable=False)
+
+
+# sync_db reconciled every payment of the event key before sequence, up to
+# blockchain version
+class SyncCheckpoint(Base):
+    __tablename__ = "sync_checkpoint"
+    event_key = Column(String, primary_key=True)
+    sequence = Column(BigInteger, nullable=False)
+    version = Column(BigInteger, nullable=False)
@@ -0,0 +1,231 @@
+# pyre-ignore-all-errors
+
+# Copyright (c) The Diem Core Contributors
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+Wakes the background loops when the rows they process are written, instead
+of having them poll the database.
+
+Writers do not call anything: session hooks look at the flushed transactions
+and publish on commit to
+- OFFCHAIN_CHANNEL when a transaction enters an off-chain status
+- SYNC_CHANNEL when a transaction gets its blockchain version
+
+"postgres" notifications go through LISTEN/NOTIFY and are sent by the
+writing database transaction itself, "redis" ones through the wallet redis
+pub/sub. Both reach every process. "local" ones only wake the loops of the
+writing process, the others fall back to polling.
+"""
+
+import logging
+import select
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, Set
+
+import redis
+from sqlalchemy import event, text
+from sqlalchemy.orm import attributes
+
+from . import db_session, engine
+from .models import Transaction
+from ..config import (
+    DB_URL,
+    NOTIFY_BACKEND,
+    REDIS_DB,
+    REDIS_HOST,
+    REDIS_PASSWORD,
+    REDIS_PORT,
+)
+from ..types import TransactionStatus
+
+OFFCHAIN_CHANNEL = "lrw_offchain"
+SYNC_CHANNEL = "lrw_sync"
+CHANNELS = (OFFCHAIN_CHANNEL, SYNC_CHANNEL)
+
+OFFCHAIN_STATUSES = {
+    TransactionStatus.OFF_CHAIN_OUTBOUND,
+    TransactionStatus.OFF_CHAIN_INBOUND,
+    TransactionStatus.OFF_CHAIN_READY,
+}
+
+_CHANNELS_KEY = "lrw_notify_channels"
+_RECONNECT_DELAY_S = 1
+
+logger = logging.getLogger(__name__)
+
+
+class LocalNotifier:
+    """In-process notifications, loops of other processes are not woken"""
+
+    cross_process = False
+
+    def __init__(self) -> None:
+        self._events: Dict[str, threading.Event] = {}
+        self._lock = threading.Lock()
+
+    def publish(self, channels: Set[str]) -> None:
+        for channel in channels:
+            self._event(channel).set()
+
+    def wait(self, channel: str, timeout: float) -> bool:
+        """
+        Returns True when channel was notified since the last wait, or gets
+        notified within timeout seconds.
+        """
+        event = self._event(channel)
+        notified = event.wait(timeout)
+        event.clear()
+        return notified
+
+    def _event(self, channel: str) -> threading.Event:
+        with self._lock:
+            return self._events.setdefault(channel, threading.Event())
+
+
+class _ListeningNotifier(LocalNotifier, ABC):
+    """Relays notifications received by a listener thread to local loops"""
+
+    cross_process = True
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._started = False
+        self._start_lock = threading.Lock()
+
+    def wait(self, channel: str, timeout: float) -> bool:
+        with self._start_lock:
+            if not self._started:
+                self._started = True
+                threading.Thread(target=self._run, daemon=True).start()
+        return super().wait(channel, timeout)
+
+    def _run(self) -> None:
+        while True:
+            try:
+                self._listen()
+            except Exception:
+                logger.exception("listening for notifications failed, retrying")
+                # notifications may have been missed meanwhile
+                super().publish(set(CHANNELS))
+                time.sleep(_RECONNECT_DELAY_S)
+
+    @abstractmethod
+    def _listen(self) -> None:
+        """Publishes the notifications received until the connection fails"""
+
+
+class RedisNotifier(_ListeningNotifier):
+    def __init__(self, client: redis.Redis) -> None:
+        super().__init__()
+        self._client = client
+
+    def publish(self, channels: Set[str]) -> None:
+        for channel in channels:
+            try:
+                self._client.publish(channel, "")
+            except redis.RedisError:
+                logger.exception(f"publish {channel} failed, waking local loops only")
+                super().publish({channel})
+
+    def _listen(self) -> None:
+        pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+        try:
+            pubsub.subscribe(*CHANNELS)
+            for message in pubsub.listen():
+                super().publish({message["channel"].decode()})
+        finally:
+            pubsub.close()
+
+
+class PostgresNotifier(_ListeningNotifier):
+    """Notifications are sent by the writing database transaction itself"""
+
+    def publish(self, channels: Set[str]) -> None:
+        pass
+
+    def _listen(self) -> None:
+        raw_connection = engine.raw_connection()
+        # held for good, keep it out of the pool
+        raw_connection.detach()
+        connection = raw_connection.connection
+        try:
+            connection.autocommit = True
+            with connection.cursor() as cursor:
+                for channel in CHANNELS:
+                    cursor.execute(f"LISTEN {channel}")
+            while True:
+                select.select([connection], [], [])
+                connection.poll()
+                channels = set()
+                while connection.notifies:
+                    channels.add(connection.notifies.pop(0).channel)
+                super().publish(channels)
+        finally:
+            connection.close()
+
+
+def create_notifier(backend: str):
+    """Returns a notifier for backend "postgres", "redis" or "local\" """
+    if backend == "postgres":
+        return PostgresNotifier()
+    if backend == "redis":
+        client = redis.StrictRedis(
+            host=REDIS_HOST, port=REDIS_PORT, db=REDIS_DB, password=REDIS_PASSWORD
+        )
+        return RedisNotifier(client)
+    if backend == "local":
+        return LocalNotifier()
+
+    raise ValueError(f"Unknown notify backend {backend}")
+
+
+notifier = create_notifier(
+    NOTIFY_BACKEND or ("postgres" if DB_URL.startswith("postgres") else "local")
+)
+
+
+def wait_for_notification(channel: str, timeout: float) -> bool:
+    return notifier.wait(channel, timeout)
+
+
+def _changed_channels(txn: Transaction) -> Set[str]:
+    channels = set()
+    status = attributes.get_history(txn, "status")
+    if any(added in OFFCHAIN_STATUSES for added in status.added):
+        channels.add(OFFCHAIN_CHANNEL)
+    version = attributes.get_history(txn, "blockchain_version")
+    if any(added is not None for added in version.added):
+        channels.add(SYNC_CHANNEL)
+    return channels
+
+
+@event.listens_for(db_session, "after_flush")
+def _collect_channels(session, flush_context) -> None:
+    channels = set()
+    for obj in set(session.new) | set(session.dirty):
+        if isinstance(obj, Transaction):
+            channels |= _changed_channels(obj)
+    if not channels:
+        return
+
+    if isinstance(notifier, PostgresNotifier):
+        connection = session.connection()
+        for channel in channels:
+            connection.execute(text("SELECT pg_notify(:channel, '')"), channel=channel)
+    else:
+        session.info.setdefault(_CHANNELS_KEY, set()).update(channels)
+
+
+@event.listens_for(db_session, "after_commit")
+def _publish_channels(session) -> None:
+    channels = session.info.pop(_CHANNELS_KEY, None)
+    if channels:
+        notifier.publish(channels)
+
+
+@event.listens_for(db_session, "after_rollback")
+def _discard_channels(session) -> None:
+    session.info.pop(_CHANNELS_KEY, None)
@@ -3,10 +3,11 @@
 # Copyright (c) The Diem Core Contributors
 # SPDX-License-Identifier: Apache-2.0
 
-from typing import Optional, Union
+from typing import List, Optional, Union
 import uuid
 from datetime import datetime
 from . import db_session
+from .unit_of_work import commit
 from .models import User, Order
 from ..types import (
     Direction,
@@ -65,6 +66,11 @@ def update_order(
     charge_token: Optional[str] = None,
     payment_method: Optional[str] = None,
     correlated_tx: Optional[int] = None,
+    trade_id: Optional[str] = None,
+    cover_deposit_address: Optional[str] = None,
+    cover_tx_id: Optional[int] = None,
+    cover_tx_version: Optional[int] = None,
+    cover_deadline: Optional[datetime] = None,
 ):
     order = Order.query.get(str(order_id))
     values = locals()
@@ -77,4 +83,37 @@ def update_order(
 
     if changed:
         order.last_update = datetime.utcnow()
-        db_session.commit()
+        commit()
+
+
+def transition_order_cover(
+    order_id: OrderId, from_status: CoverStatus, to_status: CoverStatus, **values
+) -> bool:
+    """
+    Moves the order cover from from_status to to_status, setting values along.
+    Returns False when the cover was not in from_status anymore.
+    """
+    updated = Order.query.filter_by(id=str(order_id), cover_status=from_status).update(
+        dict(values, cover_status=to_status, last_update=datetime.utcnow()),
+        synchronize_session=False,
+    )
+    commit()
+    return updated == 1
+
+
+def get_pending_cover_orders(statuses: List[CoverStatus]) -> List[Order]:
+    return Order.query.filter(Order.cover_status.in_(statuses)).all()
+
+
+def get_cover_orders_waiting_for(
+    cover_tx_id: Optional[int] = None, cover_tx_version: Optional[int] = None
+) -> List[Order]:
+    if cover_tx_id is None and cover_tx_version is None:
+        return []
+
+    query = Order.query
+    if cover_tx_id is not None:
+        query = query.filter(Order.cover_tx_id == cover_tx_id)
+    if cover_tx_version is not None:
+        query = query.filter(Order.cover_tx_version == cover_tx_version)
+    return query.all()
@@ -0,0 +1,71 @@
+# pyre-ignore-all-errors
+
+# Copyright (c) The Diem Core Contributors
+# SPDX-License-Identifier: Apache-2.0
+
+from datetime import datetime
+from typing import Dict
+
+from . import db_session
+from .models import ProcessedPubSubEvent, PubSubEvent, PubSubProgress
+from .unit_of_work import commit
+
+
+def get_pubsub_progress() -> Dict[str, int]:
+    return {progress.event_key: progress.sequence for progress in PubSubProgress.query}
+
+
+def set_pubsub_progress(state: Dict[str, int]) -> None:
+    for event_key, sequence in state.items():
+        db_session.merge(PubSubProgress(event_key=event_key, sequence=sequence))
+    db_session.commit()
+
+
+def is_pubsub_event_recorded(event_key: str, sequence: int) -> bool:
+    if PubSubEvent.query.get((event_key, sequence)) is not None:
+        return True
+    progress = PubSubProgress.query.get(event_key)
+    return progress is not None and sequence < progress.sequence
+
+
+def record_pubsub_event(event_key: str, sequence: int) -> None:
+    """Records the event and moves the key cursor past it in one transaction"""
+    db_session.add(
+        PubSubEvent(event_key=event_key, sequence=sequence, timestamp=datetime.utcnow())
+    )
+    progress = PubSubProgress.query.get(event_key)
+    if progress is None:
+        db_session.add(PubSubProgress(event_key=event_key, sequence=sequence + 1))
+    else:
+        progress.sequence = max(progress.sequence, sequence + 1)
+    db_session.commit()
+
+
+def is_pubsub_event_processed(event_key: str, sequence: int) -> bool:
+    return ProcessedPubSubEvent.query.get((event_key, sequence)) is not None
+
+
+def record_processed_pubsub_event(event_key: str, sequence: int) -> None:
+    """Records that the wallet processed the event, commit it with the processing"""
+    db_session.add(
+        ProcessedPubSubEvent(
+            event_key=event_key, sequence=sequence, timestamp=datetime.utcnow()
+        )
+    )
+    commit()
+
+
+def prune_pubsub_events(state: Dict[str, int], records_kept: int) -> int:
+    """
+    Deletes the sent and processed event records more than records_kept events
+    behind the key cursors of state, returns the number of records deleted.
+    Those events are behind the cursor and never sent again.
+    """
+    deleted = 0
+    for event_key, sequence in state.items():
+        for model in (PubSubEvent, ProcessedPubSubEvent):
+            deleted += model.query.filter(
+                model.event_key == event_key, model.sequence < sequence - records_kept
+            ).delete(synchronize_session=False)
+    db_session.commit()
+    return deleted
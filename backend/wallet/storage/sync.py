@@ -0,0 +1,25 @@
+# pyre-ignore-all-errors
+
+# Copyright (c) The Diem Core Contributors
+# SPDX-License-Identifier: Apache-2.0
+
+from typing import Dict, Tuple
+
+from . import db_session
+from .models import SyncCheckpoint
+
+
+def get_sync_checkpoint() -> Dict[str, Tuple[int, int]]:
+    """Returns the (sequence, version) checkpoint of every synced event key"""
+    return {
+        checkpoint.event_key: (checkpoint.sequence, checkpoint.version)
+        for checkpoint in SyncCheckpoint.query
+    }
+
+
+def set_sync_checkpoint(state: Dict[str, Tuple[int, int]]) -> None:
+    for event_key, (sequence, version) in state.items():
+        db_session.merge(
+            SyncCheckpoint(event_key=event_key, sequence=sequence, version=version)
+        )
+    db_session.commit()
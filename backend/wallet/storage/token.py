@@ -4,6 +4,7 @@
 # SPDX-License-Identifier: Apache-2.0
 
 from time import time
+from typing import List
 from uuid import uuid1
 
 from . import db_session
@@ -31,6 +32,13 @@ def delete_token(token_id) -> None:
         db_session.commit()
 
 
+def get_user_token_ids(user_id) -> List[str]:
+    return [
+        token_id
+        for token_id, in Token.query.with_entities(Token.id).filter_by(user_id=user_id)
+    ]
+
+
 def delete_user_tokens(user_id) -> None:
     Token.query.filter_by(user_id=user_id).delete()
     db_session.commit()
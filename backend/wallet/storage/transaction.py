@@ -4,15 +4,49 @@
 # SPDX-License-Identifier: Apache-2.0
 
 from datetime import datetime
-from typing import Optional, List, Callable
-
-from sqlalchemy import func, and_, or_
+from typing import Any, Dict, Iterable, Optional, List, Callable, Set, Tuple
+
+from sqlalchemy import (
+    BigInteger,
+    Column,
+    MetaData,
+    Numeric,
+    Table,
+    and_,
+    case,
+    cast,
+    exists,
+    func,
+    or_,
+    select,
+    tuple_,
+    union_all,
+)
 
 from . import db_session, get_user
-from .models import Transaction, TransactionLog
-from ..types import TransactionStatus, TransactionType
+from .account import cache_subaddresses
+from .balance import delete_ledger_transactions
+from .logs import log_writer
+from .models import SubAddress, Transaction, TransactionLog
+from .unit_of_work import commit, on_commit
+from ..types import (
+    TransactionDirection,
+    TransactionSortOption,
+    TransactionStatus,
+    TransactionType,
+)
 from diem_utils.types.currencies import DiemCurrency
 
+# staging table of delete_redundant_transactions, kept out of Base.metadata so
+# create_all does not create it
+_synced_versions = Table(
+    "synced_versions",
+    MetaData(),
+    Column("version", BigInteger, primary_key=True),
+    prefixes=["TEMPORARY"],
+)
+_SYNCED_VERSIONS_CHUNK = 10_000
+
 
 def lock_for_update(
     reference_id: str,
@@ -75,26 +109,36 @@ def update_transaction(
     status: Optional[TransactionStatus] = None,
     blockchain_version: Optional[int] = None,
     sequence: Optional[int] = None,
+    blockchain_hash: Optional[str] = None,
+    expiration_timestamp_secs: Optional[int] = None,
 ) -> None:
     tx = Transaction.query.get(transaction_id)
     if status:
         tx.status = status
     if blockchain_version:
         tx.blockchain_version = blockchain_version
-    if sequence:
+    if sequence is not None:
         tx.sequence = sequence
+    if blockchain_hash:
+        tx.blockchain_hash = blockchain_hash
+    if expiration_timestamp_secs:
+        tx.expiration_timestamp_secs = expiration_timestamp_secs
     commit_transaction(tx)
 
 
 def commit_transaction(txn: Transaction) -> Transaction:
     db_session.add(txn)
-    db_session.commit()
+    commit()
     return txn
 
 
 def delete_transaction_by_id(transaction_id: int) -> None:
     TransactionLog.query.filter_by(tx_id=transaction_id).delete()
-    Transaction.query.filter_by(id=transaction_id).delete()
+    # delete through the session (not a bulk delete) so the account balance
+    # maintenance hook sees the removed ledger entry
+    tx = Transaction.query.get(transaction_id)
+    if tx is not None:
+        db_session.delete(tx)
     db_session.commit()
 
 
@@ -110,6 +154,24 @@ def get_transaction_by_blockchain_version(blockchain_version: int) -> Transactio
     return Transaction.query.filter_by(blockchain_version=blockchain_version).first()
 
 
+def get_known_blockchain_versions(versions: Iterable[int]) -> Set[int]:
+    """Returns the versions, out of the given ones, of transactions in the DB"""
+    return {
+        version
+        for (version,) in Transaction.query.with_entities(
+            Transaction.blockchain_version
+        ).filter(Transaction.blockchain_version.in_(list(versions)))
+    }
+
+
+def get_highest_blockchain_version(payment_type: TransactionType) -> Optional[int]:
+    return (
+        Transaction.query.with_entities(func.max(Transaction.blockchain_version))
+        .filter(Transaction.type == payment_type)
+        .scalar()
+    )
+
+
 def get_transaction_by_details(
     source_address: str, source_subaddress: Optional[str], sequence: int
 ):
@@ -130,10 +192,10 @@ def get_transaction_status(transaction_id) -> TransactionStatus:
 
 
 def save_transaction_log(transaction_id, log) -> None:
-    tx = Transaction.query.get(transaction_id)
-    tx.logs.append(TransactionLog(log=log, timestamp=datetime.utcnow()))
-    db_session.add(tx)
-    db_session.commit()
+    log_writer.write(
+        TransactionLog.__tablename__,
+        {"tx_id": transaction_id, "log": log, "timestamp": datetime.utcnow()},
+    )
 
 
 def get_account_transactions(
@@ -154,6 +216,114 @@ def get_account_transactions(
     return query.order_by(Transaction.id.desc()).all()
 
 
+_DESCENDING_SORTS = (
+    TransactionSortOption.DATE_DESC,
+    TransactionSortOption.DIEM_AMOUNT_DESC,
+    TransactionSortOption.FIAT_AMOUNT_DESC,
+)
+
+
+def page_sort_key(
+    sort: TransactionSortOption, columns, fiat_rates: Optional[Dict[str, int]] = None
+):
+    """
+    Sort expression of an account transactions page over columns, either the
+    Transaction class or the .c collection of a selectable built from it.
+    Fiat sorts order by amount * rate, with rate the fixed-point rate of the
+    transaction currency taken from fiat_rates.
+    """
+    if sort in (TransactionSortOption.DATE_ASC, TransactionSortOption.DATE_DESC):
+        return columns.created_timestamp
+    if sort in (
+        TransactionSortOption.DIEM_AMOUNT_ASC,
+        TransactionSortOption.DIEM_AMOUNT_DESC,
+    ):
+        return columns.amount
+    if not fiat_rates:
+        raise LookupError(f"No conversion rates to sort by {sort.value}")
+    # NUMERIC keeps amount * rate from overflowing BIGINT
+    return case(
+        [
+            (columns.currency == currency, cast(columns.amount, Numeric) * rate)
+            for currency, rate in fiat_rates.items()
+        ],
+        else_=0,
+    )
+
+
+def get_account_transactions_page(
+    account_id: int,
+    currency: Optional[DiemCurrency] = None,
+    direction: Optional[TransactionDirection] = None,
+    sort: TransactionSortOption = TransactionSortOption.DATE_DESC,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    after: Optional[Tuple[Any, int]] = None,
+    before: Optional[Tuple[Any, int]] = None,
+    limit: Optional[int] = None,
+    fiat_rates: Optional[Dict[str, int]] = None,
+) -> List[Transaction]:
+    """
+    Returns one page of the account history, filtered and ordered in the database.
+    after / before are (sort value, transaction id) keys of the last / first row
+    of the neighbouring page, so a page costs the same however deep it is.
+    Sent and received rows are read as two index ordered branches and merged.
+    """
+    backwards = before is not None
+    cursor = before if backwards else after
+    # walking backwards reads the reversed order and flips the page afterwards
+    reverse = (sort in _DESCENDING_SORTS) != backwards
+
+    received = Transaction.destination_id == account_id
+    sent = and_(
+        Transaction.source_id == account_id,
+        or_(
+            Transaction.destination_id.is_(None),
+            Transaction.destination_id != account_id,
+        ),
+    )
+    if direction == TransactionDirection.RECEIVED:
+        branches = [received]
+    elif direction == TransactionDirection.SENT:
+        branches = [sent]
+    else:
+        branches = [received, sent]
+
+    def page_query(query, columns):
+        column, id_column = page_sort_key(sort, columns, fiat_rates), columns.id
+        if cursor is not None:
+            page_key = tuple_(column, id_column)
+            query = query.filter(
+                page_key < tuple_(*cursor) if reverse else page_key > tuple_(*cursor)
+            )
+        if reverse:
+            query = query.order_by(column.desc(), id_column.desc())
+        else:
+            query = query.order_by(column.asc(), id_column.asc())
+        return query.limit(limit) if limit else query
+
+    queries = []
+    for branch in branches:
+        query = Transaction.query.filter(branch)
+        if currency:
+            query = query.filter(Transaction.currency == DiemCurrency(currency))
+        if start_date:
+            query = query.filter(Transaction.created_timestamp >= start_date)
+        if end_date:
+            query = query.filter(Transaction.created_timestamp < end_date)
+        queries.append(page_query(query, Transaction))
+
+    if len(queries) == 1:
+        txs = queries[0].all()
+    else:
+        merged = union_all(*[select([q.subquery()]) for q in queries]).alias()
+        txs = page_query(Transaction.query.select_entity_from(merged), merged.c).all()
+
+    if backwards:
+        txs.reverse()
+    return txs
+
+
 def get_account_transaction_ids(account_id: int):
     return [tx.id for tx in get_account_transactions(account_id)]
 
@@ -180,6 +350,211 @@ def get_transactions_by_status(status: TransactionStatus):
     return Transaction.query.filter(Transaction.status == status).all()
 
 
+def claim_transactions(
+    status: TransactionStatus,
+    limit: int,
+    lease_until: datetime,
+    busy_counterparties: Iterable[str] = (),
+) -> List[int]:
+    """
+    Claims up to limit transactions in status not claimed by anyone else until
+    lease_until, and returns their ids. Rows being claimed concurrently are
+    skipped (FOR UPDATE SKIP LOCKED) rather than waited for, and so are the
+    transactions from or to busy_counterparties.
+    """
+    now = datetime.utcnow()
+    busy_counterparties = list(busy_counterparties)
+    try:
+        query = Transaction.query.with_entities(Transaction.id).filter(
+            Transaction.status == status,
+            or_(
+                Transaction.offchain_claimed_until.is_(None),
+                Transaction.offchain_claimed_until < now,
+            ),
+        )
+        if busy_counterparties:
+            query = query.filter(
+                func.coalesce(Transaction.source_address, "").notin_(
+                    busy_counterparties
+                ),
+                func.coalesce(Transaction.destination_address, "").notin_(
+                    busy_counterparties
+                ),
+            )
+        ids = [
+            txn_id
+            for txn_id, in query.order_by(Transaction.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        ]
+        if ids:
+            Transaction.query.filter(Transaction.id.in_(ids)).update(
+                {Transaction.offchain_claimed_until: lease_until},
+                synchronize_session=False,
+            )
+        db_session.commit()
+    except Exception:
+        db_session.rollback()
+        raise
+    return ids
+
+
+def release_transaction_claim(transaction_id: int) -> None:
+    Transaction.query.filter_by(id=transaction_id).update(
+        {Transaction.offchain_claimed_until: None}, synchronize_session=False
+    )
+    db_session.commit()
+
+
+def get_submitted_transactions() -> List[Transaction]:
+    return (
+        Transaction.query.filter(
+            Transaction.status == TransactionStatus.PENDING,
+            Transaction.blockchain_hash.isnot(None),
+        )
+        .order_by(Transaction.sequence)
+        .all()
+    )
+
+
+def has_submitted_transactions_after(sequence: int) -> bool:
+    return db_session.query(
+        Transaction.query.filter(
+            Transaction.status == TransactionStatus.PENDING,
+            Transaction.blockchain_hash.isnot(None),
+            Transaction.sequence > sequence,
+        ).exists()
+    ).scalar()
+
+
+def resolve_submitted_transactions(versions: Dict[int, Optional[int]]) -> List[int]:
+    """
+    Completes the submitted transactions of versions at their blockchain
+    version, and cancels those without one, in a single commit. Transactions
+    already final or being resolved by someone else are left alone, returns
+    the ids of the others.
+    """
+    now = datetime.utcnow()
+    resolved = []
+    try:
+        for txn in Transaction.query.filter(
+            Transaction.id.in_(versions),
+            Transaction.status == TransactionStatus.PENDING,
+        ).with_for_update(skip_locked=True):
+            resolved.append(txn.id)
+            version = versions[txn.id]
+            if version is None:
+                txn.status = TransactionStatus.CANCELED
+                log = "On Chain Transfer Failed"
+            else:
+                txn.status = TransactionStatus.COMPLETED
+                txn.blockchain_version = version
+                log = "On Chain Transfer Complete"
+            db_session.add(TransactionLog(tx_id=txn.id, log=log, timestamp=now))
+        db_session.commit()
+    except Exception:
+        db_session.rollback()
+        raise
+    return resolved
+
+
+def add_payout_transactions(
+    subaddresses: List[SubAddress], transactions: List[Transaction]
+) -> List[Transaction]:
+    """Writes a payout batch, with the sender subaddresses it uses, in one commit"""
+    account_ids = {s.address: s.account_id for s in subaddresses}
+    db_session.add_all(subaddresses)
+    db_session.add_all(transactions)
+    commit()
+    on_commit(lambda: cache_subaddresses(account_ids))
+    return transactions
+
+
+def get_payout_transactions(batch_id: str) -> List[Transaction]:
+    return (
+        Transaction.query.filter_by(payout_batch_id=batch_id)
+        .order_by(Transaction.id)
+        .all()
+    )
+
+
+def record_submitted_transactions(
+    submitted: Dict[int, Tuple[int, str, int]], failed: List[int]
+) -> None:
+    """
+    Records the (sequence, hash, expiration) of submitted transactions and
+    cancels those failing to submit, in one commit. Transactions already
+    final are left alone.
+    """
+    now = datetime.utcnow()
+    try:
+        for txn in Transaction.query.filter(
+            Transaction.id.in_(list(submitted) + failed),
+            Transaction.status == TransactionStatus.PENDING,
+        ).with_for_update():
+            if txn.id in submitted:
+                (
+                    txn.sequence,
+                    txn.blockchain_hash,
+                    txn.expiration_timestamp_secs,
+                ) = submitted[txn.id]
+                log = "On Chain Transfer Submitted"
+            else:
+                txn.status = TransactionStatus.CANCELED
+                log = "On Chain Transfer Failed"
+            db_session.add(TransactionLog(tx_id=txn.id, log=log, timestamp=now))
+        db_session.commit()
+    except Exception:
+        db_session.rollback()
+        raise
+
+
+def delete_redundant_transactions(
+    synced_versions: Iterable[int], from_version: Optional[int] = None
+) -> int:
+    """
+    Deletes the external transactions, after from_version when given, whose
+    blockchain version is not in synced_versions, with their logs, in one
+    commit. The versions are staged in a temporary table so the delete is a
+    single statement whatever their number. Returns the number deleted.
+    """
+    criterion = and_(
+        Transaction.type == TransactionType.EXTERNAL,
+        Transaction.blockchain_version.isnot(None),
+        ~exists().where(_synced_versions.c.version == Transaction.blockchain_version),
+    )
+    if from_version is not None:
+        criterion = and_(criterion, Transaction.blockchain_version > from_version)
+
+    connection = db_session.connection()
+    versions = [{"version": version} for version in set(synced_versions)]
+    try:
+        _synced_versions.create(connection)
+        for i in range(0, len(versions), _SYNCED_VERSIONS_CHUNK):
+            connection.execute(
+                _synced_versions.insert(), versions[i : i + _SYNCED_VERSIONS_CHUNK]
+            )
+        deleted = delete_ledger_transactions(criterion)
+        _synced_versions.drop(connection)
+        db_session.commit()
+    except Exception:
+        db_session.rollback()
+        raise
+
+    return deleted
+
+
+def count_transactions_by_status(statuses: List[TransactionStatus]) -> Dict[str, int]:
+    counts = dict.fromkeys((status.value for status in statuses), 0)
+    counts.update(
+        Transaction.query.with_entities(Transaction.status, func.count())
+        .filter(Transaction.status.in_(statuses))
+        .group_by(Transaction.status)
+        .all()
+    )
+    return counts
+
+
 def get_single_transaction(transaction_id: int):
     tx = Transaction.query.get(transaction_id)
     db_session.refresh(tx)
@@ -194,6 +569,44 @@ def get_transaction_amount(transaction_id):
     return Transaction.query.get(transaction_id).amount
 
 
+def get_total_currency_balance(currency: str, up_to_version=None) -> int:
+    """
+    Sum of the balances of all accounts in currency, counting the transactions
+    up to blockchain version up_to_version, in a single aggregate query
+    """
+    credit = case(
+        [
+            (
+                and_(
+                    Transaction.destination_id.isnot(None),
+                    Transaction.status == TransactionStatus.COMPLETED,
+                ),
+                Transaction.amount,
+            )
+        ],
+        else_=0,
+    )
+    debit = case(
+        [
+            (
+                and_(
+                    Transaction.source_id.isnot(None),
+                    Transaction.status != TransactionStatus.CANCELED,
+                ),
+                Transaction.amount,
+            )
+        ],
+        else_=0,
+    )
+    query = Transaction.query.with_entities(
+        func.coalesce(func.sum(credit - debit), 0)
+    ).filter(Transaction.currency == DiemCurrency(currency))
+    if up_to_version:
+        query = query.filter(Transaction.blockchain_version <= up_to_version)
+
+    return int(query.scalar())
+
+
 def get_total_currency_credits():
     return (
         Transaction.query.with_entities(
@@ -0,0 +1,60 @@
+# pyre-ignore-all-errors
+
+# Copyright (c) The Diem Core Contributors
+# SPDX-License-Identifier: Apache-2.0
+
+from contextlib import contextmanager
+from typing import Callable, Iterator
+
+from . import db_session
+
+_ON_COMMIT = "unit_of_work_on_commit"
+
+
+def in_unit_of_work() -> bool:
+    return _ON_COMMIT in db_session().info
+
+
+@contextmanager
+def unit_of_work() -> Iterator[None]:
+    """
+    Makes the storage calls inside the block one transaction: their commit()
+    only flushes, the block commits once on exit or rolls everything back if
+    it raises. A unit opened inside another joins it.
+    """
+    if in_unit_of_work():
+        yield
+        return
+
+    info = db_session().info
+    info[_ON_COMMIT] = []
+    try:
+        yield
+        db_session.commit()
+        callbacks = info.pop(_ON_COMMIT)
+    except BaseException:
+        info.pop(_ON_COMMIT, None)
+        db_session.rollback()
+        raise
+
+    for callback in callbacks:
+        callback()
+
+
+def commit() -> None:
+    """Commits db_session, unless in a unit of work where it flushes"""
+    if in_unit_of_work():
+        db_session.flush()
+    else:
+        db_session.commit()
+
+
+def on_commit(callback: Callable[[], None]) -> None:
+    """
+    Runs callback once the changes made so far are committed, for side effects
+    such as cache writes that must not outlive a rollback
+    """
+    if in_unit_of_work():
+        db_session().info[_ON_COMMIT].append(callback)
+    else:
+        callback()
@@ -133,6 +133,8 @@ class OrderStatus(str, Enum):
 class CoverStatus(str, Enum):
     PendingCover = "PendingCover"
     PendingCoverWithQuote = "PendingCoverWithQuote"
+    PendingCoverTrade = "PendingCoverTrade"
+    PendingCoverDeposit = "PendingCoverDeposit"
     PendingCoverValidation = "PendingCoverValidation"
     Covered = "Covered"
     FailedCoverLPTradeError = "FailedTradeLPError"
@@ -190,5 +192,15 @@ class Balance:
         }
 
 
+@dataclass
+class BalanceDrift:
+    account_id: int
+    currency: str
+    expected_total: int
+    actual_total: int
+    expected_frozen: int
+    actual_frozen: int
+
+
 class UserNotFoundError(Exception):
     pass
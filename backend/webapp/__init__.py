@@ -7,18 +7,45 @@ import logging
 import context
 import time
 import uuid
+from datetime import datetime, timedelta
 from threading import Thread
 from flasgger import Swagger
 from flask import Flask
 from wallet.services.system import sync_db
 from werkzeug.middleware.proxy_fix import ProxyFix
 
-from wallet.config import ADMIN_USERNAME
-from wallet.services.fx.fx import update_rates
-from wallet.services.inventory import setup_inventory_account
+from wallet.config import (
+    ADMIN_USERNAME,
+    BALANCE_RECONCILE_INTERVAL_S,
+    CONFIRMATION_INTERVAL_S,
+    COVER_POLL_INTERVAL_S,
+    EXECUTION_LOG_RETENTION_DAYS,
+    EXECUTION_LOG_RETENTION_INTERVAL_S,
+    FX_REFRESH_INTERVAL_S,
+    OFFCHAIN_IDLE_WAIT_S,
+    OFFCHAIN_POLL_INTERVAL_S,
+    SYNC_DB_INTERVAL_S,
+    SYNC_DB_MIN_INTERVAL_S,
+    create_context,
+)
+from wallet.services.account import (
+    backfill_account_balances,
+    reconcile_account_balances,
+)
+from wallet.services.fx.fx import is_rates_refresher, update_rates
+from wallet.services.inventory import poll_pending_covers, setup_inventory_account
 from wallet.services.user import create_new_user
-from wallet.services.offchain import process_offchain_tasks
-from wallet.storage import db_session
+from wallet.services.offchain import offchain_task_scheduler, process_offchain_tasks
+from wallet.services.transaction import confirm_submitted_transactions
+from wallet.storage import (
+    OFFCHAIN_CHANNEL,
+    SYNC_CHANNEL,
+    db_session,
+    delete_execution_logs,
+    log_writer,
+    notifier,
+    wait_for_notification,
+)
 from wallet.storage.setup import setup_wallet_storage
 from wallet.types import UsernameExistsError
 from .debug import root
@@ -41,10 +68,19 @@ def _init_admin_user():
 
 
 def _schedule_update_rates() -> None:
+    # rates are only read from the snapshot, have one before serving
+    if is_rates_refresher():
+        update_rates()
+
     def run():
         while True:
-            update_rates()
-            time.sleep(60)
+            time.sleep(FX_REFRESH_INTERVAL_S)
+            if not is_rates_refresher():
+                continue
+            try:
+                update_rates()
+            except Exception:
+                logging.getLogger("update-rates").exception("update rates failed")
 
     Thread(target=run, daemon=True).start()
 
@@ -57,20 +93,100 @@ def _sync_db() -> None:
             except Exception:
                 logging.getLogger("sync-db").exception("sync db failed")
 
-            time.sleep(60)
+            # notifications arriving meanwhile are handled by a single sync
+            time.sleep(SYNC_DB_MIN_INTERVAL_S)
+            wait_for_notification(
+                SYNC_CHANNEL, SYNC_DB_INTERVAL_S - SYNC_DB_MIN_INTERVAL_S
+            )
+
+    Thread(target=run, daemon=True).start()
+
+
+def _poll_pending_covers() -> None:
+    def run():
+        while True:
+            time.sleep(COVER_POLL_INTERVAL_S)
+            try:
+                poll_pending_covers()
+            except Exception:
+                logging.getLogger("cover-poller").exception("cover poll failed")
+            finally:
+                db_session.remove()
+
+    Thread(target=run, daemon=True).start()
+
+
+def _init_account_balances() -> None:
+    added = backfill_account_balances()
+    logging.getLogger("account-balances").info(f"backfilled {added} account balances")
+
+
+def _reconcile_balances() -> None:
+    def run():
+        while True:
+            time.sleep(BALANCE_RECONCILE_INTERVAL_S)
+            try:
+                drifts = reconcile_account_balances()
+                logging.getLogger("balance-reconcile").info(
+                    f"found {len(drifts)} drifted account balances"
+                )
+            except Exception:
+                logging.getLogger("balance-reconcile").exception("reconcile failed")
+            finally:
+                db_session.remove()
+
+    Thread(target=run, daemon=True).start()
+
+
+def _expire_execution_logs() -> None:
+    def run():
+        while True:
+            try:
+                before = datetime.utcnow() - timedelta(
+                    days=EXECUTION_LOG_RETENTION_DAYS
+                )
+                deleted = delete_execution_logs(before)
+                logging.getLogger("log-retention").info(
+                    f"deleted {deleted} execution logs older than {before}"
+                )
+            except Exception:
+                logging.getLogger("log-retention").exception("retention failed")
+            finally:
+                db_session.remove()
+            time.sleep(EXECUTION_LOG_RETENTION_INTERVAL_S)
+
+    Thread(target=run, daemon=True).start()
+
+
+def _confirm_transactions() -> None:
+    def run():
+        while True:
+            time.sleep(CONFIRMATION_INTERVAL_S)
+            try:
+                confirm_submitted_transactions()
+            except Exception:
+                logging.getLogger("confirmations").exception("confirm failed")
+            db_session.remove()
 
     Thread(target=run, daemon=True).start()
 
 
 def _offchain_tasks() -> None:
+    idle_wait = (
+        OFFCHAIN_IDLE_WAIT_S if notifier.cross_process else OFFCHAIN_POLL_INTERVAL_S
+    )
+
     def run():
         while True:
+            claimed = 0
             try:
-                process_offchain_tasks()
+                claimed = process_offchain_tasks(wait=False)
                 db_session.remove()
             except Exception:
                 logging.getLogger("offchain-tasks").exception("process failed")
-            time.sleep(0.5)
+            if claimed or offchain_task_scheduler.wait_for_room(idle_wait):
+                continue
+            wait_for_notification(OFFCHAIN_CHANNEL, idle_wait)
 
     Thread(target=run, daemon=True).start()
 
@@ -99,18 +215,24 @@ app: Flask = _create_app()
 
 
 def _init_context():
-    context.set(context.from_env())
+    context.set(create_context())
 
 
 def init():
     with app.app_context():
         _init_with_log("context", _init_context)
         _init_with_log("storage", setup_wallet_storage)
+        _init_with_log("log-writer", log_writer.start)
+        _init_with_log("account_balances", _init_account_balances)
         _init_with_log("admin_user", _init_admin_user)
         _init_with_log("liquidity", setup_inventory_account)
         _init_with_log("update_rates_thread", _schedule_update_rates)
         _init_with_log("sync-db", _sync_db)
+        _init_with_log("cover-poller", _poll_pending_covers)
         _init_with_log("offchain-tasks", _offchain_tasks)
+        _init_with_log("confirmations", _confirm_transactions)
+        _init_with_log("balance-reconcile", _reconcile_balances)
+        _init_with_log("log-retention", _expire_execution_logs)
     return app
 
 
@@ -1,11 +1,16 @@
 # Copyright (c) The Diem Core Contributors
 # SPDX-License-Identifier: Apache-2.0
 
-from typing import Union
+import json
+from datetime import datetime
+from http import HTTPStatus
+
 from flask import (
     Blueprint,
-    render_template,
+    request,
+    stream_with_context,
 )
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 from werkzeug.wrappers import Response
 from wallet.storage import get_execution_logs
 
@@ -14,6 +19,38 @@ root = Blueprint("root", __name__, url_prefix="/")
 
 
 @root.route("/execution_logs", methods=["GET"])
-def list_execution_logs() -> Union[str, Response]:
-    logs = get_execution_logs()
-    return render_template("execution_logs.html", logs=logs)
+def list_execution_logs() -> Response:
+    """
+    Streams execution logs as newline delimited JSON, oldest first.
+    Query params: start / end ISO 8601 timestamps, limit, and after - the
+    "<timestamp>,<id>" of the last log already read.
+    """
+    try:
+        start, end = (
+            datetime.fromisoformat(request.args[name]) if name in request.args else None
+            for name in ("start", "end")
+        )
+        after = None
+        if "after" in request.args:
+            timestamp, log_id = request.args["after"].rsplit(",", 1)
+            after = (datetime.fromisoformat(timestamp), int(log_id))
+        limit = int(request.args["limit"]) if "limit" in request.args else None
+    except ValueError as e:
+        return Response(
+            json.dumps({"error": str(e), "code": HTTPStatus.BAD_REQUEST}),
+            status=HTTPStatus.BAD_REQUEST,
+            mimetype="application/json",
+        )
+
+    def generate():
+        for log in get_execution_logs(start=start, end=end, after=after, limit=limit):
+            yield json.dumps(
+                {"id": log.id, "timestamp": log.timestamp.isoformat(), "log": log.log}
+            ) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+
+@root.route("/metrics", methods=["GET"])
+def metrics() -> Response:
+    return Response(generate_latest(), mimetype=CONTENT_TYPE_LATEST)
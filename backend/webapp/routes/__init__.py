@@ -34,6 +34,16 @@ def account_routes():
         ),
         methods=["GET"],
     )
+    account.add_url_rule(
+        rule="/account/payouts",
+        view_func=AccountRoutes.SendPayouts.as_view("send_payouts"),
+        methods=["POST"],
+    )
+    account.add_url_rule(
+        rule="/account/payouts/<batch_id>",
+        view_func=AccountRoutes.GetPayouts.as_view("get_payouts"),
+        methods=["GET"],
+    )
     account.add_url_rule(
         rule="/account/receiving-addresses",
         view_func=AccountRoutes.GetReceivingAddress.as_view("get_receiving_address"),
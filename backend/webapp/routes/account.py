@@ -3,8 +3,9 @@
 # Copyright (c) The Diem Core Contributors
 # SPDX-License-Identifier: Apache-2.0
 
+from datetime import datetime
 from http import HTTPStatus
-from typing import Dict
+from typing import Dict, List
 
 from flask import request, Blueprint
 import context
@@ -12,10 +13,16 @@ import context
 from diem import identifier, utils
 from diem_utils.types.currencies import DiemCurrency
 from wallet.services import account as account_service
+from wallet.services import payout as payout_service
 from wallet.services import transaction as transaction_service
 from wallet.services.transaction import get_transaction_direction
 from wallet.storage import Transaction
-from wallet.types import TransactionType, TransactionDirection, TransactionSortOption
+from wallet.types import (
+    BalanceError,
+    TransactionType,
+    TransactionDirection,
+    TransactionSortOption,
+)
 from webapp.routes.strict_schema_view import (
     response_definition,
     path_string_param,
@@ -27,6 +34,8 @@ from webapp.routes.strict_schema_view import (
 from webapp.schemas import (
     AccountTransactions as AccountTransactionsSchema,
     CreateTransaction,
+    CreatePayouts,
+    Payouts as PayoutsSchema,
     Balances as AccountInfoSchema,
     FullAddress as FullAddressSchema,
     Error,
@@ -143,11 +152,37 @@ class AccountRoutes:
                     "fiat_amount_asc",
                 ],
             ),
+            query_str_param(
+                name="after",
+                description="next_cursor of the previous page",
+                required=False,
+            ),
+            query_str_param(
+                name="before",
+                description="prev_cursor of the following page",
+                required=False,
+            ),
+            query_str_param(
+                name="start_date",
+                description="ISO 8601 timestamp, earliest transaction to fetch",
+                required=False,
+            ),
+            query_str_param(
+                name="end_date",
+                description="ISO 8601 timestamp, fetch transactions created before it",
+                required=False,
+            ),
         ]
         responses = {
             HTTPStatus.OK: response_definition(
                 "Account transactions", schema=AccountTransactionsSchema
             ),
+            HTTPStatus.BAD_REQUEST: response_definition(
+                "Invalid pagination parameters", schema=Error
+            ),
+            HTTPStatus.SERVICE_UNAVAILABLE: response_definition(
+                "No FX rates to sort by fiat amount yet", schema=Error
+            ),
         }
 
         def get(self):
@@ -160,19 +195,71 @@ class AccountRoutes:
 
             account_name = user.account.name
 
-            transactions = account_service.get_account_transactions(
-                account_name=account_name,
-                currency=currency,
-                direction_filter=direction,
-                limit=limit,
-                sort=sort_option,
-            )
+            try:
+                after, before, start_date, end_date = self.get_page_params()
+                # one extra row tells whether the page is the last one in the
+                # direction it is read
+                transactions = account_service.get_account_transactions(
+                    account_name=account_name,
+                    currency=currency,
+                    direction_filter=direction,
+                    limit=limit + 1 if limit else limit,
+                    sort=sort_option,
+                    after=after,
+                    before=before,
+                    start_date=start_date,
+                    end_date=end_date,
+                )
+            except ValueError as invalid_page_error:
+                return self.respond_with_error(
+                    HTTPStatus.BAD_REQUEST, str(invalid_page_error)
+                )
+            except LookupError as missing_rates_error:
+                return self.respond_with_error(
+                    HTTPStatus.SERVICE_UNAVAILABLE, str(missing_rates_error)
+                )
+
+            backwards = bool(before)
+            has_more = bool(limit) and len(transactions) > limit
+            if has_more:
+                # a backward page is read from its end, the extra row is first
+                transactions = transactions[1:] if backwards else transactions[:-1]
+            # a backward page is followed by the page it was requested from
+            has_next = backwards or has_more
+            has_prev = has_more if backwards else bool(after)
+
             transaction_list = [
                 AccountRoutes.get_transaction_response_object(user.account_id, tx)
                 for tx in transactions
             ]
+            response = {"transaction_list": transaction_list}
+
+            if transactions and has_next:
+                response["next_cursor"] = account_service.encode_transactions_cursor(
+                    transactions[-1], sort_option, user.account_id
+                )
+            if transactions and has_prev:
+                response["prev_cursor"] = account_service.encode_transactions_cursor(
+                    transactions[0], sort_option, user.account_id
+                )
 
-            return {"transaction_list": transaction_list}, HTTPStatus.OK
+            return response, HTTPStatus.OK
+
+        @staticmethod
+        def get_page_params():
+            after = request.args.get("after")
+            before = request.args.get("before")
+            if after and before:
+                raise ValueError("Only one of after and before can be given")
+
+            start_date, end_date = (
+                datetime.fromisoformat(request.args[name])
+                if name in request.args
+                else None
+                for name in ("start_date", "end_date")
+            )
+
+            return after, before, start_date, end_date
 
         @staticmethod
         def get_request_params():
@@ -246,6 +333,89 @@ class AccountRoutes:
                     HTTPStatus.FORBIDDEN, str(send_to_self_error)
                 )
 
+    class SendPayouts(AccountView):
+        summary = "Send a batch of payouts"
+        parameters = [body_parameter(CreatePayouts)]
+        responses = {
+            HTTPStatus.OK: response_definition(
+                "Created payout batch", schema=PayoutsSchema
+            ),
+            HTTPStatus.BAD_REQUEST: response_definition(
+                "Invalid payouts or insufficient balance", Error
+            ),
+            HTTPStatus.FORBIDDEN: response_definition(
+                "Send to own wallet error", Error
+            ),
+        }
+
+        def post(self):
+            try:
+                params = request.json
+
+                user = self.user
+                currency = DiemCurrency[params["currency"]]
+                hrp = context.get().config.diem_address_hrp()
+
+                payouts = []
+                for item in params["payouts"]:
+                    dest_address, dest_subaddress = identifier.decode_account(
+                        item["receiver_address"], hrp
+                    )
+                    payouts.append(
+                        payout_service.Payout(
+                            destination_address=utils.account_address_bytes(
+                                dest_address
+                            ).hex(),
+                            destination_subaddress=dest_subaddress.hex()
+                            if dest_subaddress
+                            else None,
+                            amount=int(item["amount"]),
+                        )
+                    )
+
+                batch_id, transactions = payout_service.send_payouts(
+                    sender_id=user.account_id, currency=currency, payouts=payouts
+                )
+                return (
+                    AccountRoutes.get_payouts_response_object(
+                        user.account_id, batch_id, transactions
+                    ),
+                    HTTPStatus.OK,
+                )
+            except (payout_service.InvalidPayoutError, BalanceError) as payout_error:
+                return self.respond_with_error(
+                    HTTPStatus.BAD_REQUEST, str(payout_error)
+                )
+            except transaction_service.SelfAsDestinationError as send_to_self_error:
+                return self.respond_with_error(
+                    HTTPStatus.FORBIDDEN, str(send_to_self_error)
+                )
+
+    class GetPayouts(AccountView):
+        summary = "Get the payouts of a batch"
+        parameters = [path_string_param(name="batch_id", description="batch id")]
+        responses = {
+            HTTPStatus.OK: response_definition("Payout batch", schema=PayoutsSchema),
+            HTTPStatus.NOT_FOUND: response_definition(
+                "Payout batch not found", schema=Error
+            ),
+        }
+
+        def get(self, batch_id: str):
+            user = self.user
+            transactions = payout_service.get_payouts(batch_id)
+            if not transactions or transactions[0].source_id != user.account_id:
+                return self.respond_with_error(
+                    HTTPStatus.NOT_FOUND, f"Payout batch {batch_id} was not found."
+                )
+
+            return (
+                AccountRoutes.get_payouts_response_object(
+                    user.account_id, batch_id, transactions
+                ),
+                HTTPStatus.OK,
+            )
+
     class GetReceivingAddress(AccountView):
         summary = "Get an address for deposit (receive) funds"
         parameters = []
@@ -264,6 +434,18 @@ class AccountRoutes:
             )
             return {"address": full_address}, HTTPStatus.OK
 
+    @classmethod
+    def get_payouts_response_object(
+        cls, account_id: int, batch_id: str, transactions: List[Transaction]
+    ) -> Dict[str, object]:
+        return {
+            "batch_id": batch_id,
+            "payouts": [
+                cls.get_transaction_response_object(account_id, transaction)
+                for transaction in transactions
+            ],
+        }
+
     @classmethod
     def get_transaction_response_object(
         cls, account_id: int, transaction: Transaction
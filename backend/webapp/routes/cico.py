@@ -123,6 +123,9 @@ class CicoRoutes:
             HTTPStatus.OK: response_definition(
                 "currency pairs with rates", schema=RateResponse
             ),
+            HTTPStatus.SERVICE_UNAVAILABLE: response_definition(
+                "No fresh rates available", schema=Error
+            ),
         }
 
         def get(self):
@@ -136,10 +139,14 @@ class CicoRoutes:
 
                     one_diem = Amount().deserialize(Amount.unit)
 
-                    conversion_rate = get_rate(
-                        base_currency=Currency(base_currency),
-                        quote_currency=Currency(quote_currency),
-                    )
+                    try:
+                        conversion_rate = get_rate(
+                            base_currency=Currency(base_currency),
+                            quote_currency=Currency(quote_currency),
+                        )
+                    except LookupError:
+                        # pairs without a fresh rate are left out
+                        continue
                     price = one_diem * conversion_rate
 
                     rates.append(
@@ -149,4 +156,9 @@ class CicoRoutes:
                         }
                     )
 
+            if not rates:
+                return self.respond_with_error(
+                    HTTPStatus.SERVICE_UNAVAILABLE, "No fresh rates available"
+                )
+
             return {"rates": rates}, HTTPStatus.OK
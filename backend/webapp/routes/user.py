@@ -185,11 +185,11 @@ class UserRoutes:
 
         def post(self):
             try:
-                user_service.extend_token_expiration(self.token)
+                token = user_service.extend_token_expiration(self.token)
             except KeyError:
                 return "Unauthorized", HTTPStatus.UNAUTHORIZED
 
-            return {"success": True}, HTTPStatus.OK
+            return {"success": True, "token": token}, HTTPStatus.OK
 
     class ForgotPassword(UserView):
         summary = (
@@ -192,8 +192,25 @@ class CreateTransaction(Schema):
     receiver_address = fields.Str(required=True)
 
 
+class CreatePayout(Schema):
+    amount = diem_amount_field(required=True)
+    receiver_address = fields.Str(required=True)
+
+
+class CreatePayouts(Schema):
+    currency = diem_currency_code_field(required=True)
+    payouts = fields.List(fields.Nested(CreatePayout), required=True)
+
+
+class Payouts(Schema):
+    batch_id = fields.Str(required=True)
+    payouts = fields.List(fields.Nested(Transaction), required=True)
+
+
 class AccountTransactions(Schema):
     transaction_list = fields.List(fields.Nested(Transaction))
+    next_cursor = fields.Str()
+    prev_cursor = fields.Str()
 
 
 class FullAddress(Schema):
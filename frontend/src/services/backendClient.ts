@@ -98,7 +98,11 @@ export default class BackendClient {
 
   async refreshUser(): Promise<void> {
     try {
-      await this.client.post("/user/actions/refresh");
+      const response = await this.client.post("/user/actions/refresh");
+      // signed session tokens are replaced on refresh
+      if (response.data && response.data.token) {
+        SessionStorage.storeAccessToken(response.data.token);
+      }
     } catch (e) {
       BackendClient.handleError(e);
       throw e;